@@ -34,8 +34,6 @@
 #    safely pass under current rainfall conditions and 2050 projections.
 #
 # 6. Final Model ouptut: A CSV file that summarizes the above model outputs in one table
-print('Cornell Culvert Evaluation Model')
-print('--------------------------------\n')
 
 # Importing required packages and modules
 import capacity, Precip_Append
@@ -44,68 +42,214 @@ import os
 import final_output
 # import runoff
 import runoffP  # Produces StreamStats estimates (cms) based on watershed area, and runs using NOAA Atlas 14 Precip
+import region_assign  # Assigns each culvert its StreamStats region from a region polygon shapefile
+import rating  # Headwater-discharge rating curves for what-if headwater queries
+import run_store  # Optional SQLite store of run outputs
+import storm_query  # Critical storm rainfall for event overtopping queries
+import pipeline  # Runs the stages below, independent ones at the same time
+import checkpoint  # Records finished stages so a failed run can be resumed
+import inventory_summary  # Grouped counts and capacity quantiles for inventory reports
+import prioritize  # Ranked replacement priority lists
 # import sorter
 import sorterPrecip
 # import csv,  pandas as pd
 
-FileNm = raw_input("Please enter your data file prefix, which should also be your data folder name: \n")
-data_path = "../" + FileNm + "/"
-PrecipType = raw_input("Did you use NOAA Atlas 14 to get different precip values for each culvert watershed? (y/n) \n")
-
-watershed_data_input_filename = data_path + 'All_Culverts.csv'
-watershed_precip_input_filename = data_path + FileNm + '_precip.csv'
-field_data_input_filename = data_path + FileNm + '_field_data.csv'
-not_extracted_filename = data_path + FileNm + '_not_extracted.csv'
-
-# Create folder and filenames for all of the output files.
-OutputDirectory = data_path + FileNm + "_Model_Output/"
-if not os.path.exists(OutputDirectory):
-    os.makedirs(OutputDirectory)
-output_prefix = OutputDirectory + FileNm + "_"
-current_runoff_filename = output_prefix + "current_runoff.csv"
-future_runoff_filename = output_prefix + "future_runoff.csv"
-sorted_filename = output_prefix + "sorted_ws.csv"
-culvert_geometry_filename = output_prefix + "culv_geom.csv"
-capacity_filename = output_prefix + "capacity_output.csv"
-return_period_filename = output_prefix + 'return_periods.csv'
-final_output_filename = output_prefix + 'model_output.csv'
-skipped_filename = output_prefix + 'skipped_culverts.csv'
-
-# Notifies user about runnign calculations
-print "\nRunning calculations for culverts in " + FileNm
-
-# 1. WATERSHED PEAK DISCHARGE
-
-# Sort watersheds so they match original numbering (GIS changes numbering)
-print " * Sorting watersheds by BarrierID and saving it to " + sorted_filename + "."
-if PrecipType == 'n':
-    ACA = data_path + 'All_Culverts_All.csv'    # Appended Watershed file
-    Reg = raw_input("What NY Region? (provide number 1-6; 2=Hudson River Estuary watershed, See Lumia et al 2006, pg 7) \n")
-    Precip_Append.calculate(watershed_data_input_filename, watershed_precip_input_filename, ACA,  Reg=2)
-    watershed_data_input_filename = ACA
-
-sorterPrecip.sort(watershed_data_input_filename, FileNm[:3], sorted_filename)
-
-# Culvert Peak Discharge function calculates the peak discharge for each culvert for current and future precip
-print " * Calculating current runoff and saving it to " + current_runoff_filename + "."
-runoffP.calculate(sorted_filename,  1.0, current_runoff_filename, skipped_filename)
-runoffP.calculate(sorted_filename,  1.15, future_runoff_filename)  # 1.15 times the current for future.
-print " * Calculating future runoff and saving it to " + future_runoff_filename + "."
-
-
-# 2. CULVERT GEOMETRY
-print " * Calculating culvert geometry and saving it to " + culvert_geometry_filename + "."
-# Culvert Capacity Prep function calculates the cross sectional area and assigns c and Y coeffs to each culvert
-capacity_prep.geometry(field_data_input_filename, culvert_geometry_filename)
-
-# 3. CULVERT CAPACITY
-print " * Calculating culvert capacity and saving it to " + capacity_filename + "."
-# Culvert_Capacities function calculates the capacity of each culvert (m^3/s) based on inlet control
-capacity.inlet_control(culvert_geometry_filename, capacity_filename)
-
-# 4. RETURN PERIODS AND FINAL OUTPUT
-print " * Calculating return periods and saving them to " + return_period_filename + "."
-print " * Calculating final output and saving it to " + final_output_filename + "."
-final_output.final_output(capacity_filename, current_runoff_filename, future_runoff_filename, final_output_filename, field_data_input_filename, not_extracted_filename, output_prefix)
-
-print "\nDone! All output files can be found within the folder " + OutputDirectory
+# Run the whole model for one data folder.
+# Parameters:
+#   FileNm: data file prefix, which is also the data folder name.
+#   PrecipType: 'y' if NOAA Atlas 14 precip was added to each watershed in ArcGIS, 'n' to use the NRCC _precip.csv.
+#   RegionLayer: StreamStats region polygon shapefile to assign regions per culvert ('' to skip).
+#   Reg: NY StreamStats region used for every culvert when PrecipType is 'n' and there is no RegionLayer.
+#   runs_path: folder holding the data folders.
+#   Control: 'inlet' for inlet control capacity, 'both' for the lower of inlet and outlet control.
+#   RunStore: SQLite run store to also save the outputs to ('' to skip, see run_store.py).
+#   StationList: NRCC station list csv (Station, Lat, Long, File) to give each watershed its nearest station's precip
+#                when PrecipType is 'n' ('' to use the single _precip.csv station).
+#   StationCount: number of nearest stations blended by inverse distance (1 = nearest station only).
+#   processes: number of stages to run at once (defaults to the number of cores, 1 to run them one at a time).
+#   DryRun: True to print the stage plan and critical path without running the model.
+#   Resume: True to skip the stages a previous run of the same folder finished and whose files are unchanged
+#           (see checkpoint.py; finished stages are recorded in <prefix>checkpoint.json).
+#   QuTable: qu coefficient table from qu_calibration.py ('' for the New York coefficients, see runoffP.py).
+def evaluate(FileNm, PrecipType, RegionLayer='', Reg=2, runs_path="../", Control='inlet', RunStore='',
+             StationList='', StationCount=1, processes=None, DryRun=False, Resume=False, QuTable=''):
+    data_path = runs_path + FileNm + "/"
+
+    watershed_data_input_filename = data_path + 'All_Culverts.csv'
+    watershed_precip_input_filename = data_path + FileNm + '_precip.csv'
+    field_data_input_filename = data_path + FileNm + '_field_data.csv'
+    not_extracted_filename = data_path + FileNm + '_not_extracted.csv'
+
+    # Create folder and filenames for all of the output files.
+    OutputDirectory = data_path + FileNm + "_Model_Output/"
+    if not os.path.exists(OutputDirectory):
+        os.makedirs(OutputDirectory)
+    output_prefix = OutputDirectory + FileNm + "_"
+    current_runoff_filename = output_prefix + "current_runoff.csv"
+    future_runoff_filename = output_prefix + "future_runoff.csv"
+    sorted_filename = output_prefix + "sorted_ws.csv"
+    culvert_geometry_filename = output_prefix + "culv_geom.csv"
+    capacity_filename = output_prefix + "capacity_output.csv"
+    return_period_filename = output_prefix + 'return_periods.csv'
+    final_output_filename = output_prefix + 'model_output.csv'
+    skipped_filename = output_prefix + 'skipped_culverts.csv'
+    region_filename = output_prefix + 'regions.csv'
+    rating_filename = output_prefix + 'rating.npz'
+    critical_filename = output_prefix + 'critical_rainfall.npz'
+    checkpoint_filename = output_prefix + 'checkpoint.json'
+    summary_filename = output_prefix + 'summary.npz'
+    priority_filename = output_prefix + 'priority.csv'
+
+    # Notifies user about runnign calculations
+    print "\nRunning calculations for culverts in " + FileNm
+
+    # The model stages, with the files each reads and writes. The watershed branch (1) and the culvert branch
+    # (2 and 3) do not depend on each other, and neither do the current and future runoff, so pipeline.py runs
+    # them at the same time and joins them at the final output (4).
+    stages = []
+
+    # 1. WATERSHED PEAK DISCHARGE
+
+    # Sort watersheds so they match original numbering (GIS changes numbering)
+    if PrecipType == 'n':
+        ACA = data_path + 'All_Culverts_All.csv'    # Appended Watershed file
+        if StationList == '':
+            stages.append(pipeline.stage('precip_append', Precip_Append.calculate,
+                                         (watershed_data_input_filename, watershed_precip_input_filename, ACA),
+                                         {'Reg': int(Reg)},
+                                         inputs=[watershed_data_input_filename, watershed_precip_input_filename],
+                                         outputs=[ACA]))
+        else:
+            stages.append(pipeline.stage('precip_append', Precip_Append.calculate_stations,
+                                         (watershed_data_input_filename, StationList, field_data_input_filename, ACA),
+                                         {'Reg': int(Reg), 'k': int(StationCount)},
+                                         inputs=[watershed_data_input_filename, StationList,
+                                                 field_data_input_filename],
+                                         outputs=[ACA]))
+        watershed_data_input_filename = ACA
+
+    sort_message = " * Sorting watersheds by BarrierID and saving it to " + sorted_filename + "."
+    if RegionLayer == '':
+        stages.append(pipeline.stage('sort', sorterPrecip.sort,
+                                     (watershed_data_input_filename, FileNm[:3], sorted_filename),
+                                     inputs=[watershed_data_input_filename], outputs=[sorted_filename],
+                                     message=sort_message))
+    else:
+        stages.append(pipeline.stage('region_assign', region_assign.assign,
+                                     (field_data_input_filename, RegionLayer, region_filename),
+                                     inputs=[field_data_input_filename, RegionLayer], outputs=[region_filename],
+                                     message=" * Assigning StreamStats regions to culverts and saving them to "
+                                     + region_filename + "."))
+        stages.append(pipeline.stage('sort', sorterPrecip.sort,
+                                     (watershed_data_input_filename, FileNm[:3], sorted_filename, region_filename),
+                                     inputs=[watershed_data_input_filename, region_filename],
+                                     outputs=[sorted_filename], message=sort_message))
+
+    # Culvert Peak Discharge function calculates the peak discharge for each culvert for current and future precip
+    qu_inputs = [QuTable] if QuTable != '' else []
+    stages.append(pipeline.stage('current_runoff', runoffP.calculate,
+                                 (sorted_filename, 1.0, current_runoff_filename, skipped_filename),
+                                 {'qu_table': QuTable},
+                                 inputs=[sorted_filename] + qu_inputs,
+                                 outputs=[current_runoff_filename, skipped_filename,
+                                          output_prefix + 'StreamStatsAreaBasedQ_CMS.csv'],
+                                 message=" * Calculating current runoff and saving it to "
+                                 + current_runoff_filename + "."))
+    stages.append(pipeline.stage('future_runoff', runoffP.calculate,
+                                 (sorted_filename, 1.15, future_runoff_filename),  # 1.15 times the current for future.
+                                 {'qu_table': QuTable},
+                                 inputs=[sorted_filename] + qu_inputs, outputs=[future_runoff_filename],
+                                 message=" * Calculating future runoff and saving it to "
+                                 + future_runoff_filename + "."))
+
+    # 2. CULVERT GEOMETRY
+    # Culvert Capacity Prep function calculates the cross sectional area and assigns c and Y coeffs to each culvert
+    stages.append(pipeline.stage('geometry', capacity_prep.geometry,
+                                 (field_data_input_filename, culvert_geometry_filename),
+                                 inputs=[field_data_input_filename], outputs=[culvert_geometry_filename],
+                                 message=" * Calculating culvert geometry and saving it to "
+                                 + culvert_geometry_filename + "."))
+
+    # 3. CULVERT CAPACITY
+    # Culvert_Capacities function calculates the capacity of each culvert (m^3/s) based on inlet control
+    stages.append(pipeline.stage('capacity',
+                                 capacity.inlet_outlet_control if Control == 'both' else capacity.inlet_control,
+                                 (culvert_geometry_filename, capacity_filename),
+                                 inputs=[culvert_geometry_filename], outputs=[capacity_filename],
+                                 message=" * Calculating culvert capacity and saving it to " + capacity_filename + "."))
+    stages.append(pipeline.stage('rating', rating.build, (culvert_geometry_filename, rating_filename),
+                                 {'control': Control},
+                                 inputs=[culvert_geometry_filename], outputs=[rating_filename],
+                                 message=" * Calculating headwater-discharge rating curves and saving them to "
+                                 + rating_filename + "."))
+    stages.append(pipeline.stage('critical_rainfall', storm_query.precompute,
+                                 (sorted_filename, capacity_filename, critical_filename),
+                                 {'qu_table': QuTable},
+                                 inputs=[sorted_filename, capacity_filename] + qu_inputs, outputs=[critical_filename],
+                                 message=" * Calculating critical storm rainfall and saving it to "
+                                 + critical_filename + "."))
+
+    # 4. RETURN PERIODS AND FINAL OUTPUT
+    stages.append(pipeline.stage('final_output', final_output.final_output,
+                                 (capacity_filename, current_runoff_filename, future_runoff_filename,
+                                  final_output_filename, field_data_input_filename, not_extracted_filename,
+                                  output_prefix),
+                                 inputs=[capacity_filename, current_runoff_filename, future_runoff_filename,
+                                         field_data_input_filename, not_extracted_filename, skipped_filename],
+                                 outputs=[return_period_filename, final_output_filename,
+                                          output_prefix + 'not_modeled.csv'],
+                                 message=" * Calculating return periods and saving them to " + return_period_filename
+                                 + ".\n * Calculating final output and saving it to " + final_output_filename + "."))
+    stages.append(pipeline.stage('summary', inventory_summary.summarize,
+                                 (final_output_filename, field_data_input_filename, output_prefix, FileNm),
+                                 inputs=[final_output_filename, field_data_input_filename], outputs=[summary_filename],
+                                 message=" * Summarizing the inventory and saving it to " + output_prefix
+                                 + "summary_*.csv."))
+    stages.append(pipeline.stage('priority', prioritize.rank,
+                                 (final_output_filename, field_data_input_filename, output_prefix),
+                                 {'county': FileNm},
+                                 inputs=[final_output_filename, field_data_input_filename],
+                                 outputs=[priority_filename, output_prefix + 'priority_by_county.csv'],
+                                 message=" * Ranking crossings for replacement and saving them to "
+                                 + priority_filename + "."))
+
+    state = checkpoint.open_checkpoint(checkpoint_filename, checkpoint.signature(
+        {'PrecipType': PrecipType, 'RegionLayer': RegionLayer, 'Reg': Reg, 'Control': Control,
+         'StationList': StationList, 'StationCount': StationCount, 'QuTable': QuTable}, qu_inputs), Resume)
+    pipeline.run(stages, processes, DryRun, state)
+    if DryRun:
+        return OutputDirectory
+
+    if RunStore != '':
+        QuConst0, QuConst1 = runoffP.qu_coefficients(QuTable)
+        run_id = run_store.store_run(RunStore, output_prefix, FileNm,
+                                     {'FileNm': FileNm, 'PrecipType': PrecipType, 'RegionLayer': RegionLayer,
+                                      'Reg': Reg, 'Control': Control, 'QuTable': QuTable,
+                                      'QuConst0': QuConst0.tolist(), 'QuConst1': QuConst1.tolist()})
+        print " * Saved outputs to run store " + RunStore + " as run " + str(run_id) + "."
+
+    print "\nDone! All output files can be found within the folder " + OutputDirectory
+    return OutputDirectory
+
+
+if __name__ == '__main__':
+    print('Cornell Culvert Evaluation Model')
+    print('--------------------------------\n')
+
+    FileNm = raw_input("Please enter your data file prefix, which should also be your data folder name: \n")
+    PrecipType = raw_input("Did you use NOAA Atlas 14 to get different precip values for each culvert watershed? (y/n) \n")
+    RegionLayer = raw_input("Path to a StreamStats region polygon shapefile to assign regions per culvert (leave blank to skip): \n")
+    Reg = 0
+    StationList = ''
+    StationCount = 1
+    if PrecipType == 'n' and RegionLayer == '':
+        Reg = raw_input("What NY Region? (provide number 1-6; 2=Hudson River Estuary watershed, See Lumia et al 2006, pg 7) \n")
+    if PrecipType == 'n':
+        StationList = raw_input("Path to an NRCC station list csv to use several stations (leave blank to use " + FileNm + "_precip.csv): \n")
+        if StationList != '':
+            StationCount = int(raw_input("Blend how many nearest stations? (1 = nearest station only) \n"))
+    Resume = False
+    if os.path.exists("../" + FileNm + "/" + FileNm + "_Model_Output/" + FileNm + "_checkpoint.json"):
+        Resume = raw_input("Resume from the last run, skipping the stages it finished? (y/n) \n") == 'y'
+    evaluate(FileNm, PrecipType, RegionLayer, int(Reg), StationList=StationList, StationCount=StationCount,
+             Resume=Resume)
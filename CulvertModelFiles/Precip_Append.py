@@ -1,12 +1,35 @@
-import loader
-import csv, numpy
+# Precipitation append
+#
+# Adds NRCC 24 hr precipitation (1 to 500 yr storms) to every watershed, either from one NRCC station table
+# (calculate) or from many stations at once (calculate_stations, October 2026), where each watershed gets
+# its nearest station or an inverse-distance blend of the k nearest, by culvert Lat/Long.
 
+import loader, sorterPrecip
+import csv, sys, numpy
 
-def calculate(watershed_data_input_filename, watershed_precip_input_filename, output_filename,  Reg=2):
+KM_PER_DEGREE_LAT = 110.57
+KM_PER_DEGREE_LONG_AT_EQUATOR = 111.32
+CHUNK_ROWS = 65536  # Culverts whose station distances are computed at once
+
+
+# Load one NRCC station table (rows 10-18 of an NRCC export, 24-hr column in inches).
+# Returns:
+#   numpy array of the 9 precipitation values in mm.
+def load_station(watershed_precip_input_filename):
     precip_data_signature = [
         {'name': '24-hr', 'type': float}
     ];
+    precip_rows = loader.load(watershed_precip_input_filename, precip_data_signature, 10, 9)['valid_rows']
+     #Header in row 10, and there are 9 rows to read (max rows= 9)
+    if len(precip_rows) < 9:
+        print "ERROR: failed to load all precipitation data from file '" \
+            + watershed_precip_input_filename \
+            + "'. Bailing out."
+        sys.exit(0)
+    return numpy.array([row['24-hr'] for row in precip_rows]) * 25.4 #coverts from inches (nrcc default) to mm.
 
+
+def calculate(watershed_data_input_filename, watershed_precip_input_filename, output_filename,  Reg=2):
     watershed_data_signature = [
         {'name': 'BarrierID', 'type': str},
         {'name': 'Area_sqkm', 'type': float},
@@ -14,31 +37,13 @@ def calculate(watershed_data_input_filename, watershed_precip_input_filename, ou
         {'name': 'CN', 'type': float}
     ];
 
-    watershed_data = loader.load(watershed_data_input_filename, watershed_data_signature, 1, -1)
+    watershed_data = loader.load(watershed_data_input_filename, watershed_data_signature, 1, -1, cache=True)
     #Header in row 1, and we want to read all rows (max rows= -1)
     valid_watersheds = watershed_data['valid_rows']
 
-    # Load precipitation data.
-    precip_data = loader.load(watershed_precip_input_filename, precip_data_signature, 10, 9)
-     #Header in row 10, and there are 9 rows to read (max rows= 9)
-    precip_rows = precip_data['valid_rows']
-
-    # If there is a problem loading the precipitation rows (i.e. less than 9 rows), bail out.
-    if len(precip_rows) < 9:
-        print "ERROR: failed to load all precipitation data from file '" \
-            + watershed_precip_input_filename \
-            + "'. Bailing out."
-        sys.exit(0)
-
-    # Create list of preciptations, converted to metric and adjusted.
-    precips_list = []
+    # Load precipitation data (bails out if there are less than 9 rows), converted to metric.
+    P = load_station(watershed_precip_input_filename)
     results = []
-    for row in precip_rows:
-        precips_list.append(row['24-hr'] * 25.4)
-        #coverts from inches (nrcc default) to mm.
-
-    # Clever multi-math technique: convert precips list to a vector aka array:
-    P = numpy.array(precips_list)
 
     for watershed in valid_watersheds:
         BarrierID = watershed['BarrierID']
@@ -60,3 +65,106 @@ def calculate(watershed_data_input_filename, watershed_precip_input_filename, ou
         # instead of just 1 in the results list (ie, ignore the second, third, etc. culvert.)
         for result in results:
             csv_writer.writerow(result)
+
+
+# Station precipitation for many points at once: the nearest station (k = 1) or an inverse-distance
+# weighted blend of the k nearest stations.
+# Parameters:
+#   lat, lon: arrays of point coordinates.
+#   station_lat, station_lon: arrays of station coordinates.
+#   station_P: array (stations, 9) of station precipitation.
+#   k: number of stations to blend.
+#   power: inverse-distance power.
+# Returns:
+#   An array (points, 9) of precipitation.
+def station_precip(lat, lon, station_lat, station_lon, station_P, k=1, power=2):
+    # Distances in km on a local flat projection (fine at county to state scale).
+    # There are few stations, so each chunk of points is measured against all of them at once and the
+    # k nearest are picked with a partial sort.
+    km_per_degree_long = KM_PER_DEGREE_LONG_AT_EQUATOR * numpy.cos(numpy.radians(numpy.mean(station_lat)))
+    station_x = station_lon * km_per_degree_long
+    station_y = station_lat * KM_PER_DEGREE_LAT
+    k = min(k, len(station_P))
+    result = numpy.empty((len(lat), station_P.shape[1]))
+    for start in range(0, len(lat), CHUNK_ROWS):
+        x = lon[start:start + CHUNK_ROWS, numpy.newaxis] * km_per_degree_long
+        y = lat[start:start + CHUNK_ROWS, numpy.newaxis] * KM_PER_DEGREE_LAT
+        distance = numpy.hypot(x - station_x, y - station_y)
+        nearest = numpy.argpartition(distance, k - 1, axis=1)[:, :k]
+        nearest_distance = numpy.take_along_axis(distance, nearest, axis=1)
+        with numpy.errstate(divide='ignore'):
+            weights = 1.0 / nearest_distance ** power
+        # A point on top of a station takes that station's values.
+        on_station = nearest_distance == 0
+        weights = numpy.where(numpy.any(on_station, axis=1)[:, numpy.newaxis], on_station.astype(float), weights)
+        weights /= weights.sum(axis=1)[:, numpy.newaxis]
+        result[start:start + CHUNK_ROWS] = numpy.einsum('ik,ikj->ij', weights, station_P[nearest])
+    return result
+
+
+# Multi-station version of calculate.
+# Parameters:
+#   watershed_data_input_filename, output_filename, Reg: as for calculate.
+#   station_list_filename: csv with Station, Lat, Long and File (an NRCC export like _precip.csv, relative paths
+#                          are from the station list's folder) for every station.
+#   field_data_input_filename: field data csv with the BarrierID, Lat and Long of each culvert.
+#   k, power: number of nearest stations and inverse-distance power (k = 1 takes the nearest station).
+def calculate_stations(watershed_data_input_filename, station_list_filename, field_data_input_filename,
+                       output_filename, Reg=2, k=1, power=2):
+    station_signature = [
+        {'name': 'Station', 'type': str},
+        {'name': 'Lat', 'type': float},
+        {'name': 'Long', 'type': float},
+        {'name': 'File', 'type': str}
+    ];
+    watershed_data_signature = [
+        {'name': 'BarrierID', 'type': str},
+        {'name': 'Area_sqkm', 'type': float},
+        {'name': 'Tc_hr', 'type': float},
+        {'name': 'CN', 'type': float}
+    ];
+    field_data_signature = [
+        {'name': 'BarrierID', 'type': str},
+        {'name': 'Lat', 'type': float},
+        {'name': 'Long', 'type': float}
+    ];
+
+    stations = loader.load(station_list_filename, station_signature, 1, -1)['valid_rows']
+    if len(stations) == 0:
+        print "ERROR: no stations found in '" + station_list_filename + "'. Bailing out."
+        sys.exit(0)
+    station_folder = station_list_filename[:len(station_list_filename) - len(station_list_filename.split('/')[-1])]
+    station_P = numpy.array([load_station(station['File'] if station['File'].startswith('/')
+                                          else station_folder + station['File']) for station in stations])
+    station_lat = numpy.array([station['Lat'] for station in stations])
+    station_lon = numpy.array([station['Long'] for station in stations])
+
+    # Watersheds are placed at their culvert (watershed BarrierID '12albws' drains to culvert '12ALB', see
+    # sorterPrecip.culvert_id).
+    locations = {}
+    for row in loader.load(field_data_input_filename, field_data_signature, 1, -1, cache=True)['valid_rows']:
+        locations.setdefault(sorterPrecip.culvert_id(row['BarrierID']), (row['Lat'], row['Long']))
+    valid_watersheds = []
+    watershed_locations = []
+    watersheds = loader.load(watershed_data_input_filename, watershed_data_signature, 1, -1, cache=True)['valid_rows']
+    for watershed in watersheds:
+        location = locations.get(sorterPrecip.culvert_id(watershed['BarrierID']))
+        if location is not None:
+            valid_watersheds.append(watershed)
+            watershed_locations.append(location)
+        else:
+            print "Did not find culvert location for watershed " + watershed['BarrierID'] + ", skipping it."
+
+    lat = numpy.array([location[0] for location in watershed_locations])
+    lon = numpy.array([location[1] for location in watershed_locations])
+    P = station_precip(lat, lon, station_lat, station_lon, station_P, k, power)
+
+    with open(output_filename, 'wb') as output_file:
+        csv_writer = csv.writer(output_file)
+
+        # Header
+        csv_writer.writerow(['BarrierID', 'Area_sqkm', 'Tc_hr', 'CN', 'Region', 'P1','P2','P5','P10','P25','P50','P100','P200','P500'])
+
+        # Each row.
+        for watershed, precips in zip(valid_watersheds, P.tolist()):
+            csv_writer.writerow([watershed['BarrierID'], watershed['Area_sqkm'], watershed['Tc_hr'], watershed['CN'], Reg] + precips)
@@ -11,80 +11,139 @@
 # Some comments added by Tanvi Naidu June 13 2016
 #
 # Calculate the capacity of a culvert under inlet control
+# (October 2026: or under both inlet and outlet control, see inlet_outlet_control)
 #
 # Inputs: filename for the culv_geom csv, filename to write output to.
 
-import numpy, os, re, csv, loader
-#Imports required packages and modules and the function 'loader' which was written
-# in 2016 and saved as loader.py
-#(loader organizes the data from input file based on headers defined in a signature)
+import numpy, os, re, csv, records, output_writer
+#Imports required packages and modules and 'records', which loads and validates the input file
+# the same way as loader.py (based on headers defined in a signature) but keeps it as compact
+# columns instead of one dictionary per culvert
+
+# Signature for incoming geometry file.
+# This creates a list of dictionaries that stores the relevant headers of
+# the input file and the type of data in the column under that header
+GEOMETRY_SIGNATURE = [
+    {'name': 'BarrierID', 'type': str},
+    #eg: The first element of the list 'geometry_signature' is a dictionary for barrier id.
+    #'BarrierID' is the header of a column of data we want to extract from the input file,containing
+    #data of type strings
+    {'name': 'Survey_ID', 'type': int},
+    {'name': 'NAACC_ID', 'type': int},
+    {'name': 'Lat', 'type': float},
+    {'name': 'Long', 'type': float},
+    {'name': 'HW_m', 'type': float}, 
+    {'name': 'xArea_sqm', 'type': float}, 
+    {'name': 'length_m', 'type': float}, # Length of culvert under road meters
+    {'name': 'D_m', 'type': float}, 
+    {'name': 'c', 'type': float},
+    {'name': 'Y', 'type': float},
+    {'name': 'ks', 'type': float},
+    {'name': 'Culvert_Sl', 'type': float},
+    {'name': 'Field_Comments', 'type': str},
+    {'name': 'Model_Notes', 'type': str},
+    {'name': 'Flags', 'type': int}
+]
+
+# Extra columns from capacity_prep needed for outlet control.
+OUTLET_SIGNATURE = [
+    {'name': 'R_m', 'type': float}, # Hydraulic radius flowing full, meters
+    {'name': 'n', 'type': float}, # Manning's n
+    {'name': 'ke', 'type': float} # Entrance loss coefficient
+]
+
+G = 9.81 # m/s^2
+KU_FRICTION = 19.63 # 2g for the friction loss term in SI units (FHWA HDS-5 eqn 15)
+
+CAPACITY_HEADER = ['BarrierID','NAACC_ID', 'Survey_ID', 'Lat','Long','Q','Flags','Model_Notes','Field_Comments','Culvert_Area']
+
+
+# Inlet control capacity of every culvert in a table, in one array operation.
+# HW: optional headwater above the invert (m) to use instead of the HW_m column. An array of shape (n, 1) gives
+#     capacities for n headwaters per culvert (used for rating curves).
+# Returns:
+#   numpy array of capacities (m^3/s), one per culvert.
+def inlet_capacity(culverts, HW=None):
+    # Get values needed in computation of capacity, one array over all culverts.
+    # constants c, Y, Ks tabulated, depend on entrance type, from FHWA engineering pub HIF12026, appendix A
+    Culvert_Area = culverts.column('xArea_sqm') # Calculated in input data prep script sq. meter
+    if HW is None:
+        HW = culverts.column('HW_m') # Hydraulic head above the culvert invert, meters
+    D = culverts.column('D_m') # Diameter or dimension b, (height of culvert) meters
+    Y = culverts.column('Y')
+    Ks = culverts.column('ks') # -0.5, except where inlet is mitered in which case +0.7
+    S = culverts.column('Culvert_Sl') # meter/meter
+    c = culverts.column('c')
+
+    Ku = 1.811 # adjustment factor for units (SI=1.811)
+
+    Qc = (Culvert_Area * numpy.sqrt(D * ((HW / D) - Y - Ks * S) / c)) / Ku
+    # Culvert eqn from FHWA Eqn A.3, pg 191
+    #Culvert capacity submerged outlet, inlet control (m^3/s)
+    return Qc
+
+
+# Full-flow outlet control capacity of every culvert in a table, in one array operation (FHWA HDS-5, eqns 15-17).
+# The head available is the headwater above the invert plus the fall over the culvert (length x slope), less the
+# outlet water level ho. There is no tailwater data, so ho is taken as the culvert height D (outlet flowing full),
+# the conservative end of the HDS-5 range. The head is lost to entrance, friction and exit losses:
+#   H = (1 + ke + 19.63 n^2 L / R^1.33) V^2 / 2g
+# Returns:
+#   numpy array of capacities (m^3/s), one per culvert (0 where there is no head across the culvert).
+# HW is as for inlet_capacity.
+def outlet_capacity(culverts, HW=None):
+    Culvert_Area = culverts.column('xArea_sqm')
+    if HW is None:
+        HW = culverts.column('HW_m')
+    D = culverts.column('D_m')
+    L = culverts.column('length_m')
+    S = culverts.column('Culvert_Sl')
+    R = culverts.column('R_m')
+    n = culverts.column('n')
+    ke = culverts.column('ke')
+
+    H = numpy.maximum(HW + L * S - D, 0)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        losses = 1 + ke + KU_FRICTION * n ** 2 * L / R ** 1.33
+        Qo = Culvert_Area * numpy.sqrt(2 * G * H / losses)
+    return numpy.where(R > 0, Qo, 0.0)
+
+
+# First culvert of each crossing, grouping culverts the same way as inlet_control
+# (Flags = number of culverts at the crossing, listed in consecutive rows).
+def crossing_starts(flags):
+    starts = []
+    index = 0
+    while index < len(flags):
+        starts.append(index)
+        index += max(int(flags[index]), 1)
+    return numpy.array(starts, dtype=int)
+
 
 def inlet_control(culvert_geometry_filename, output_filename):
 
 
     #csv_writer.writerow(['BarrierID', 'NAACC_ID', 'Lat', 'Long', 'HW_m', 'xArea_sqm', 'length_m', 'D_m', 'c', 'Y', 'ks', 'Culvert_Sl', 'Comments', 'Flags'])
 
-    # Signature for incoming geometry file.
-    # This creates a list of dictionaries that stores the relevant headers of
-    # the input file and the type of data in the column under that header
-    geometry_signature = [
-        {'name': 'BarrierID', 'type': str},
-        #eg: The first element of the list 'geometry_signature' is a dictionary for barrier id.
-        #'BarrierID' is the header of a column of data we want to extract from the input file,containing
-        #data of type strings
-        {'name': 'Survey_ID', 'type': int},
-        {'name': 'NAACC_ID', 'type': int},
-        {'name': 'Lat', 'type': float},
-        {'name': 'Long', 'type': float},
-        {'name': 'HW_m', 'type': float}, 
-        {'name': 'xArea_sqm', 'type': float}, 
-        {'name': 'length_m', 'type': float}, # Length of culvert under road meters
-        {'name': 'D_m', 'type': float}, 
-        {'name': 'c', 'type': float},
-        {'name': 'Y', 'type': float},
-        {'name': 'ks', 'type': float},
-        {'name': 'Culvert_Sl', 'type': float},
-        {'name': 'Field_Comments', 'type': str},
-        {'name': 'Model_Notes', 'type': str},
-        {'name': 'Flags', 'type': int}
-    ]
-
     # Load and validate geometry data.
     # geometry_data will now store the relevant data from the culvert geometry input file
-    # in the format described in loader.py using the signature defined above.
-    # valid_rows will store all value for the key 'valid_rows' in the dictionary geometry_data
-    geometry_data = loader.load(culvert_geometry_filename, geometry_signature, 1, -1)
-    valid_rows = geometry_data["valid_rows"]
+    # as a compact column table (see records.py) using the signature defined above.
+    # culverts will store the table of valid rows from the dictionary geometry_data
+    geometry_data = records.load(culvert_geometry_filename, GEOMETRY_SIGNATURE, 1, -1)
+    culverts = geometry_data["table"]
 
-    # Go through each culvert and calculate capacity.
-    output_data = []
-    for culvert in valid_rows:
-        # Get values needed in computation of capacity.
-        # constants c, Y, Ks tabulated, depend on entrance type, from FHWA engineering pub HIF12026, appendix A
-        Culvert_Area = culvert['xArea_sqm'] # Calculated in input data prep script sq. meter
-        HW = culvert['HW_m'] # Hydraulic head above the culvert invert, meters
-        D = culvert['D_m'] # Diameter or dimension b, (height of culvert) meters
-        Y = culvert['Y']
-        Ks = culvert['ks'] # -0.5, except where inlet is mitered in which case +0.7
-        S = culvert['Culvert_Sl'] # meter/meter
-        c = culvert['c']
-        
-        Ku = 1.811 # adjustment factor for units (SI=1.811)
-              
-        # Calculate capacity for the culvert and store with the rest of the data for that culvert.
-        culvert['Qc'] = (Culvert_Area * numpy.sqrt(D * ((HW / D) - Y - Ks * S) / c)) / Ku 
-        # Culvert eqn from FHWA Eqn A.3, pg 191
-        #Culvert capacity submerged outlet, inlet control (m^3/s)
+    # Calculate capacity for every culvert (inlet control, see inlet_capacity).
+    Qc = inlet_capacity(culverts)
 
     # Now produce output data using this.
     output_data = []
 
-    num_culverts = len(valid_rows)
+    num_culverts = len(culverts)
     cur_culvert_index = 0
 
     # Use a while loop instead of "culverts in valid_rows" because we need to skip some due to multiple-culverts-in-one-spot.
     while cur_culvert_index < num_culverts:
-        culvert = valid_rows[cur_culvert_index]
+        culvert = culverts.row(cur_culvert_index)
         num_culverts_here = culvert['Flags'] 
         if num_culverts_here == 0:
             num_culverts_here = 1 # Confusingly, Flags = 0 used to mean 1 culvert, and 2+ to mean 2+ culvert
@@ -94,7 +153,7 @@ def inlet_control(culvert_geometry_filename, output_filename):
         # If there is just a single culvert (Flags = 0), this simply gets the Qc value for that culvert.
         Qf = 0
         for offset in range (0, num_culverts_here):
-            Qf += valid_rows[cur_culvert_index + offset]['Qc'] #This only works if the flagged culverts are appropriately grouped together in the culv_geom.csv (i.e. the second and third culvert at a crossing appear in the two rows below the first culvert. Data often, but not always, is pre-packaged this way. Culverts at the same crossing usually share the same SurveyIDs, but have different (and not alwyas adjacent) NAACC_IDs. To fix this, we'll first have to do an array sort by both lat and long, and then fill in flags where culvert collectors left them out. We should also address this data collection issue with Andrew.  
+            Qf += float(Qc[cur_culvert_index + offset]) #This only works if the flagged culverts are appropriately grouped together in the culv_geom.csv (i.e. the second and third culvert at a crossing appear in the two rows below the first culvert. Data often, but not always, is pre-packaged this way. Culverts at the same crossing usually share the same SurveyIDs, but have different (and not alwyas adjacent) NAACC_IDs. To fix this, we'll first have to do an array sort by both lat and long, and then fill in flags where culvert collectors left them out. We should also address this data collection issue with Andrew.  
         cur_culvert_index += num_culverts_here
 
         # Compose the output data list.
@@ -106,8 +165,52 @@ def inlet_control(culvert_geometry_filename, output_filename):
         csv_writer = csv.writer(output_file)
 
         # Header
-        csv_writer.writerow(['BarrierID','NAACC_ID', 'Survey_ID', 'Lat','Long','Q','Flags','Model_Notes','Field_Comments','Culvert_Area'])
+        csv_writer.writerow(CAPACITY_HEADER)
 
         # Each row.
         for result in output_data:
             csv_writer.writerow(result)
+
+
+# Capacity under both inlet and outlet control.
+# Each barrel's capacity is the lower (governing) of the two, and barrels are summed per crossing.
+# Writes the same columns as inlet_control, plus the inlet and outlet control capacities of each crossing and
+# which one governs (Inlet, Outlet, or Mixed for crossings whose barrels differ).
+# Needs the R_m, n and ke columns written by capacity_prep.
+def inlet_outlet_control(culvert_geometry_filename, output_filename):
+    geometry_data = records.load(culvert_geometry_filename, GEOMETRY_SIGNATURE + OUTLET_SIGNATURE, 1, -1)
+    culverts = geometry_data["table"]
+
+    Qi = inlet_capacity(culverts)
+    Qo = outlet_capacity(culverts)
+    with numpy.errstate(invalid='ignore'):
+        outlet_governs = Qo < Qi
+    Qc = numpy.where(outlet_governs, Qo, Qi) # a NaN inlet capacity stays NaN, as in inlet_control
+
+    # Sum the barrels of each crossing, and report the row of the first one.
+    starts = crossing_starts(culverts.column('Flags'))
+    if len(starts) == 0:
+        output_writer.write(output_filename, CAPACITY_HEADER + ['Q_Inlet', 'Q_Outlet', 'Control'], [[]] * 13)
+        return
+    Q = numpy.add.reduceat(Qc, starts)
+    Q_inlet = numpy.add.reduceat(Qi, starts)
+    Q_outlet = numpy.add.reduceat(Qo, starts)
+    num_outlet = numpy.add.reduceat(outlet_governs.astype(int), starts)
+    num_barrels = numpy.diff(numpy.append(starts, len(culverts)))
+    control = numpy.where(num_outlet == 0, 'Inlet', numpy.where(num_outlet == num_barrels, 'Outlet', 'Mixed'))
+
+    output_writer.write(output_filename, CAPACITY_HEADER + ['Q_Inlet', 'Q_Outlet', 'Control'], [
+        [culverts.strings('BarrierID')[i] for i in starts],
+        culverts.column('NAACC_ID')[starts],
+        culverts.column('Survey_ID')[starts],
+        culverts.column('Lat')[starts],
+        culverts.column('Long')[starts],
+        Q,
+        culverts.column('Flags')[starts],
+        [culverts.strings('Model_Notes')[i] for i in starts],
+        [culverts.strings('Field_Comments')[i] for i in starts],
+        culverts.column('xArea_sqm')[starts],
+        Q_inlet,
+        Q_outlet,
+        list(control)
+    ])
@@ -23,12 +23,22 @@
 #
 # Outputs: culvert_capcity_input: a new csv file that contains all necessary
 # parameters to run the culvert capacity script.
+#
+# October 2026: also writes the hydraulic radius, Manning's n and entrance loss coefficient
+# of each culvert (R_m, n, ke) for outlet control in capacity.inlet_outlet_control.
 
 import numpy, os, re, csv, loader
 #Imports required packages and modules and the function loader which was written
 # in 2016 and saved as loader.py
 #(loader organizes the data from input file based on headers defined in a signature)
 
+# Manning's n by culvert material (FHWA HDS-5, Table B.1 typical values; corrugated metal for Metal)
+MANNING_N = {'Concrete': 0.012, 'Stone': 0.025, 'Plastic': 0.012, 'Metal': 0.024, 'Wood': 0.020, 'Combination': 0.024}
+
+# Entrance loss coefficient ke by inlet type (FHWA HDS-5, Table C.2, square edge unless noted)
+ENTRANCE_LOSS = {'Projecting': 0.9, 'Headwall': 0.5, 'Mitered to Slope': 0.7, 'Wingwall': 0.4,
+                 'Wingwall and Headwall': 0.5}
+
 #Function for calculations
 def geometry(field_data_input_filename, output_filename):
 
@@ -61,7 +71,7 @@ def geometry(field_data_input_filename, output_filename):
     # field_data will now store the relevant data from the culvert geometry input file
     # in the format described in loader.py using the signature defined above.
     # valid_rows will store all value for the key 'valid_rows' in the dictionary field_data
-    field_data = loader.load(field_data_input_filename, field_data_signature, 1, -1)
+    field_data = loader.load(field_data_input_filename, field_data_signature, 1, -1, cache=True)
     valid_rows = field_data['valid_rows']
 
     # Modify data.
@@ -108,6 +118,25 @@ def geometry(field_data_input_filename, output_filename):
             xArea_sqm=((A/2)*(B/2)*3.14159)/2
             D=B # if culvert is an arch, depth is B
 
+        # wetted perimeter flowing full (ellipse perimeter from Ramanujan's approximation), for the hydraulic radius
+        if Culvert_shape == "Round":
+            perimeter = 3.14159 * A
+        elif Culvert_shape == 'Box':
+            perimeter = 2 * (A + B)
+        else:
+            ellipse_perimeter = 3.14159 * (3 * (A / 2 + B / 2) - ((3 * A / 2 + B / 2) * (A / 2 + 3 * B / 2)) ** 0.5)
+            if Culvert_shape == 'Arch':
+                perimeter = ellipse_perimeter / 2 + A # half ellipse plus the flat bottom
+            else:
+                perimeter = ellipse_perimeter
+        R = xArea_sqm / perimeter if perimeter > 0 else 0 # hydraulic radius, m
+
+        # roughness and entrance loss for outlet control (projecting concrete ends are a socket/square cut, not thin wall)
+        n = MANNING_N.get(Culvert_material, 0.024)
+        ke = ENTRANCE_LOSS.get(Inlet_type, 0.5)
+        if Inlet_type == 'Projecting' and (Culvert_material == "Concrete" or Culvert_material == "Stone"):
+            ke = 0.5
+
         # Calculate head over invert by adding dist from road to top of culvert to D
         H = HW /  3.2808 + D
         #Tanvi Naidu (6/16/2017): Changed from 'Out_A' to 'HW'
@@ -226,7 +255,7 @@ def geometry(field_data_input_filename, output_filename):
         #all combination culvert material types and Box/Plastic or Metal/any other type of Inlet thats not Headwall  - Sharon
 
         # Add current output row to output_data
-        output_data.append([BarrierID, NAACC_ID, Survey_ID, Lat, Long, H, xArea_sqm, length, D, c, Y, ks, Culvert_Sl, Fcomments, Flags, comments])
+        output_data.append([BarrierID, NAACC_ID, Survey_ID, Lat, Long, H, xArea_sqm, length, D, c, Y, ks, Culvert_Sl, Fcomments, Flags, comments, R, n, ke])
 
 
     # Set up to save results to new file.
@@ -234,7 +263,7 @@ def geometry(field_data_input_filename, output_filename):
         csv_writer = csv.writer(output_file)
 
         # Header
-        csv_writer.writerow(['BarrierID', 'NAACC_ID', 'Survey_ID', 'Lat', 'Long', 'HW_m', 'xArea_sqm', 'length_m', 'D_m', 'c', 'Y', 'ks', 'Culvert_Sl', 'Field_Comments', 'Flags', 'Model_Notes'])
+        csv_writer.writerow(['BarrierID', 'NAACC_ID', 'Survey_ID', 'Lat', 'Long', 'HW_m', 'xArea_sqm', 'length_m', 'D_m', 'c', 'Y', 'ks', 'Culvert_Sl', 'Field_Comments', 'Flags', 'Model_Notes', 'R_m', 'n', 'ke'])
 
         # Each row.
         for row in output_data:
@@ -0,0 +1,218 @@
+# Checkpoints and progress reporting for long runs
+# October 2026
+#
+# This script will let long runs (statewide, sensitivity and continuous simulations) continue after a failure
+# instead of starting over:
+# a) a manifest (json) lists the work that is complete: model stages with the files they read and wrote, and
+#    chunks (shards, sample blocks) with the file holding their result,
+# b) chunk results and the manifest are written to a temporary file and renamed into place, so a run that stops
+#    part way never leaves a half written result that looks complete, and
+# c) on resume, stages whose inputs and outputs have not changed since they finished, and chunks already saved,
+#    are skipped. A manifest from a run with other inputs or parameters is ignored.
+#
+# Progress is printed per stage as work completes: items done, rate, and time left at that rate.
+#
+# Example:
+#   state = checkpoint.open_checkpoint(prefix + 'sensitivity_checkpoint.json', signature, resume=True)
+#   results = checkpoint.map_chunks(evaluate_job, jobs, state, 'sensitivity samples', processes)
+#   checkpoint.finish(state)
+
+import os, sys, json, time, cPickle, shutil, multiprocessing, input_cache
+
+MANIFEST_VERSION = 1
+PROGRESS_INTERVAL = 10.0  # Seconds between progress lines
+
+
+# Size and modification time of a file, or None if it does not exist.
+def file_state(filename):
+    try:
+        status = os.stat(filename)
+    except OSError:
+        return None
+    return [status.st_size, int(status.st_mtime * 1000)]
+
+
+# Signature of some parameters and input files: a manifest is only used for a run with the same signature.
+# Input files are compared by contents, since some runs write them again before starting (e.g. statewide.combine).
+def signature(parameters, filenames=()):
+    return json.dumps([repr(parameters)] + [[os.path.abspath(name), input_cache.file_hash(name)
+                                             if os.path.exists(name) else None] for name in filenames])
+
+
+# Write a file through a temporary file in the same folder, renamed into place once complete.
+# Parameters:
+#   write: function called with the open temporary file.
+def write_atomic(filename, write):
+    temporary = filename + '.' + str(os.getpid()) + '.partial'
+    with open(temporary, 'wb') as output_file:
+        write(output_file)
+    input_cache.replace(temporary, filename)
+
+
+# Open the checkpoint of a run.
+# Parameters:
+#   manifest_filename: manifest file. Chunk results are kept in the folder <manifest without .json>_chunks/.
+#   run_signature: signature of the run (see signature).
+#   resume: True to continue from the manifest, False to start over.
+# Returns:
+#   A checkpoint dictionary with the manifest filename, chunk folder and the manifest itself.
+def open_checkpoint(manifest_filename, run_signature, resume=False):
+    state = {
+        'filename': manifest_filename,
+        'folder': os.path.splitext(manifest_filename)[0] + '_chunks/',
+        'manifest': {'version': MANIFEST_VERSION, 'signature': run_signature, 'stages': {}, 'chunks': {}}
+    }
+    if resume and os.path.exists(manifest_filename):
+        try:
+            with open(manifest_filename, 'r') as manifest_file:
+                manifest = json.load(manifest_file)
+        except ValueError:
+            manifest = {}
+        if manifest.get('version') == MANIFEST_VERSION and manifest.get('signature') == run_signature:
+            state['manifest'] = manifest
+            print " * Resuming from checkpoint " + manifest_filename + " (" + str(len(manifest['stages'])) \
+                + " stages and " + str(len(manifest['chunks'])) + " chunks done)."
+        else:
+            print " * Checkpoint " + manifest_filename + " is from a different run; starting over."
+    elif resume:
+        print " * No checkpoint " + manifest_filename + " to resume from; starting from the beginning."
+    if state['manifest']['chunks'] == {} and os.path.exists(state['folder']):
+        shutil.rmtree(state['folder'])
+    return state
+
+
+def save_manifest(state):
+    write_atomic(state['filename'], lambda output_file: output_file.write(json.dumps(state['manifest'], indent=1)))
+
+
+# Whether a stage finished with the same call, and its input and output files are as it left them.
+def stage_done(state, name, call, inputs, outputs):
+    entry = state['manifest']['stages'].get(name)
+    if entry is None or entry['call'] != call:
+        return False
+    for filename in list(inputs) + list(outputs):
+        if entry['files'].get(filename) != file_state(filename) or file_state(filename) is None:
+            return False
+    return True
+
+
+# Record a finished stage.
+def mark_stage(state, name, call, inputs, outputs, seconds):
+    state['manifest']['stages'][name] = {
+        'call': call,
+        'files': dict((filename, file_state(filename)) for filename in list(inputs) + list(outputs)),
+        'seconds': seconds
+    }
+    save_manifest(state)
+
+
+# Result of a finished chunk, or None.
+def load_chunk(state, key):
+    filename = state['manifest']['chunks'].get(key)
+    if filename is None or not os.path.exists(state['folder'] + filename):
+        return None
+    with open(state['folder'] + filename, 'rb') as chunk_file:
+        return (cPickle.load(chunk_file),)
+
+
+# Save the result of a finished chunk and record it.
+def save_chunk(state, key, result):
+    if not os.path.exists(state['folder']):
+        os.makedirs(state['folder'])
+    filename = 'chunk_' + str(len(state['manifest']['chunks'])) + '.pkl'
+    write_atomic(state['folder'] + filename,
+                 lambda output_file: cPickle.dump(result, output_file, cPickle.HIGHEST_PROTOCOL))
+    state['manifest']['chunks'][key] = filename
+    save_manifest(state)
+
+
+# Remove the checkpoint of a completed run (the chunk results are no longer needed).
+def finish(state):
+    if os.path.exists(state['folder']):
+        shutil.rmtree(state['folder'])
+    if os.path.exists(state['filename']):
+        os.remove(state['filename'])
+
+
+def format_seconds(seconds):
+    seconds = int(round(seconds))
+    return '%d:%02d:%02d' % (seconds // 3600, (seconds // 60) % 60, seconds % 60)
+
+
+# Rate-based progress and time left for one stage.
+# Items done before the run started (resumed) count towards the progress but not the rate.
+class Progress(object):
+    def __init__(self, label, total, done=0, interval=PROGRESS_INTERVAL):
+        self.label = label
+        self.total = total
+        self.done = done
+        self.resumed = done
+        self.interval = interval
+        self.started = time.time()
+        self.printed = self.started
+
+    def update(self, count=1):
+        self.done += count
+        now = time.time()
+        if now - self.printed < self.interval and self.done < self.total:
+            return
+        self.printed = now
+        elapsed = max(now - self.started, 1e-9)
+        rate = (self.done - self.resumed) / elapsed
+        line = "   " + self.label + ": " + str(self.done) + " of " + str(self.total) \
+            + " (" + ('%.0f' % (100.0 * self.done / max(self.total, 1))) + "%), " + ('%.3g' % rate) + " per s"
+        if self.done < self.total and rate > 0:
+            line += ", about " + format_seconds((self.total - self.done) / rate) + " left"
+        elif self.done >= self.total:
+            line += ", took " + format_seconds(elapsed)
+        print line
+        sys.stdout.flush()
+
+
+# Worker wrapper for map_chunks.
+def chunk_job(job):
+    function, index, arguments = job
+    return index, function(arguments)
+
+
+# Run a function over jobs on a worker pool, saving each result as it arrives and reporting progress.
+# Parameters:
+#   function: module level function taking one job.
+#   jobs: list of jobs.
+#   state: checkpoint (see open_checkpoint), or None to keep nothing. A job's key is its position in the list,
+#          so the jobs of a resumed run must be made the same way.
+#   label: name of the work in progress lines.
+#   processes: number of worker processes (defaults to the number of cores, 1 to run in this process).
+#   maxtasksperchild: passed to multiprocessing.Pool.
+# Returns:
+#   The list of results, in job order.
+def map_chunks(function, jobs, state, label, processes=None, maxtasksperchild=None):
+    results = [None] * len(jobs)
+    remaining = []
+    for index in range(len(jobs)):
+        saved = load_chunk(state, str(index)) if state is not None else None
+        if saved is None:
+            remaining.append(index)
+        else:
+            results[index] = saved[0]
+    progress = Progress(label, len(jobs), len(jobs) - len(remaining))
+
+    def done(index, result):
+        results[index] = result
+        if state is not None:
+            save_chunk(state, str(index), result)
+        progress.update()
+
+    if processes == 1 or len(remaining) <= 1:
+        for index in remaining:
+            done(index, function(jobs[index]))
+    else:
+        pool = multiprocessing.Pool(processes, maxtasksperchild=maxtasksperchild)
+        try:
+            for index, result in pool.imap_unordered(chunk_job, [(function, index, jobs[index])
+                                                                  for index in remaining]):
+                done(index, result)
+        finally:
+            pool.close()
+            pool.join()
+    return results
@@ -0,0 +1,269 @@
+# Continuous daily simulation
+# October 2026
+#
+# This script will run the model over long daily precipitation records instead of design storms, to show how
+# often each culvert would actually have overtopped:
+# a) each day's runoff uses the SCS curve number equation with the curve number adjusted for antecedent moisture
+#    (AMC I, II or III from the rainfall of the 5 days before, NEH 630 chapter 10 thresholds and conversions),
+# b) the peak flow is the runoff depth times the qu ("Peak multiplier") times the area, with qu interpolated on the
+#    day's rainfall between the watershed's design storms (as in storm_query.py), and
+# c) every day's peak flow is compared with the crossing capacity, counting exceedance days and keeping the
+#    annual maximum flows.
+#
+# The precipitation record is a numpy array (days x watersheds, mm) read through a memory map, so 50 years of
+# 100,000 watersheds never has to fit in memory. It is processed in blocks of days and watersheds, and the blocks
+# of watersheds are spread over worker processes. Use convert to make the array from a csv with a Date column
+# (YYYY-MM-DD, consecutive days) and one column of daily precipitation (mm) per watershed BarrierID. Blank and
+# non-numeric cells (e.g. the T and M trace and missing flags of station exports) are missing days.
+#
+# Inputs:  sorted watershed file and capacity output of a finished run, and the precipitation record:
+#          <record>.npy (days x watersheds), <record>_dates.npy (first day only is used) and <record>_ids.csv.
+# Outputs: summary csv (exceedance days and years, overtopping return period, largest flow and its date per
+#          crossing) and <output>_annual_max.npz (years, BarrierIDs, annual maximum flows).
+
+import csv, os, sys, numpy, loader, runoffP, storm_query, checkpoint
+
+GROWING_MONTHS = (5, 6, 7, 8, 9)  # May to September
+# 5 day antecedent rainfall (mm) below which AMC I and above which AMC III applies: (dormant, growing) season.
+AMC_I_BELOW = (12.7, 35.6)
+AMC_III_ABOVE = (27.9, 53.3)
+ANTECEDENT_DAYS = 5
+MAX_CELLS = 1000000  # Largest days x watersheds block (the qu interpolation uses 9 times as much)
+
+
+# Curve numbers for dry (AMC I) and wet (AMC III) antecedent conditions.
+def amc_curve_numbers(CN):
+    return CN / (2.281 - 0.01281 * CN), CN / (0.427 + 0.00573 * CN)
+
+
+# Daily precipitation (mm) of a csv cell, NaN (missing) for a blank or non-numeric cell.
+def precip_value(cell):
+    try:
+        return float(cell)
+    except ValueError:
+        return numpy.nan
+
+
+# Convert a csv of daily precipitation (Date, then one column per watershed BarrierID, mm) to the record arrays.
+# The csv is read row by row into a memory-mapped array, so it can be larger than memory.
+def convert(csv_filename, record_filename):
+    base = os.path.splitext(record_filename)[0]
+    try:
+        with open(csv_filename, 'r') as csv_file:
+            reader = csv.reader(csv_file)
+            header = next(reader)
+            num_days = sum(1 for row in reader)
+    except IOError:
+        print "ERROR: Could not find file '" \
+            + csv_filename \
+            + "'. Bailing out."
+        sys.exit(0)
+    if 'Date' not in header:
+        print "ERROR: file '" + csv_filename + "' has no Date column. Bailing out."
+        sys.exit(0)
+    date_column = header.index('Date')
+    columns = [index for index in range(len(header)) if index != date_column]
+    precip = numpy.lib.format.open_memmap(base + '.npy', mode='w+', dtype=numpy.float32,
+                                          shape=(num_days, len(columns)))
+    dates = numpy.empty(num_days, dtype='datetime64[D]')
+    with open(csv_filename, 'r') as csv_file:
+        reader = csv.reader(csv_file)
+        next(reader)
+        for day, row in enumerate(reader):
+            dates[day] = numpy.datetime64(row[date_column].strip()[:10])
+            precip[day] = [precip_value(row[index]) if index < len(row) else numpy.nan for index in columns]
+    if num_days > 1 and numpy.any(numpy.diff(dates) != numpy.timedelta64(1, 'D')):
+        print "ERROR: the dates in '" + csv_filename + "' are not consecutive days. Bailing out."
+        sys.exit(0)
+    precip.flush()
+    numpy.save(base + '_dates.npy', dates)
+    with open(base + '_ids.csv', 'wb') as ids_file:
+        csv_writer = csv.writer(ids_file)
+        csv_writer.writerow(['BarrierID'])
+        for index in columns:
+            csv_writer.writerow([header[index]])
+
+
+# Open a precipitation record.
+# Returns:
+#   A dictionary with 'precip' (memory-mapped days x watersheds array, mm), 'dates' and 'barrier_id' (column order).
+def load_record(record_filename):
+    base = os.path.splitext(record_filename)[0]
+    if not os.path.exists(base + '.npy'):
+        print "ERROR: Could not find file '" \
+            + base + '.npy' \
+            + "'. Bailing out."
+        sys.exit(0)
+    precip = numpy.load(base + '.npy', mmap_mode='r')
+    first_day = numpy.load(base + '_dates.npy')[0]
+    barrier_ids = [row['BarrierID'] for row in
+                   loader.load(base + '_ids.csv', [{'name': 'BarrierID', 'type': str}], 1, -1)['valid_rows']]
+    if len(barrier_ids) != precip.shape[1]:
+        print "ERROR: '" + base + "_ids.csv' does not list one BarrierID per column of the record. Bailing out."
+        sys.exit(0)
+    return {
+        'precip': precip,
+        'dates': first_day + numpy.arange(precip.shape[0]).astype('timedelta64[D]'),
+        'barrier_id': barrier_ids
+    }
+
+
+# Load the watersheds and capacities of the crossings in the record.
+# Returns:
+#   A model dictionary (see storm_query.crossing_model) plus the record column of each crossing.
+def load_model(sorted_filename, capacity_filename, record_ids, peak_method='qu', rain_type='II', qu_table=''):
+    record_lookup = dict((barrier_id, column) for column, barrier_id in enumerate(record_ids))
+    model = storm_query.crossing_model(runoffP.modeled_crossings(sorted_filename, capacity_filename,
+                                                                 barrier_ids=record_lookup),
+                                       peak_method, rain_type, qu_table)
+    model['column'] = numpy.array([record_lookup[barrier_id] for barrier_id in model['barrier_id']], dtype=int)
+    return model
+
+
+# Select some crossings of a model.
+def subset(model, rows):
+    return dict((name, value[rows] if isinstance(value, numpy.ndarray) else value) for name, value in model.items()
+                if name != 'barrier_id')
+
+
+# Daily peak flows (m^3/s) of some crossings.
+# Parameters:
+#   model: model dictionary for the crossings.
+#   P: array (crossings x days) of daily precipitation (mm).
+#   antecedent: array (crossings x days) of the precipitation of the 5 days before each day (mm).
+#   growing: boolean array (days) of growing season days.
+def daily_peak_flows(model, P, antecedent, growing):
+    season = growing.astype(int)[numpy.newaxis, :]
+    dry = antecedent < numpy.take(AMC_I_BELOW, season)
+    wet = antecedent > numpy.take(AMC_III_ABOVE, season)
+    CN = model['CN'][:, numpy.newaxis]
+    CN_I, CN_III = amc_curve_numbers(CN)
+    CN = numpy.where(dry, CN_I, numpy.where(wet, numpy.minimum(CN_III, 100), CN))
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        Storage = 0.1 * ((25400.0 / CN) - 254.0)  # cm
+        Ia = 0.2 * Storage
+        P = P / 10  # cm
+        Q = numpy.where(P > Ia, (P - Ia) ** 2 / (P + (Storage - Ia)), 0.0)
+    return Q * storm_query.unit_peak(model, numpy.maximum(P, 1e-9)) * model['area'][:, numpy.newaxis]
+
+
+# Worker: simulate one block of crossings over the whole record.
+# Returns:
+#   Exceedance days, annual maxima (years x crossings), largest flow and the day it happened.
+def simulate_job(job):
+    model, record_filename, years, days_per_block = job
+    record = load_record(record_filename)
+    precip = record['precip']
+    dates = record['dates']
+    months = (dates.astype('datetime64[M]').astype(int) % 12) + 1
+    year_index = dates.astype('datetime64[Y]').astype(int) + 1970 - years[0]
+    growing = numpy.in1d(months, GROWING_MONTHS)
+    columns = model['column']
+    num = len(columns)
+    exceeded = numpy.zeros(num, dtype=int)
+    annual_max = numpy.zeros((len(years), num))
+    largest = numpy.zeros(num)
+    largest_day = numpy.zeros(num, dtype=int)
+
+    for start in range(0, len(dates), days_per_block):
+        stop = min(start + days_per_block, len(dates))
+        first = max(start - ANTECEDENT_DAYS, 0)
+        # Missing days count as dry.
+        block = numpy.nan_to_num(numpy.asarray(precip[first:stop, columns], dtype=float)).T
+        running = numpy.concatenate([numpy.zeros((num, 1)), numpy.cumsum(block, axis=1)], axis=1)
+        day = numpy.arange(start - first, stop - first)
+        antecedent = running[:, day] - running[:, numpy.maximum(day - ANTECEDENT_DAYS, 0)]
+        flows = daily_peak_flows(model, block[:, day], antecedent, growing[start:stop])
+
+        exceeded += numpy.sum(flows > model['capacity'][:, numpy.newaxis], axis=1)
+        block_best = numpy.argmax(flows, axis=1)
+        block_largest = flows[numpy.arange(num), block_best]
+        better = block_largest > largest
+        largest = numpy.where(better, block_largest, largest)
+        largest_day = numpy.where(better, block_best + start, largest_day)
+        for year in numpy.unique(year_index[start:stop]):
+            in_year = year_index[start:stop] == year
+            annual_max[year] = numpy.maximum(annual_max[year], flows[:, in_year].max(axis=1))
+    return exceeded, annual_max, largest, largest_day
+
+
+# Run the continuous simulation and save the results.
+# Parameters:
+#   sorted_filename: sorted watershed file (runoffP input).
+#   capacity_filename: capacity output file.
+#   record_filename: precipitation record (.npy, with its _dates.npy and _ids.csv).
+#   output_filename: summary csv to write (the annual maxima go next to it, ending in _annual_max.npz).
+#   processes: number of worker processes (defaults to the number of cores, 1 to run in this process).
+#   peak_method, rain_type, qu_table: as for runoffP.calculate.
+#   resume: True to reuse the blocks of crossings a failed run with the same inputs finished (see checkpoint.py).
+# Returns:
+#   A list of the summary rows.
+def simulate(sorted_filename, capacity_filename, record_filename, output_filename, processes=None,
+             peak_method='qu', rain_type='II', resume=False, qu_table=''):
+    base = os.path.splitext(record_filename)[0]
+    # The record itself (often many GB) is compared by size and time, the other inputs by contents.
+    state = checkpoint.open_checkpoint(output_filename[:-4] + '_checkpoint.json', checkpoint.signature(
+        [peak_method, rain_type, qu_table, MAX_CELLS, checkpoint.file_state(base + '.npy')],
+        [sorted_filename, capacity_filename, base + '_dates.npy', base + '_ids.csv'] + ([qu_table] if qu_table else [])),
+        resume)
+    record = load_record(record_filename)
+    model = load_model(sorted_filename, capacity_filename, record['barrier_id'], peak_method, rain_type, qu_table)
+    num = len(model['barrier_id'])
+    if num == 0:
+        print "ERROR: none of the modeled crossings have a column in the precipitation record. Bailing out."
+        sys.exit(0)
+    dates = record['dates']
+    years = numpy.arange(dates[0].astype('datetime64[Y]').astype(int) + 1970,
+                         dates[-1].astype('datetime64[Y]').astype(int) + 1971)
+
+    # Blocks of crossings for the workers, each simulated over blocks of days. Crossings are taken in record
+    # column order, so each block reads nearby columns of the memory map.
+    by_column = numpy.argsort(model['column'], kind='mergesort')
+    crossings_per_job = max(1, min(num, 2000))
+    days_per_block = max(ANTECEDENT_DAYS + 1, MAX_CELLS // crossings_per_job)
+    jobs = [(subset(model, by_column[start:start + crossings_per_job]), record_filename, years, days_per_block)
+            for start in range(0, num, crossings_per_job)]
+    results = checkpoint.map_chunks(simulate_job, jobs, state, 'blocks of crossings', processes)
+    exceeded = numpy.concatenate([result[0] for result in results])
+    annual_max = numpy.hstack([result[1] for result in results])
+    largest = numpy.concatenate([result[2] for result in results])
+    largest_day = numpy.concatenate([result[3] for result in results])
+    back = numpy.argsort(by_column)
+    exceeded, annual_max, largest, largest_day = exceeded[back], annual_max[:, back], largest[back], largest_day[back]
+
+    # Partial first and last years are kept; the overtopping return period uses the number of years simulated.
+    years_exceeded = numpy.sum(annual_max > model['capacity'], axis=0)
+    num_years = len(years)
+    summary = []
+    for index, barrier_id in enumerate(model['barrier_id']):
+        return_period = '' if years_exceeded[index] == 0 else (num_years + 1.0) / years_exceeded[index]
+        summary.append([barrier_id, model['capacity'][index], exceeded[index], years_exceeded[index],
+                        float(exceeded[index]) / num_years, return_period, largest[index],
+                        str(dates[largest_day[index]])])
+
+    with open(output_filename, 'wb') as output_file:
+        csv_writer = csv.writer(output_file)
+        csv_writer.writerow(['BarrierID', 'Capacity (m^3/s)', 'Days Exceeded', 'Years Exceeded',
+                             'Exceedance Days per Year', 'Overtopping Return Period (yr)', 'Largest Flow (m^3/s)',
+                             'Largest Flow Date'])
+        for row in summary:
+            csv_writer.writerow(row)
+    numpy.savez(output_filename[:-4] + '_annual_max.npz', years=years, barrier_id=numpy.array(model['barrier_id']),
+                annual_max=annual_max.astype(numpy.float32))
+    checkpoint.finish(state)
+    return summary
+
+
+if __name__ == '__main__':
+    print('Cornell Culvert Evaluation Model - continuous daily simulation')
+    print('--------------------------------------------------------------\n')
+
+    FileNm = raw_input("Please enter your data file prefix, which should also be your data folder name: \n")
+    RecordFile = raw_input("Path to the daily precipitation record (.npy, or a csv to convert first): \n")
+    if RecordFile.endswith('.csv'):
+        convert(RecordFile, RecordFile[:-4] + '.npy')
+        RecordFile = RecordFile[:-4] + '.npy'
+    output_prefix = "../" + FileNm + "/" + FileNm + "_Model_Output/" + FileNm + "_"
+    simulate(output_prefix + 'sorted_ws.csv', output_prefix + 'capacity_output.csv', RecordFile,
+             output_prefix + 'continuous.csv')
+    print "\nDone! The continuous simulation results can be found here:\n" + output_prefix + 'continuous.csv'
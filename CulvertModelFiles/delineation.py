@@ -0,0 +1,349 @@
+# DEM watershed delineation
+# October 2026
+#
+# This script will delineate the watershed of every culvert from a DEM, in place of the ArcGIS
+# "93_Model_WS_delin" and "98_Model_CreateWS" models, which delineate one culvert at a time:
+# a) depressions are filled by priority-flood (Barnes et al. 2014), which also gives every filled flat a flow
+#    direction towards the point where it spills,
+# b) D8 flow directions (ArcGIS codes 1 = E, 2 = SE, 4 = S ... 128 = NE) go to the steepest lower neighbor, or
+#    follow the priority-flood direction on flats,
+# c) flow accumulation is found by passing cells downstream in waves (every cell whose upstream cells are done),
+# d) each culvert point is snapped to the cell of highest accumulation within the snap distance, and
+# e) one pass back up the same waves labels every cell with the first culvert downstream of it and measures the
+#    flow length down to the DEM edge, for all culverts at once.
+#
+# Each label covers the area between a culvert and the culverts upstream of it. The label file lists, for each
+# culvert, its label, its whole upstream area (Area_sqkm), the label of the next culvert downstream and the flow
+# length at the culvert, which is what watershed_params.py needs to compute CN and Tc for the whole watershed.
+#
+# Rasters are ESRI float grids read and written through memory maps (see raster.py). The DEM, the culvert
+# shapefile and the outputs must share one projection (UTM meters, as for the model's GIS files). Per-cell work
+# arrays are memory-mapped files next to the outputs, removed at the end.
+#
+# Inputs:  DEM (.flt) and culvert point shapefile with a BarrierID field (e.g. the NAACC points exported from
+#          ArcGIS; All_Culverts_shapefile holds the watershed polygons and is refused).
+# Outputs: <prefix>filled.flt, <prefix>flowdir.flt, <prefix>flowacc.flt, <prefix>flowlen.flt, <prefix>slope.flt
+#          (percent), <prefix>labels.flt and <prefix>watersheds.csv (Label, BarrierID, Area_sqkm,
+#          Downstream_Label, Outlet_Length, Snap_m).
+#
+# Example:
+#   delineation.delineate('../ALB/GIS_files/DEMs/dem.flt', '../ALB/GIS_files/Culvert_points/Culvert_points.shp',
+#                         '../ALB/GIS_files/Temp/ALB_')
+#   watershed_params.calculate('../ALB/GIS_files/Temp/ALB_labels.flt', '../ALB/GIS_files/Temp/ALB_watersheds.csv',
+#                              landcover, soil, cn_table, '../ALB/GIS_files/Temp/ALB_flowlen.flt',
+#                              '../ALB/GIS_files/Temp/ALB_slope.flt', '../ALB/All_Culverts.csv')
+
+import os, sys, csv, heapq, collections, numpy, raster, shapefiles
+
+# D8 directions: code, row step and column step, clockwise from east.
+CODES = numpy.array([1, 2, 4, 8, 16, 32, 64, 128])
+ROW_STEP = numpy.array([0, 1, 1, 1, 0, -1, -1, -1])
+COL_STEP = numpy.array([1, 1, 0, -1, -1, -1, 0, 1])
+STEP_LENGTH = numpy.hypot(ROW_STEP, COL_STEP)
+CODE_INDEX = numpy.full(129, -1, dtype=int)
+CODE_INDEX[CODES] = numpy.arange(8)
+CHUNK_CELLS = 1 << 22
+SNAP_DISTANCE = 30.0  # m
+
+
+# Read a window with a one cell border (NaN off the raster or where there is no data).
+def read_padded(grid, window):
+    row0, row1, col0, col1 = window
+    padded = numpy.full((row1 - row0 + 2, col1 - col0 + 2), numpy.nan)
+    top, bottom = max(row0 - 1, 0), min(row1 + 1, grid['nrows'])
+    left, right = max(col0 - 1, 0), min(col1 + 1, grid['ncols'])
+    padded[top - row0 + 1:bottom - row0 + 1, left - col0 + 1:right - col0 + 1] = \
+        raster.read_window(grid, (top, bottom, left, right))
+    return padded
+
+
+# Neighbor k of every cell in a padded window.
+def neighbor(padded, k):
+    rows, cols = padded.shape[0] - 2, padded.shape[1] - 2
+    return padded[1 + ROW_STEP[k]:1 + ROW_STEP[k] + rows, 1 + COL_STEP[k]:1 + COL_STEP[k] + cols]
+
+
+# Fill depressions by priority-flood, starting from every cell on the DEM edge or next to missing data.
+# The filled DEM and the direction each cell was reached from are written to filled and direction.
+def fill(dem, filled, direction, closed, tile_size):
+    ncols, nrows = dem['ncols'], dem['nrows']
+    elevation = dem['data'].reshape(-1)
+    level_out = filled['data'].reshape(-1)
+    flow = direction['data'].reshape(-1)
+
+    heap = []
+    for window in raster.windows(dem, tile_size):
+        row0, row1, col0, col1 = window
+        padded = read_padded(dem, window)
+        center = padded[1:-1, 1:-1]
+        valid = numpy.isfinite(center)
+        edge = numpy.zeros(center.shape, dtype=bool)
+        for k in range(8):
+            edge |= ~numpy.isfinite(neighbor(padded, k))
+        seeds = valid & edge
+        cells = ((numpy.arange(row0, row1)[:, numpy.newaxis] * ncols + numpy.arange(col0, col1))[seeds])
+        closed[row0:row1, col0:col1] = ~valid | seeds
+        level_out.put(cells, center[seeds])
+        flow.put(cells, 0)
+        heap.extend(zip(center[seeds].tolist(), cells.tolist()))
+    heapq.heapify(heap)
+
+    # Plain array views and item access keep the per-cell loop fast.
+    closed = numpy.asarray(closed).reshape(-1)
+    elevation = numpy.asarray(elevation)
+    level_out = numpy.asarray(level_out)
+    flow = numpy.asarray(flow)
+    is_closed, close = closed.item, closed.itemset
+    get_elevation, get_level, set_level, set_flow = elevation.item, level_out.item, level_out.itemset, flow.itemset
+    push, pop = heapq.heappush, heapq.heappop
+    neighbors = [(int(ROW_STEP[k]), int(COL_STEP[k]), int(CODES[(k + 4) % 8])) for k in range(8)]
+    pit = collections.deque()
+    while heap or pit:
+        if pit:
+            cell = pit.popleft()
+            level = get_level(cell)
+        else:
+            level, cell = pop(heap)
+        row, col = divmod(cell, ncols)
+        for row_step, col_step, back in neighbors:
+            r = row + row_step
+            c = col + col_step
+            if r < 0 or r >= nrows or c < 0 or c >= ncols:
+                continue
+            n = r * ncols + c
+            if is_closed(n):
+                continue
+            close(n, True)
+            set_flow(n, back)  # Drains to the cell it was reached from
+            z = get_elevation(n)
+            if z <= level:
+                set_level(n, level)
+                pit.append(n)
+            else:
+                set_level(n, z)
+                push(heap, (z, n))
+
+
+# D8 directions to the steepest lower neighbor on the filled DEM (flats keep their priority-flood direction).
+def steepest_directions(filled, direction, tile_size):
+    for window in raster.windows(filled, tile_size):
+        row0, row1, col0, col1 = window
+        padded = read_padded(filled, window)
+        center = padded[1:-1, 1:-1]
+        code = numpy.array(direction['data'][row0:row1, col0:col1], dtype=float)
+        best = numpy.zeros(center.shape)
+        with numpy.errstate(invalid='ignore'):
+            for k in range(8):
+                drop = (center - neighbor(padded, k)) / STEP_LENGTH[k]
+                steeper = drop > best
+                best = numpy.where(steeper, drop, best)
+                code = numpy.where(steeper, CODES[k], code)
+        direction['data'][row0:row1, col0:col1] = numpy.where(numpy.isfinite(center), code, direction['nodata'])
+
+
+# Percent slope of the DEM (Horn's method, as ArcGIS Slope). Missing neighbors take the center value.
+def slope(dem, slope_raster, tile_size):
+    size = dem['cellsize']
+    for window in raster.windows(dem, tile_size):
+        row0, row1, col0, col1 = window
+        padded = read_padded(dem, window)
+        center = padded[1:-1, 1:-1]
+        z = [numpy.where(numpy.isfinite(neighbor(padded, k)), neighbor(padded, k), center) for k in range(8)]
+        east, southeast, south, southwest, west, northwest, north, northeast = z
+        dz_dx = ((northeast + 2 * east + southeast) - (northwest + 2 * west + southwest)) / (8 * size)
+        dz_dy = ((southwest + 2 * south + southeast) - (northwest + 2 * north + northeast)) / (8 * size)
+        percent = 100 * numpy.hypot(dz_dx, dz_dy)
+        slope_raster['data'][row0:row1, col0:col1] = numpy.where(numpy.isfinite(center), percent, slope_raster['nodata'])
+
+
+# Flat index of the downstream cell of every cell (-1 at outlets and where there is no data).
+def downstream_cells(direction, downstream):
+    ncols = direction['ncols']
+    flow = direction['data'].reshape(-1)
+    for start in range(0, len(downstream), CHUNK_CELLS):
+        code = numpy.array(flow[start:start + CHUNK_CELLS])
+        known = (code > 0) & (code <= 128)
+        k = CODE_INDEX[numpy.where(known, code, 0).astype(int)]
+        cells = numpy.arange(start, start + len(code))
+        downstream[start:start + len(code)] = numpy.where(known & (k >= 0), cells + ROW_STEP[k] * ncols + COL_STEP[k], -1)
+
+
+# Flow accumulation (number of cells draining through each cell, itself included).
+# The cells are passed downstream in waves, and the order is kept in order (with the wave boundaries returned)
+# so the same waves can be walked back up.
+def accumulate(accumulation, downstream, inflows, order):
+    flow_cells = accumulation['data'].reshape(-1)
+    for start in range(0, len(downstream), CHUNK_CELLS):
+        below = numpy.array(downstream[start:start + CHUNK_CELLS])
+        numpy.add.at(inflows, below[below >= 0], 1)
+
+    # Cells with data start at 1 (the accumulation raster holds 0 there and no data elsewhere).
+    first = []
+    for start in range(0, len(downstream), CHUNK_CELLS):
+        stop = min(start + CHUNK_CELLS, len(downstream))
+        valid = numpy.array(flow_cells[start:stop]) != accumulation['nodata']
+        flow_cells[start:stop] = numpy.where(valid, 1.0, accumulation['nodata'])
+        first.append(numpy.flatnonzero(valid & (inflows[start:stop] == 0)) + start)
+    wave = numpy.concatenate(first)
+    waves = [0]
+    while len(wave) > 0:
+        order[waves[-1]:waves[-1] + len(wave)] = wave
+        waves.append(waves[-1] + len(wave))
+        below = downstream[wave]
+        draining = below >= 0
+        wave, below = wave[draining], below[draining]
+        numpy.add.at(flow_cells, below, flow_cells[wave])
+        numpy.subtract.at(inflows, below, 1)
+        below = numpy.unique(below)
+        wave = below[inflows[below] == 0]
+    return waves
+
+
+# Snap culvert points to the highest accumulation cell within the snap distance.
+# Returns:
+#   Flat cell index of each point (-1 if off the DEM) and the distance moved (m).
+def snap(accumulation, x, y, snap_distance):
+    rows, cols = raster.cell_of(accumulation, x, y)
+    radius = int(numpy.ceil(snap_distance / accumulation['cellsize']))
+    cells = numpy.full(len(rows), -1, dtype=int)
+    moved = numpy.zeros(len(rows))
+    for point in range(len(rows)):
+        row, col = rows[point], cols[point]
+        if row < 0:
+            continue
+        window = (max(row - radius, 0), min(row + radius + 1, accumulation['nrows']),
+                  max(col - radius, 0), min(col + radius + 1, accumulation['ncols']))
+        flow_cells = raster.read_window(accumulation, window)
+        window_rows, window_cols = numpy.indices(flow_cells.shape)
+        distance = numpy.hypot(window_rows + window[0] - row, window_cols + window[2] - col) * accumulation['cellsize']
+        flow_cells[(distance > snap_distance) | ~numpy.isfinite(flow_cells)] = -1
+        if flow_cells.max() < 0:
+            continue
+        # Highest accumulation, nearest first among equals.
+        best = numpy.lexsort((distance.ravel(), -flow_cells.ravel()))[0]
+        cells[point] = (window[0] + best // flow_cells.shape[1]) * accumulation['ncols'] + window[2] + best % flow_cells.shape[1]
+        moved[point] = distance.ravel()[best]
+    return cells, moved
+
+
+# Walk the waves back up: every cell takes the label of the cell below it (unless it is a culvert cell), and its
+# flow length is the length below it plus one step.
+def label_upstream(labels, flow_length, direction, downstream, order, waves, pour_cells, pour_labels):
+    label_cells = labels['data'].reshape(-1)
+    length_cells = flow_length['data'].reshape(-1)
+    flow = direction['data'].reshape(-1)
+    step = STEP_LENGTH * direction['cellsize']
+    label_cells[pour_cells] = pour_labels
+    pour_sorted = numpy.unique(pour_cells)
+    for wave in range(len(waves) - 2, -1, -1):
+        cells = numpy.array(order[waves[wave]:waves[wave + 1]])
+        below = downstream[cells]
+        draining = below >= 0
+        length_cells[cells[~draining]] = 0
+        cells, below = cells[draining], below[draining]
+        length_cells[cells] = length_cells[below] + step[CODE_INDEX[numpy.array(flow[cells]).astype(int)]]
+        free = ~numpy.in1d(cells, pour_sorted)
+        label_cells[cells[free]] = label_cells[below[free]]
+
+
+# Delineate the watersheds of all culverts.
+# Parameters:
+#   dem_filename: DEM (.flt).
+#   culvert_shapefile: culvert point shapefile with an id field.
+#   output_prefix: path and filename prefix of the outputs.
+#   snap_distance: largest distance (m) a culvert is moved to reach the stream.
+#   id_field: culvert id field of the shapefile; id_suffix is added to make the watershed BarrierID (1ALB -> 1ALBws)
+#             unless the id already ends with it.
+# Returns:
+#   A list of [Label, BarrierID, Area_sqkm, Downstream_Label, Outlet_Length, Snap_m] rows (as in the csv).
+def delineate(dem_filename, culvert_shapefile, output_prefix, snap_distance=SNAP_DISTANCE, id_field='BarrierID',
+              id_suffix='ws', tile_size=raster.TILE_SIZE):
+    dem = raster.open_raster(dem_filename)
+    cells_total = dem['nrows'] * dem['ncols']
+    work = output_prefix + 'work_'
+    open_memmap = numpy.lib.format.open_memmap
+
+    filled = raster.create(output_prefix + 'filled.flt', dem)
+    direction = raster.create(output_prefix + 'flowdir.flt', dem)
+    closed = open_memmap(work + 'closed.npy', mode='w+', dtype=bool, shape=(dem['nrows'], dem['ncols']))
+    fill(dem, filled, direction, closed, tile_size)
+    del closed
+    steepest_directions(filled, direction, tile_size)
+    slope(dem, raster.create(output_prefix + 'slope.flt', dem), tile_size)
+
+    downstream = open_memmap(work + 'downstream.npy', mode='w+', dtype=numpy.int64, shape=(cells_total,))
+    downstream_cells(direction, downstream)
+    accumulation = raster.create(output_prefix + 'flowacc.flt', dem)
+    for row0, row1, col0, col1 in raster.windows(dem, tile_size):  # Start from the DEM's data mask
+        accumulation['data'][row0:row1, col0:col1] = numpy.where(
+            numpy.isfinite(raster.read_window(dem, (row0, row1, col0, col1))), 0, accumulation['nodata'])
+    inflows = open_memmap(work + 'inflows.npy', mode='w+', dtype=numpy.uint8, shape=(cells_total,))
+    order = open_memmap(work + 'order.npy', mode='w+', dtype=numpy.int64, shape=(cells_total,))
+    waves = accumulate(accumulation, downstream, inflows, order)
+    del inflows
+
+    # Culvert points, snapped to the stream.
+    points = shapefiles.read(culvert_shapefile)
+    if shapefiles.layer_type(culvert_shapefile) not in shapefiles.POINT_TYPES \
+            or any(shape['type'] != 0 and shape['type'] not in shapefiles.POINT_TYPES for shape, record in points):
+        print "ERROR: '" + culvert_shapefile + "' is not a point shapefile (the culvert points are needed, not " \
+            + "watershed polygons). Bailing out."
+        sys.exit(0)
+    x = numpy.array([shape['parts'][0][0, 0] if shape['parts'] else numpy.nan for shape, record in points])
+    y = numpy.array([shape['parts'][0][0, 1] if shape['parts'] else numpy.nan for shape, record in points])
+    ids = [str(record.get(id_field, '')) for shape, record in points]
+    ids = [barrier_id if barrier_id.endswith(id_suffix) else barrier_id + id_suffix for barrier_id in ids]
+    pour_cells, moved = snap(accumulation, x, y, snap_distance)
+    # Culverts that snap to the same cell share one label.
+    label_of_cell = {}
+    point_labels = numpy.zeros(len(ids), dtype=int)
+    for point, cell in enumerate(pour_cells):
+        if cell >= 0:
+            point_labels[point] = label_of_cell.setdefault(cell, len(label_of_cell) + 1)
+        else:
+            print "Culvert " + ids[point] + " is not on the DEM, skipping it."
+    unique_cells = numpy.array(sorted(label_of_cell, key=label_of_cell.get), dtype=numpy.int64)
+    unique_labels = numpy.arange(1, len(unique_cells) + 1)
+
+    labels = raster.create(output_prefix + 'labels.flt', dem)
+    flow_length = raster.create(output_prefix + 'flowlen.flt', dem)
+    label_upstream(labels, flow_length, direction, downstream, order, waves, unique_cells, unique_labels)
+
+    # Whole upstream area, next culvert downstream and flow length at each culvert.
+    flow_cells = accumulation['data'].reshape(-1)
+    label_cells = labels['data'].reshape(-1)
+    length_cells = flow_length['data'].reshape(-1)
+    results = []
+    for point in range(len(ids)):
+        cell = pour_cells[point]
+        if cell < 0:
+            continue
+        below = downstream[cell]
+        downstream_label = int(label_cells[below]) if below >= 0 and label_cells[below] > 0 else 0
+        results.append([point_labels[point], ids[point], float(flow_cells[cell]) * dem['cellsize'] ** 2 / 1e6,
+                        downstream_label, float(length_cells[cell]), moved[point]])
+
+    for grid in [filled, direction, accumulation, labels, flow_length]:
+        grid['data'].flush()
+    del downstream, order
+    for name in ['closed', 'downstream', 'inflows', 'order']:
+        os.remove(work + name + '.npy')
+
+    with open(output_prefix + 'watersheds.csv', 'wb') as output_file:
+        csv_writer = csv.writer(output_file)
+        csv_writer.writerow(['Label', 'BarrierID', 'Area_sqkm', 'Downstream_Label', 'Outlet_Length', 'Snap_m'])
+        for result in results:
+            csv_writer.writerow(result)
+    return results
+
+
+if __name__ == '__main__':
+    print('Cornell Culvert Evaluation Model - watershed delineation')
+    print('--------------------------------------------------------\n')
+
+    DEM = raw_input("Path to the DEM (.flt, in the same UTM projection as the culverts): \n")
+    Culverts = raw_input("Path to the culvert point shapefile (All_Culverts.shp): \n")
+    OutputPrefix = raw_input("Path and filename prefix for the outputs (e.g. ../ALB/GIS_files/Temp/ALB_): \n")
+    results = delineate(DEM, Culverts, OutputPrefix)
+    print "\nDone! Delineated " + str(len(results)) + " culvert watersheds. They can be found here:\n" \
+        + OutputPrefix + "watersheds.csv"
@@ -16,7 +16,7 @@ raw_data = "../" + ws_name + "/" + ws_name + ".csv"  # Edited for new file setup
 INDEXinfo = raw_input("Input file follows strict (older) placement requirements? (If not, just need exact column names)  ")
     # If no, we expect the names to match exactly, but placement doesn't matter
 
-import numpy, os, re, csv
+import numpy, os, re, csv, validation
 import pandas as pd
 
 CD = pd.read_csv(raw_data,sep = ',', header=0)
@@ -35,21 +35,21 @@ FieldData.columns= ('Survey_ID', 'NAACC_ID', 'Lat', 'Long', 'Rd_Name','Culv_Mat'
 # Inlet_Structure_Type --> In_Shape
 # Inlet_Type --> In_Type
 # 'Number_Of_Culverts' --> Flags - previously set to 0 if # culverts = 1
+# Town (or Municipality) --> Town, for the inventory summary by town; left blank if the export has neither
+TownColumns = [name for name in ('Town', 'Municipality') if name in CD.columns]
+FieldData.loc[:,'Town'] = CD[TownColumns[0]] if TownColumns else ''
 FieldData.loc[:,'Modeling_notes'] = numpy.nan  
 
-NotExtracted = pd.DataFrame(columns = ['Survey_ID', 'NAACC_ID', 'Lat', 'Long', 'Rd_Name','Culv_Mat','In_Type','In_Shape','In_A','In_B','HW','Slope','Length','Out_Shape','Out_A','Out_B','Crossing_Type','Comments','Flags','Modeling_notes'])
+NotExtracted = pd.DataFrame(columns = ['Survey_ID', 'NAACC_ID', 'Lat', 'Long', 'Rd_Name','Culv_Mat','In_Type','In_Shape','In_A','In_B','HW','Slope','Length','Out_Shape','Out_A','Out_B','Crossing_Type','Comments','Flags','Town','Modeling_notes'])
 
 len(FieldData) # 136
 
-#Remove rows that are Bridge or other crossing type
-NotExtracted = NotExtracted.append(FieldData.loc[(FieldData['Crossing_Type']=='Bridge') & (FieldData['In_Shape']!="Box/Bridge with Abutments") & (FieldData['In_Shape']!="Open Bottom Arch Bridge/Culvert")])
-FieldData = FieldData.loc[-((FieldData['Crossing_Type']=='Bridge') & (FieldData['In_Shape']!="Box/Bridge with Abutments") & (FieldData['In_Shape']!="Open Bottom Arch Bridge/Culvert"))]
-
-
-NotExtracted = NotExtracted.append(FieldData.loc[(FieldData['Crossing_Type']=='Bridge') & (FieldData['In_A']>=20)])
-FieldData = FieldData.loc[-((FieldData['Crossing_Type']=='Bridge') & (FieldData['In_A']>=20))]
-
-NotExtracted['Modeling_notes'] = "Wrong bridge type or bridge wider than 20 ft"
+#Remove rows that are Bridge or other crossing type (rules in validation.py, checked on all rows at once)
+valid, Rejections, RuleCounts = validation.validate(FieldData, validation.NAACC_BRIDGE_RULES, 'NAACC_ID')
+Rejected = FieldData.loc[~valid].copy()
+Rejected['Modeling_notes'] = validation.notes(FieldData, Rejections)[~valid]
+NotExtracted = NotExtracted.append(Rejected)
+FieldData = FieldData.loc[valid]
 
 # Convert inlet type to language accepted by capacity_prep script
 FieldData.loc[FieldData['In_Type'] == "Headwall and Wingwalls",'In_Type'] =  "Wingwall and Headwall"
@@ -67,11 +67,21 @@ FieldData.loc[FieldData['In_Shape'] == 'Open Bottom Arch Bridge/Culvert', 'In_Sh
 # >>> CD.columns[44]  = 'Inlet_Structure_Type'
 
 
-#  Remove rows that contain unrealistic geometry, put in NotExtracted
-NotExtracted = NotExtracted.append(FieldData.loc[-((FieldData['In_A']>=0) & (FieldData['In_B']>=0) & (FieldData['HW']>=0) & (FieldData['Length']>=0))])
-NotExtracted.loc[pd.isnull(NotExtracted['Modeling_notes']), 'Modeling_notes'] = 'Negative or missing culvert geometry'
+#  Remove rows that contain unrealistic geometry or a shape capacity_prep can't model, put in NotExtracted
+#  (In_B is only needed for culverts that are not round)
+valid, GeometryRejections, GeometryCounts = validation.validate(FieldData, validation.NAACC_GEOMETRY_RULES, 'NAACC_ID')
+Rejected = FieldData.loc[~valid].copy()
+Rejected['Modeling_notes'] = validation.notes(FieldData, GeometryRejections)[~valid]
+NotExtracted = NotExtracted.append(Rejected)
+FieldData = FieldData.loc[valid]  # 132
+
+# Round culverts only need In_A (diameter), so give them In_B = In_A where it is missing for the later scripts
+FieldData.loc[(FieldData['In_Shape'] == 'Round') & -(FieldData['In_B'] >= 0), 'In_B'] = FieldData['In_A']
 
-FieldData = FieldData.loc[(FieldData['In_A']>=0) & (FieldData['In_B']>=0) & (FieldData['HW']>=0) & (FieldData['Length']>=0)]  # 132
+Rejections = pd.concat([Rejections, GeometryRejections], ignore_index=True)
+RuleCounts = pd.concat([RuleCounts, GeometryCounts], ignore_index=True)
+print "Rows not extracted, by validation rule:"
+validation.print_counts(RuleCounts)
 
 # Assign the Barrier ID, after all the unmodelable rows are removed
 # UPDATED Jan 2018 - in case watershed name is longer than 3 characters, the ID still needs only 3
@@ -93,10 +103,12 @@ for SI in FieldData.loc[FieldData['Flags']>1]['Survey_ID'].unique():
 # Put the output files in the data folder you created
 output_file=ws_name+"/"+ws_name+"_field_data.csv"
 not_extracted_file=ws_name+"/"+ws_name+"_not_extracted.csv"
+rejections_file=ws_name+"/"+ws_name+"_rejections.csv"  # One row per failed validation rule, with rule codes
     
 FieldData.NAACC_ID = FieldData.NAACC_ID.astype(int)   ##   Converts FieldData to int type after invalid rows removed
 FieldData.to_csv("../" + output_file, index=False)
 NotExtracted.to_csv("../" + not_extracted_file, index=False)
+Rejections.to_csv("../" + rejections_file, index=False)
 
 ## Notify user that the extraction is complete
 print '\nExtraction complete! Extracted values can be found here:'
@@ -7,11 +7,13 @@
 # highest return period storm that a culvert can pass for current and future rainfall conditions.
 # Produces summary output file with all model results for culverts
 
-import csv, loader, pandas as pd
+import csv, numpy, loader, records, output_writer, pandas as pd
 
 
 def final_output(capacity_filename, current_runoff_filename, future_runoff_filename,
-                 final_output_filename, field_data_input_filename, not_extracted_filename, output_prefix):
+                 final_output_filename, field_data_input_filename, not_extracted_filename, output_prefix,
+                 compression=None):
+    # compression (optional): None, 'gzip' or 'zstd' to compress the return period and final output files.
 
     return_periods_output_filename = output_prefix + 'return_periods.csv'
     skipped_filename = output_prefix + 'skipped_culverts.csv'
@@ -71,121 +73,109 @@ def final_output(capacity_filename, current_runoff_filename, future_runoff_filen
 
     # Load and validate current and future runoffs:
     # current_runoff_data will now store the relevant data from the current runoff input file
-    # in the format described in loader.py using the first signature defined above.
-    # valid_rows will store all value for the key 'valid_rows' in the dictionary current_runoff_data
+    # as a compact column table (see records.py) using the first signature defined above.
+    # current_runoffs will store the table of valid rows from the dictionary current_runoff_data
 
-    current_runoff_data = loader.load(current_runoff_filename, runoff_signature, 1, -1)
-    current_runoff_rows = current_runoff_data['valid_rows']
+    current_runoff_data = records.load(current_runoff_filename, runoff_signature, 1, -1)
+    current_runoffs = current_runoff_data['table']
 
-    future_runoff_data = loader.load(future_runoff_filename, runoff_signature, 1, -1)
-    future_runoff_rows = future_runoff_data['valid_rows']
+    future_runoff_data = records.load(future_runoff_filename, runoff_signature, 1, -1)
+    future_runoffs = future_runoff_data['table']
 
-    # Create lookup dictionaries for the runoffs. This speeds matching culverts to watersheds up quite a bit.
+    # Create lookup dictionaries from BarrierID to row number in the runoff tables.
     current_runoff_lookup = {}
-    for watershed in current_runoff_rows:
-        current_runoff_lookup[watershed['BarrierID']] = watershed
+    for index, barrier_id in enumerate(current_runoffs.strings('BarrierID')):
+        current_runoff_lookup[barrier_id] = index
 
     future_runoff_lookup = {}
-    for watershed in future_runoff_rows:
-        future_runoff_lookup[watershed['BarrierID']] = watershed
+    for index, barrier_id in enumerate(future_runoffs.strings('BarrierID')):
+        future_runoff_lookup[barrier_id] = index
 
     # Load culvert capacities:
-    culvert_data = loader.load(capacity_filename, culvert_signature, 1, -1)
-    culvert_rows = culvert_data['valid_rows']
+    culvert_data = records.load(capacity_filename, culvert_signature, 1, -1)
+    culverts = culvert_data['table']
 
     # A list of the years.
-    years = [0, 1, 2, 5, 10, 25, 50, 100, 200, 500]
-
-    # A helper function to find the first overflow.
-    def find_first_overflow(culvert, watershed, years):
-        capacity = culvert['Q']
-        # stores the max flow in culvert as 'capacity'
-        i = 1
-        while i < len(years):
-            year = years[i]
-            # loops through all the relevant return periods
-            if capacity < watershed['Y' + str(year)]:
-                return years[i - 1]
-            # if capacity is lower than the runoff for a particular return period,
-            # return the previous highest return period. 
-            i += 1
-        return years[i - 1]
-
-    # Compute which return period each culvert will be able to withstand.
-    for culvert in culvert_rows:
-        # Find the corresponding current and future watersheds (they share BarrierID):
-        culvert['watershed'] = None
-        try:
-            current_watershed = current_runoff_lookup[culvert['BarrierID']]
-            future_watershed = future_runoff_lookup[culvert['BarrierID']]
-
-            culvert['current_return'] = find_first_overflow(culvert, current_watershed, years)
-            # returns the highest withstandable return period for current storm data
-            culvert['future_return'] = find_first_overflow(culvert, future_watershed, years)
-            # returns the highest withstandable return period for future storm data
-            culvert['watershed'] = current_watershed  # Also save the watershed info, since we'll want it for our final output.
-            if culvert['Flags'] == 0:
-                culvert[
-                    'Flags'] = 1  # Also fix flags so it means number of culverts (previously, flag '0' meant 1 culvert)
-        except KeyError:
-            print "Did not find watershed for barrierID " + culvert['BarrierID']
-            # Did not find a watershed corresponding to this culvert in the runoffs. Skip.
+    years = numpy.array([0, 1, 2, 5, 10, 25, 50, 100, 200, 500])
+    flow_names = ['Y1', 'Y2', 'Y5', 'Y10', 'Y25', 'Y50', 'Y100', 'Y200', 'Y500']
+
+    # Find the corresponding current and future watersheds (they share BarrierID).
+    # Culverts without a watershed in both runoffs are skipped.
+    culvert_index = []
+    current_index = []
+    future_index = []
+    culvert_ids = culverts.strings('BarrierID')
+    for index, barrier_id in enumerate(culvert_ids):
+        if barrier_id in current_runoff_lookup and barrier_id in future_runoff_lookup:
+            culvert_index.append(index)
+            current_index.append(current_runoff_lookup[barrier_id])
+            future_index.append(future_runoff_lookup[barrier_id])
+        else:
+            print "Did not find watershed for barrierID " + barrier_id
+            print "Skipping culvert " + barrier_id
             # TODO export skipped culverts.
-            continue
-
-    # Just save the return periods.
-    with open(return_periods_output_filename, 'wb') as return_output_file:
-        csv_writer = csv.writer(return_output_file)
-
-        # Header
-        csv_writer.writerow(['BarrierID', 'Current Max Return (yr)', 'Future Max Return (yr)'])
-
-        # Each row.
-        for culvert in culvert_rows:
-            watershed = culvert['watershed']
-            if watershed == None:
-                continue  # Skip all the culverts we couldn't match with watersheds.
-            csv_writer.writerow([culvert['BarrierID'], culvert['current_return'], culvert['future_return']])
-
-    # Now save all the final data (easier to do that here since all the relevant files are already open.)
-    with open(final_output_filename, 'wb') as final_output_file:
-        csv_writer = csv.writer(final_output_file)
-
-        # Header
-        csv_writer.writerow(
-            ['BarrierID', 'Survey_ID', 'NAACC_ID', 'Latitude', 'Longitude', 'Current Max Return Period (yr)',
-             'Future Max Return Period (yr)', 'Capacity (m^3/s)', 'Cross sectional Area (m^2)', 'WS Area (sq km)',
-             'Tc (hr)', 'CN', '1 year flow (current)', '2 year flow (current)', '5 year flow (current)',
-             '10 year flow (current)', '25 year flow (current)', '100 year flow (current)','Number of Culverts',
-             'Model_Notes', 'Field_Comments'])
+    culvert_index = numpy.array(culvert_index, dtype=int)
+    current_index = numpy.array(current_index, dtype=int)
+    future_index = numpy.array(future_index, dtype=int)
+
+    # Peak flows for every matched culvert (rows) and return period (columns).
+    current_flows = numpy.column_stack([current_runoffs.column(name)[current_index] for name in flow_names])
+    future_flows = numpy.column_stack([future_runoffs.column(name)[future_index] for name in flow_names])
+
+    # Helper to find the first overflow for all culverts at once:
+    # if capacity is lower than the runoff for a particular return period,
+    # return the previous highest return period (500 if it never overflows).
+    def find_first_overflow(capacity, flows):
+        overflows = capacity[:, numpy.newaxis] < flows
+        first = numpy.argmax(overflows, axis=1)
+        first[~numpy.any(overflows, axis=1)] = len(years) - 1
+        return years[first]
+
+    capacity = culverts.column('Q')[culvert_index]
+    current_return = find_first_overflow(capacity, current_flows)
+    # returns the highest withstandable return period for current storm data
+    future_return = find_first_overflow(capacity, future_flows)
+    # returns the highest withstandable return period for future storm data
+
+    # Also fix flags so it means number of culverts (previously, flag '0' meant 1 culvert)
+    flags = culverts.column('Flags')[culvert_index]
+    flags = numpy.where(flags == 0, 1, flags)
+
+    barrier_ids = [culvert_ids[i] for i in culvert_index]
+    model_notes = culverts.strings('Model_Notes')
+    field_comments = culverts.strings('Field_Comments')
+
+    # Save the return periods and all the final data from the same arrays (see output_writer.py).
+    output_writer.write(return_periods_output_filename,
+                        ['BarrierID', 'Current Max Return (yr)', 'Future Max Return (yr)'],
+                        [barrier_ids, current_return, future_return], compression=compression)
+
+    output_writer.write(final_output_filename,
+        ['BarrierID', 'Survey_ID', 'NAACC_ID', 'Latitude', 'Longitude', 'Current Max Return Period (yr)',
+         'Future Max Return Period (yr)', 'Capacity (m^3/s)', 'Cross sectional Area (m^2)', 'WS Area (sq km)',
+         'Tc (hr)', 'CN', '1 year flow (current)', '2 year flow (current)', '5 year flow (current)',
+         '10 year flow (current)', '25 year flow (current)', '100 year flow (current)','Number of Culverts',
+         'Model_Notes', 'Field_Comments'],
+        [barrier_ids,
+         culverts.column('Survey_ID')[culvert_index],
+         culverts.column('NAACC_ID')[culvert_index],
+         culverts.column('Lat')[culvert_index],
+         culverts.column('Long')[culvert_index],
+         current_return,
+         future_return,
+         capacity,
+         culverts.column('Culvert_Area')[culvert_index],
+         current_runoffs.column('Area_sqkm')[current_index],
+         current_runoffs.column('Tc_hr')[current_index],
+         current_runoffs.column('CN')[current_index],
+         current_flows[:, 0],
+         current_flows[:, 1],
+         current_flows[:, 2],
+         current_flows[:, 3],
+         current_flows[:, 4],
+         current_flows[:, 6],
+         flags,
+         [model_notes[i] for i in culvert_index],
+         [field_comments[i] for i in culvert_index]],
+        compression=compression)
         # Removed ['Point Moved', 'New Latitude', 'New Longitude'] columns
-
-        # Each row.
-        for culvert in culvert_rows:
-            watershed = culvert['watershed']
-            if watershed == None:
-                print "Skipping culvert " + culvert['BarrierID']
-                continue  # Skip all the culverts we couldn't match with watersheds.
-            csv_writer.writerow([
-                culvert['BarrierID'], \
-                culvert['Survey_ID'], \
-                culvert['NAACC_ID'], \
-                culvert['Lat'], \
-                culvert['Long'], \
-                culvert['current_return'], \
-                culvert['future_return'], \
-                culvert['Q'], \
-                culvert['Culvert_Area'], \
-                watershed['Area_sqkm'], \
-                watershed['Tc_hr'], \
-                watershed['CN'], \
-                watershed['Y1'], \
-                watershed['Y2'], \
-                watershed['Y5'], \
-                watershed['Y10'], \
-                watershed['Y25'], \
-                watershed['Y100'], \
-                culvert['Flags'], \
-                culvert['Model_Notes'],
-                culvert['Field_Comments']
-            ])
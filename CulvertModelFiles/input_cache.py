@@ -0,0 +1,160 @@
+# Memory-mapped cache of parsed input files
+# October 2026
+#
+# Every run parses the same All_Culverts.csv and _field_data.csv text again. This script keeps the parsed
+# columns of such a file next to it, in a .input_cache folder:
+# a) <file>.<key>.npy: the numeric columns and string ids as one numpy structured array (as in records.py), and
+# b) <file>.<key>.pkl: the string pools (BarrierIDs, comments, categories), the invalid rows, and the size,
+#    modification time and SHA-1 hash of the source file.
+#
+# The key is made from the signature, start row and max rows, so each way a file is loaded gets its own cache.
+# A cache is used when the source size and modification time still match, or when only the time changed but
+# the contents hash the same (the file was rewritten with the same data). Otherwise the file is parsed again
+# and the cache replaced.
+#
+# Cached arrays are opened with numpy memory mapping, so later loads skip the text parsing entirely and
+# parallel workers reading the same input share the same pages. If the cache folder cannot be written
+# the file is just parsed as usual.
+#
+# Example:
+#   table = input_cache.load(data_path + 'All_Culverts.csv', watershed_data_signature, 1, -1)['table']
+#   rows = loader.load(data_path + 'All_Culverts.csv', watershed_data_signature, 1, -1, cache=True)['valid_rows']
+
+import os, hashlib, numpy, cPickle, records
+
+CACHE_FOLDER = '.input_cache'
+CACHE_VERSION = 1
+HASH_BLOCK = 1 << 20
+
+
+# SHA-1 of a file's contents.
+def file_hash(filename):
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as source:
+        block = source.read(HASH_BLOCK)
+        while block:
+            sha1.update(block)
+            block = source.read(HASH_BLOCK)
+    return sha1.hexdigest()
+
+
+# Cache filenames (without extension) for a file loaded with a given signature, start row and max rows.
+def cache_path(filename, required_headers, start_row, max_rows):
+    signature = [(header['name'], header['type'].__name__) for header in required_headers]
+    key = hashlib.sha1(repr((CACHE_VERSION, signature, start_row, max_rows))).hexdigest()[:12]
+    folder, name = os.path.split(os.path.abspath(filename))
+    return os.path.join(folder, CACHE_FOLDER, name + '.' + key)
+
+
+# Load a cached table, or None if there is no cache or it no longer matches the source file.
+def read_cache(filename, path, required_headers):
+    try:
+        with open(path + '.pkl', 'rb') as meta_file:
+            meta = cPickle.load(meta_file)
+    except (IOError, EOFError, cPickle.UnpicklingError):
+        return None
+
+    status = os.stat(filename)
+    if meta['size'] != status.st_size:
+        return None
+    if meta['mtime'] != status.st_mtime:
+        # Touched or rewritten: still good if the contents are the same.
+        if meta['hash'] != file_hash(filename):
+            return None
+        meta['mtime'] = status.st_mtime
+        write_meta(path, meta)
+
+    table = records.CulvertTable(required_headers, capacity=1)
+    if meta['rows'] > 0:
+        try:
+            data = numpy.load(path + '.npy', mmap_mode='r')
+        except (IOError, ValueError):
+            return None
+        if data.dtype != table.data.dtype or len(data) != meta['rows']:
+            return None
+        table.data = data
+    table.size = meta['rows']
+    for name, strings in meta['pools'].items():
+        table.pools[name] = records.StringPool(strings)
+    return {
+        "table": table,
+        "invalid_rows": meta['invalid_rows']
+    }
+
+
+# Write the metadata file (through a temporary file, so a reader never sees half of it).
+def write_meta(path, meta):
+    temporary = path + '.pkl.' + str(os.getpid())
+    with open(temporary, 'wb') as meta_file:
+        cPickle.dump(meta, meta_file, cPickle.HIGHEST_PROTOCOL)
+    replace(temporary, path + '.pkl')
+
+
+def replace(temporary, filename):
+    try:
+        os.rename(temporary, filename)
+    except OSError:  # Windows will not rename over an existing file
+        os.remove(filename)
+        os.rename(temporary, filename)
+
+
+# Save a parsed table to the cache.
+def write_cache(filename, path, loaded, status, source_hash):
+    table = loaded['table']
+    folder = os.path.dirname(path)
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    temporary = path + '.npy.' + str(os.getpid())
+    with open(temporary, 'wb') as array_file:
+        numpy.save(array_file, table.data[:table.size])
+    replace(temporary, path + '.npy')
+    write_meta(path, {
+        'size': status.st_size,
+        'mtime': status.st_mtime,
+        'hash': source_hash,
+        'rows': table.size,
+        'pools': dict((name, pool.strings) for name, pool in table.pools.items()),
+        'invalid_rows': loaded['invalid_rows']
+    })
+
+
+# Load and validate a file into a CulvertTable, through the cache.
+# Parameters and validation are the same as records.load (and loader.load).
+# Returns:
+#   A dictionary with 'table' (the CulvertTable of valid rows, its array memory-mapped when read from the cache)
+#   and 'invalid_rows' (as in loader.load).
+def load(filename, required_headers, start_row, max_rows):
+    if not os.path.exists(filename):
+        return records.load(filename, required_headers, start_row, max_rows)  # Gives the usual error
+    path = cache_path(filename, required_headers, start_row, max_rows)
+    cached = read_cache(filename, path, required_headers)
+    if cached is not None:
+        return cached
+
+    # Hash before parsing, so a file changed while it is parsed is not cached under the old contents.
+    status = os.stat(filename)
+    source_hash = file_hash(filename)
+    loaded = records.load(filename, required_headers, start_row, max_rows)
+    try:
+        write_cache(filename, path, loaded, status, source_hash)
+    except (IOError, OSError):
+        pass  # Read-only data folder: just go without the cache
+    return loaded
+
+
+# Load a file through the cache, as loader.load rows.
+# Returns:
+#   A dictionary with valid_rows (list of row dictionaries) and invalid_rows, exactly as loader.load.
+def load_rows(filename, required_headers, start_row, max_rows):
+    loaded = load(filename, required_headers, start_row, max_rows)
+    table = loaded['table']
+    columns = []
+    for name in table.names:
+        if name in table.pools:
+            columns.append(table.strings(name))
+        else:
+            columns.append(table.column(name).tolist())
+    return {
+        "valid_rows": [dict(zip(table.names, values)) for values in zip(*columns)],
+        "invalid_rows": loaded['invalid_rows']
+    }
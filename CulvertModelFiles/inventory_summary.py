@@ -0,0 +1,305 @@
+# Inventory summary statistics
+# October 2026
+#
+# This script will compute the summary tables used in inventory reports straight from a run's final output,
+# without loading it into pandas:
+# a) the final output is read in blocks of rows, and each block is added to running totals per group
+#    (county, town, road and culvert material, from the field data, and the whole inventory),
+# b) the totals are counts only: crossings in each return period class (current and future rainfall), culverts,
+#    a capacity histogram, a capacity sketch for quantiles (log spaced buckets, DDSketch style, so every
+#    quantile is within 1% of the true value), and crossings with an unknown (NaN) capacity, which are left out
+#    of the histogram and sketch, and
+# c) because they are counts, the totals of separate runs (e.g. counties run in parallel, or statewide shards)
+#    are merged by adding them, and the merged summary is exactly the summary of the combined inventory.
+#
+# Each run saves its totals to <prefix>summary.npz, and the reports to <prefix>summary_<Dimension>.csv with, per
+# group: crossings, culverts, crossings under each return period (current and future), capacity quantiles and
+# the capacity histogram, and crossings with an unknown capacity.
+#
+# Example (statewide from county runs):
+#   totals = inventory_summary.merge([inventory_summary.load(name) for name in county_summary_filenames])
+#   inventory_summary.report(totals, '../NY/NY_Model_Output/NY_')
+
+import csv, gzip, math, sys, numpy
+
+YEARS = numpy.array([0, 1, 2, 5, 10, 25, 50, 100, 200, 500])  # Return period classes, as in final_output.py
+# Dimension name and the field data column it comes from. County falls back to the run name when there is
+# no County column (it is added by statewide.combine). Town is the NAACC Town (or Municipality) column carried
+# through by extract_NAACC.py; field data extracted before it has no Town column and gets no Town report.
+DIMENSIONS = [('County', 'County'), ('Town', 'Town'), ('Road', 'Rd_Name'), ('Material', 'Culv_Mat')]
+INVENTORY = 'Inventory'  # Dimension of the whole inventory total
+HISTOGRAM_EDGES = numpy.array([0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0])  # Capacity histogram edges (m^3/s)
+QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+RELATIVE_ACCURACY = 0.01  # Sketch quantiles are within 1% of the true capacity
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+MIN_CAPACITY = 1e-4  # Capacities (m^3/s) at or below this share the first sketch bucket, above MAX_CAPACITY the last
+MAX_CAPACITY = 1e4
+SKETCH_BINS = int(math.ceil(math.log(MAX_CAPACITY / MIN_CAPACITY) / math.log(GAMMA))) + 2
+CHUNK_ROWS = 65536  # Final output rows per block
+COUNT_NAMES = ['current', 'future', 'histogram', 'sketch', 'culverts', 'unknown']
+
+
+# Empty totals: a dictionary of (dimension, value) to count arrays.
+def empty():
+    return {}
+
+
+def empty_counts():
+    return {
+        'current': numpy.zeros(len(YEARS), dtype=numpy.int64),
+        'future': numpy.zeros(len(YEARS), dtype=numpy.int64),
+        'histogram': numpy.zeros(len(HISTOGRAM_EDGES) + 1, dtype=numpy.int64),
+        'sketch': numpy.zeros(SKETCH_BINS, dtype=numpy.int64),
+        'culverts': numpy.zeros(1, dtype=numpy.int64),
+        'unknown': numpy.zeros(1, dtype=numpy.int64)
+    }
+
+
+# Return period class (index into YEARS) of each return period.
+def year_class(return_period):
+    return numpy.clip(numpy.searchsorted(YEARS, return_period, side='right') - 1, 0, len(YEARS) - 1)
+
+
+# Sketch bucket of each capacity: bucket i holds capacities in (MIN_CAPACITY * GAMMA**(i-1), MIN_CAPACITY * GAMMA**i].
+def sketch_bin(capacity):
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        index = numpy.ceil(numpy.log(capacity / MIN_CAPACITY) / math.log(GAMMA))
+    index = numpy.where(capacity > MIN_CAPACITY, index, 0)
+    return numpy.clip(numpy.nan_to_num(index), 0, SKETCH_BINS - 1).astype(int)
+
+
+# Capacity at a bucket, within RELATIVE_ACCURACY of every capacity in it.
+def sketch_value(index):
+    index = numpy.asarray(index)
+    return numpy.where(index == 0, 0.0, MIN_CAPACITY * 2 * GAMMA ** index / (GAMMA + 1))
+
+
+# Add per crossing values to the totals of each group.
+# Parameters:
+#   totals: totals to add to (see empty).
+#   dimension: dimension name.
+#   values: list of group values, one per crossing.
+#   classes: dictionary of 'current', 'future' (return period class), 'histogram' and 'sketch' (bin, -1 to leave
+#            the crossing out) arrays, and 'culverts' (number of culverts) and 'unknown' (1 for an unknown
+#            capacity) for the crossings.
+def add_groups(totals, dimension, values, classes):
+    groups, group_of = numpy.unique(numpy.array(values, dtype=object).astype(str), return_inverse=True)
+    sizes = {'current': len(YEARS), 'future': len(YEARS), 'histogram': len(HISTOGRAM_EDGES) + 1,
+             'sketch': SKETCH_BINS}
+    counts = {}
+    for name, size in sizes.items():
+        # Sparse (group, bin) counts, so wide sketches of many groups are not made dense.
+        counted = classes[name] >= 0
+        pairs, pair_counts = numpy.unique(group_of[counted] * size + classes[name][counted], return_counts=True)
+        counts[name] = (pairs // size, pairs % size, pair_counts)
+    sums = dict((name, numpy.bincount(group_of, weights=classes[name], minlength=len(groups)).astype(numpy.int64))
+                for name in ['culverts', 'unknown'])
+    for index, group in enumerate(groups):
+        key = (dimension, group)
+        if key not in totals:
+            totals[key] = empty_counts()
+        for name in sums:
+            totals[key][name] += sums[name][index]
+    for name in sizes:
+        group_index, bins, pair_counts = counts[name]
+        starts = numpy.searchsorted(group_index, numpy.arange(len(groups) + 1))
+        for index, group in enumerate(groups):
+            span = slice(starts[index], starts[index + 1])
+            totals[(dimension, group)][name][bins[span]] += pair_counts[span]
+
+
+# Field data values of each dimension for each BarrierID (the first culvert of a crossing).
+def load_attributes(field_data_filename, county=''):
+    attributes = {}
+    try:
+        with open(field_data_filename, 'r') as field_file:
+            reader = csv.DictReader(field_file)
+            if 'BarrierID' not in (reader.fieldnames or []):
+                print "ERROR: field data '" + field_data_filename + "' has no BarrierID column. Bailing out."
+                sys.exit(0)
+            columns = [(dimension, column) for dimension, column in DIMENSIONS
+                       if column in reader.fieldnames or dimension == 'County']
+            for row in reader:
+                if row['BarrierID'] not in attributes:
+                    attributes[row['BarrierID']] = [(row.get(column) or (county if dimension == 'County' else ''))
+                                                    .strip() for dimension, column in columns]
+    except IOError:
+        print "ERROR: Could not find file '" \
+            + field_data_filename \
+            + "'. Bailing out."
+        sys.exit(0)
+    return [dimension for dimension, column in columns], attributes
+
+
+def open_output(filename):
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'rb')
+    return open(filename, 'r')
+
+
+# Summarize a final output file.
+# Parameters:
+#   final_output_filename: model output csv (or .gz) from final_output.py.
+#   field_data_filename: the run's field data, for the group values.
+#   county: county of the run, for field data without a County column.
+#   chunk_rows: final output rows per block.
+# Returns:
+#   The totals.
+def aggregate(final_output_filename, field_data_filename, county='', chunk_rows=CHUNK_ROWS):
+    dimensions, attributes = load_attributes(field_data_filename, county)
+    missing = ['(unknown)'] * len(dimensions)
+    totals = empty()
+    names = ['BarrierID', 'Current Max Return Period (yr)', 'Future Max Return Period (yr)', 'Capacity (m^3/s)',
+             'Number of Culverts']
+    try:
+        output_file = open_output(final_output_filename)
+    except IOError:
+        print "ERROR: Could not find file '" \
+            + final_output_filename \
+            + "'. Bailing out."
+        sys.exit(0)
+    with output_file:
+        reader = csv.reader(output_file)
+        header = next(reader, [])
+        if any(name not in header for name in names):
+            print "ERROR: '" + final_output_filename + "' is missing some of the columns " + ", ".join(names) \
+                + ". Bailing out."
+            sys.exit(0)
+        columns = [header.index(name) for name in names]
+        while True:
+            block = [[row[column] for column in columns] for _, row in zip(range(chunk_rows), reader)]
+            if len(block) == 0:
+                break
+            barrier_ids = [row[0] for row in block]
+            values = numpy.array([row[1:] for row in block], dtype=float).reshape(-1, 4)
+            known = numpy.isfinite(values[:, 2])
+            classes = {
+                'current': year_class(values[:, 0]),
+                'future': year_class(values[:, 1]),
+                'histogram': numpy.where(known, numpy.searchsorted(HISTOGRAM_EDGES, values[:, 2], side='right'), -1),
+                'sketch': numpy.where(known, sketch_bin(values[:, 2]), -1),
+                'culverts': values[:, 3],
+                'unknown': (~known).astype(int)
+            }
+            add_groups(totals, INVENTORY, ['All'] * len(block), classes)
+            groups = [attributes.get(barrier_id, missing) for barrier_id in barrier_ids]
+            for index, dimension in enumerate(dimensions):
+                add_groups(totals, dimension, [group[index] for group in groups], classes)
+    return totals
+
+
+# Add up the totals of separate runs.
+def merge(totals_list):
+    merged = empty()
+    for totals in totals_list:
+        for key, counts in totals.items():
+            if key not in merged:
+                merged[key] = empty_counts()
+            for name in COUNT_NAMES:
+                merged[key][name] += counts[name]
+    return merged
+
+
+def save(totals, filename):
+    keys = sorted(totals)
+    sizes = dict((name, len(counts)) for name, counts in empty_counts().items())
+    arrays = dict((name, numpy.array([totals[key][name] for key in keys], dtype=numpy.int64)
+                   .reshape(len(keys), sizes[name])) for name in COUNT_NAMES)
+    numpy.savez(filename, dimension=numpy.array([key[0] for key in keys], dtype=object).astype(str),
+                value=numpy.array([key[1] for key in keys], dtype=object).astype(str),
+                relative_accuracy=RELATIVE_ACCURACY, **arrays)
+
+
+def load(filename):
+    try:
+        data = numpy.load(filename)
+    except IOError:
+        print "ERROR: Could not find file '" \
+            + filename \
+            + "'. Bailing out."
+        sys.exit(0)
+    if float(data['relative_accuracy']) != RELATIVE_ACCURACY or data['sketch'].shape[1] != SKETCH_BINS:
+        print "ERROR: summary '" + filename + "' was made with other sketch settings. Bailing out."
+        sys.exit(0)
+    totals = empty()
+    for index, key in enumerate(zip(data['dimension'], data['value'])):
+        # Summaries saved before unknown capacities were counted have no 'unknown' counts.
+        totals[(str(key[0]), str(key[1]))] = dict((name, data[name][index].copy() if name in data.files
+                                                   else empty_counts()[name]) for name in COUNT_NAMES)
+    return totals
+
+
+# Capacity quantiles of one group from its sketch.
+def quantiles(sketch, probabilities=QUANTILES):
+    count = sketch.sum()
+    if count == 0:
+        return [''] * len(probabilities)
+    cumulative = numpy.cumsum(sketch)
+    ranks = numpy.floor(numpy.array(probabilities) * (count - 1))
+    return list(sketch_value(numpy.searchsorted(cumulative, ranks, side='right')))
+
+
+# Write one report csv per dimension.
+# Returns:
+#   The list of report filenames.
+def report(totals, output_prefix):
+    thresholds = YEARS[1:]
+    edges = ['%g' % edge for edge in HISTOGRAM_EDGES]
+    header = ['Group', 'Crossings', 'Culverts'] \
+        + ['Under ' + str(years) + ' yr (current)' for years in thresholds] \
+        + ['Under ' + str(years) + ' yr (future)' for years in thresholds] \
+        + ['Capacity P' + ('%g' % (100 * probability)) + ' (m^3/s)' for probability in QUANTILES] \
+        + ['Capacity under ' + edges[0]] \
+        + ['Capacity ' + edges[index] + ' to ' + edges[index + 1] for index in range(len(edges) - 1)] \
+        + ['Capacity ' + edges[-1] + ' and over', 'Capacity unknown']
+    filenames = []
+    for dimension in [INVENTORY] + [name for name, column in DIMENSIONS]:
+        keys = sorted(key for key in totals if key[0] == dimension)
+        if len(keys) == 0:
+            continue
+        filename = output_prefix + 'summary_' + dimension + '.csv'
+        with open(filename, 'wb') as report_file:
+            csv_writer = csv.writer(report_file)
+            csv_writer.writerow(header)
+            for key in keys:
+                counts = totals[key]
+                csv_writer.writerow([key[1] if key[1] != '' else '(blank)',
+                                     counts['current'].sum(), counts['culverts'][0]]
+                                    + list(numpy.cumsum(counts['current'])[:-1])
+                                    + list(numpy.cumsum(counts['future'])[:-1])
+                                    + quantiles(counts['sketch']) + list(counts['histogram'])
+                                    + [counts['unknown'][0]])
+        filenames.append(filename)
+    return filenames
+
+
+# Summarize a run: save its totals to <prefix>summary.npz and write the reports.
+def summarize(final_output_filename, field_data_filename, output_prefix, county=''):
+    totals = aggregate(final_output_filename, field_data_filename, county)
+    save(totals, output_prefix + 'summary.npz')
+    report(totals, output_prefix)
+    return totals
+
+
+# Merge the saved totals of several runs and write the combined reports.
+def merge_files(summary_filenames, output_prefix):
+    totals = merge([load(filename) for filename in summary_filenames])
+    save(totals, output_prefix + 'summary.npz')
+    report(totals, output_prefix)
+    return totals
+
+
+if __name__ == '__main__':
+    print('Cornell Culvert Evaluation Model - inventory summary')
+    print('----------------------------------------------------\n')
+
+    Runs = raw_input("Please enter the data folder names to summarize, separated by commas: \n")
+    folders = [folder.strip() for folder in Runs.split(',') if folder.strip()]
+    prefixes = ["../" + folder + "/" + folder + "_Model_Output/" + folder + "_" for folder in folders]
+    for folder, prefix in zip(folders, prefixes):
+        summarize(prefix + 'model_output.csv', "../" + folder + "/" + folder + '_field_data.csv', prefix, folder)
+        print " * Summarized " + folder + " in " + prefix + "summary_*.csv"
+    if len(folders) > 1:
+        Combined = raw_input("Name for the combined summary (saved in the current folder): \n")
+        merge_files([prefix + 'summary.npz' for prefix in prefixes], Combined + '_')
+        print " * Combined summary saved as " + Combined + "_summary_*.csv"
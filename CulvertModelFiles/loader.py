@@ -47,6 +47,8 @@ import numpy
 #   required_headers: the signature of the headers and their data types in the above format.
 #   start_row: which row to look for the headers on. Normally 1.
 #   max_rows: How many rows of data to read. Put -1 to read until end of file.
+#   cache: True to keep the parsed columns in a memory-mapped cache next to the file (see input_cache.py),
+#          so later loads of an unchanged file skip parsing.
 # Returns:
 #   A dictionary containing two entries: valid_rows and invalid_rows.
 # 
@@ -55,7 +57,10 @@ import numpy
 #
 #   invalid_rows is a dictionary containing row_number, 
 #   row (the actual row list), and reason_invalid string.
-def load(filename, required_headers, start_row, max_rows) :
+def load(filename, required_headers, start_row, max_rows, cache=False) :
+    if cache:
+        import input_cache
+        return input_cache.load_rows(filename, required_headers, start_row, max_rows)
     try:
         with open(filename, 'r') as csv_file:
             input_table = csv.reader(csv_file)
@@ -137,9 +142,9 @@ def load(filename, required_headers, start_row, max_rows) :
                             + "." \
                         })
                         break
-
-                #Successful, so add to result list.
-                result_list.append(result_item)
+                else:
+                    #Successful (no break above), so add to result list.
+                    result_list.append(result_item)
                 row_number += 1 #row number is increased by 1
                
             # Return our list of dictionaries.
@@ -0,0 +1,108 @@
+# Culvert model client
+# October 2026
+#
+# Thin client for model_server.py. This script will send a data folder to the running
+# model server and print the progress the server streams back while it runs the model.
+# It only uses the standard library, so it starts in a fraction of a second.
+#
+# The server unpickles whatever it receives, so only clients with the key can connect. The key is a random one
+# made on the server's first start and kept in KEY_FILENAME, which only its owner can read; the client reads it
+# from there, so the server and its clients must run as the same user.
+#
+# Usage: python model_client.py <data folder> [y/n NOAA precip] [NY region] [region shapefile]
+
+import os, sys, binascii
+from multiprocessing.connection import Client
+
+ADDRESS = ('localhost', 6543)
+KEY_FILENAME = os.path.join(os.path.expanduser('~'), '.culvert_model_key')
+FILE_OPTIONS = ['RunStore', 'StationList', 'QuTable']  # evaluate options that are filenames
+
+
+# Read the server key.
+# Parameters:
+#   create: True to make a new random key if there is none yet (done by the server).
+def load_key(key_filename=KEY_FILENAME, create=False):
+    if create and not os.path.exists(key_filename):
+        try:
+            descriptor = os.open(key_filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0600)
+            with os.fdopen(descriptor, 'wb') as key_file:
+                key_file.write(binascii.hexlify(os.urandom(32)))
+        except OSError:
+            pass  # Made by another server starting at the same time
+    try:
+        with open(key_filename, 'rb') as key_file:
+            key = key_file.read().strip()
+    except IOError:
+        print "ERROR: Could not find the model server key '" + key_filename \
+            + "' (start model_server.py first, as the same user). Bailing out."
+        sys.exit(0)
+    if os.name == 'posix' and os.stat(key_filename).st_mode & 0077:
+        print "ERROR: the model server key '" + key_filename + "' can be read by other users (chmod 600 it). " \
+            + "Bailing out."
+        sys.exit(0)
+    return key
+
+
+# Submit one model run to the server.
+# Parameters: the same as Culvert_Eval.evaluate, plus the server address and key (read from KEY_FILENAME if None).
+#   runs_path and the file options (RegionLayer, RunStore, StationList, QuTable) are relative to this client's
+#   working folder (they are sent to the server as absolute paths).
+#   options: other Culvert_Eval.evaluate options (Control, StationCount, Resume, ...). The server always runs the
+#            stages one at a time, so processes other than 1 is refused.
+# Returns:
+#   The output folder of the run, or None if the run failed.
+def submit(FileNm, PrecipType='y', RegionLayer='', Reg=2, runs_path='../', address=ADDRESS, authkey=None,
+           **options):
+    if options.get('processes', 1) != 1:
+        print "ERROR: the model server runs the stages one at a time, so its progress reaches the client " \
+            + "(leave processes out or set it to 1). Bailing out."
+        sys.exit(0)
+    for name in FILE_OPTIONS:
+        if options.get(name):
+            options[name] = os.path.abspath(options[name])
+    connection = Client(address, authkey=authkey or load_key())
+    try:
+        connection.send({
+            'FileNm': FileNm,
+            'PrecipType': PrecipType,
+            'RegionLayer': os.path.abspath(RegionLayer) if RegionLayer else '',
+            'Reg': Reg,
+            'runs_path': os.path.abspath(runs_path) + '/',
+            'options': options
+        })
+        while True:
+            kind, message = connection.recv()
+            if kind == 'progress':
+                sys.stdout.write(message)
+            elif kind == 'done':
+                return message
+            else:
+                print "ERROR: the model run for " + FileNm + " failed on the server:\n" + message
+                return None
+    finally:
+        connection.close()
+
+
+# Ask the server to shut down.
+def stop(address=ADDRESS, authkey=None):
+    connection = Client(address, authkey=authkey or load_key())
+    try:
+        connection.send({'stop': True})
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print "Usage: python model_client.py <data folder> [y/n NOAA precip] [NY region] [region shapefile]"
+        print "       python model_client.py --stop"
+        sys.exit(0)
+    if sys.argv[1] == '--stop':
+        stop()
+        sys.exit(0)
+    PrecipType = sys.argv[2] if len(sys.argv) > 2 else 'y'
+    Reg = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    RegionLayer = sys.argv[4] if len(sys.argv) > 4 else ''
+    if submit(sys.argv[1], PrecipType, RegionLayer, Reg) is None:
+        sys.exit(1)
@@ -0,0 +1,87 @@
+# Culvert model server
+# October 2026
+#
+# A long-lived worker process for running many small model runs in a row.
+# Starting Python and importing numpy and pandas costs more than the model itself for a small county,
+# so this script imports the model modules once (which also loads the runoffP coefficient tables
+# and StreamStats region constants) and then waits for jobs from model_client.py on a local socket.
+# Each job runs Culvert_Eval.evaluate, and everything the stages print is streamed back to the client.
+#
+# Jobs are run one at a time, and the stages of a job one after another in this process (processes=1), so
+# everything they print reaches the client. A job that fails (including a stage bailing out with sys.exit)
+# is reported back to its client and the server keeps running.
+#
+# Only clients with the key in model_client.KEY_FILENAME (made on the first start) can connect.
+#
+# Usage: python model_server.py      (stop it with Ctrl-C or python model_client.py --stop)
+
+import sys, traceback
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener
+import Culvert_Eval  # Imports every model stage, with numpy and pandas
+import model_client
+
+
+# File-like object that sends everything written to it to the client as progress messages.
+class ProgressStream(object):
+    def __init__(self, connection):
+        self.connection = connection
+
+    def write(self, text):
+        self.connection.send(('progress', text))
+
+    def flush(self):
+        pass
+
+
+# Run one job from a connected client.
+# Returns:
+#   False if the client asked the server to stop, True otherwise.
+def handle(connection):
+    job = connection.recv()
+    if job.get('stop'):
+        return False
+
+    print "Running " + job['FileNm'] + "..."
+    server_stdout = sys.stdout
+    sys.stdout = ProgressStream(connection)
+    options = dict(job.get('options', {}))
+    options['processes'] = 1  # Stages run in this process, so everything they print reaches the client.
+    try:
+        OutputDirectory = Culvert_Eval.evaluate(job['FileNm'], job['PrecipType'], job['RegionLayer'],
+                                                job['Reg'], job['runs_path'], **options)
+        sys.stdout = server_stdout
+        connection.send(('done', OutputDirectory))
+        print "Finished " + job['FileNm'] + "."
+    except (Exception, SystemExit):
+        sys.stdout = server_stdout
+        connection.send(('error', traceback.format_exc()))
+        print "Failed " + job['FileNm'] + "."
+    finally:
+        sys.stdout = server_stdout
+    return True
+
+
+def serve(address=model_client.ADDRESS, authkey=None):
+    listener = Listener(address, authkey=authkey or model_client.load_key(create=True))
+    print "Culvert model server ready on " + address[0] + ":" + str(address[1]) + "."
+    try:
+        running = True
+        while running:
+            try:
+                connection = listener.accept()
+            except AuthenticationError:
+                print "Refused a client without the server key."
+                continue
+            try:
+                running = handle(connection)
+            except (EOFError, IOError):
+                print "Client disconnected before the job finished."
+            finally:
+                connection.close()
+    finally:
+        listener.close()
+
+
+if __name__ == '__main__':
+    serve()
@@ -0,0 +1,274 @@
+# Nested-watershed culvert network
+# October 2026
+#
+# Culverts on the same stream drain nested watersheds: the watershed of an upstream culvert lies inside the
+# watershed of the next culvert downstream. This script will:
+# a) build the upstream/downstream graph between culverts, either from a flow-path link file or from
+#    watershed containment (the culvert lies inside the smallest larger watershed of the culvert below it),
+# b) compute runoff only for the local (incremental) area of each watershed, with that watershed's CN and Tc,
+#    and add the upstream peak flows on in topological order (one array operation per level of the network),
+# c) re-evaluate only the crossings downstream of a change (update), and
+# d) report each crossing's cascaded flows, return period, and the lowest return period on its way to the outlet.
+#
+# Adding the upstream peaks assumes they arrive together, so cascaded flows are an upper bound
+# (no routing or attenuation).
+#
+# Inputs:  sorted watershed file (sorted_ws.csv) and capacity output from a finished run, and either
+#          a link csv with BarrierID, Downstream_ID (blank at outlets)
+#          or a watershed polygon shapefile in geographic coordinates with a BarrierID attribute plus the field data csv.
+#
+# Outputs: <prefix>network.csv with BarrierID, Downstream_ID, Local_Area_sqkm, Num_Upstream, cascaded peak flows
+#          Y1-Y500 (m^3/s), Q (capacity), Max Return (yr) and Downstream Min Return (yr).
+
+import sys, numpy, loader, records, region_assign, runoffP, output_writer, sorterPrecip
+
+YEARS = numpy.array([0, 1, 2, 5, 10, 25, 50, 100, 200, 500])
+FLOW_NAMES = ['Y1', 'Y2', 'Y5', 'Y10', 'Y25', 'Y50', 'Y100', 'Y200', 'Y500']
+
+
+# Read links from a flow-path csv (BarrierID, Downstream_ID).
+# Returns:
+#   A dictionary of BarrierID -> downstream BarrierID (outlets are left out).
+def links_from_csv(links_filename):
+    links_signature = [
+        {'name': 'BarrierID', 'type': str},
+        {'name': 'Downstream_ID', 'type': str}
+    ]
+    links = {}
+    for row in loader.load(links_filename, links_signature, 1, -1)['valid_rows']:
+        if row['Downstream_ID'] != '':
+            links[row['BarrierID']] = row['Downstream_ID']
+    return links
+
+
+# Build links from watershed containment.
+# Parameters:
+#   field_data_filename: field data csv with BarrierID, Lat, Long of each culvert.
+#   watershed_filename: watershed polygon shapefile (Lat/Long coordinates) with one polygon per culvert.
+#   sorted_filename: sorted watershed file, for the watershed areas.
+#   id_field: attribute holding the BarrierID of each watershed polygon (matched to the culverts with
+#             sorterPrecip.culvert_id, so '10cmbws' is the watershed of '10CMB').
+# Returns:
+#   A dictionary of BarrierID -> downstream BarrierID.
+def links_from_watersheds(field_data_filename, watershed_filename, sorted_filename, id_field='BarrierID'):
+    field_data_signature = [
+        {'name': 'BarrierID', 'type': str},
+        {'name': 'Lat', 'type': float},
+        {'name': 'Long', 'type': float}
+    ]
+    area_signature = [
+        {'name': 'BarrierID', 'type': str},
+        {'name': 'Area_sqkm', 'type': float}
+    ]
+    points = loader.load(field_data_filename, field_data_signature, 1, -1)['valid_rows']
+    areas = dict((sorterPrecip.culvert_id(row['BarrierID']), row['Area_sqkm'])
+                 for row in loader.load(sorted_filename, area_signature, 1, -1)['valid_rows'])
+
+    ids = [row['BarrierID'] for row in points]
+    culvert_ids = [sorterPrecip.culvert_id(barrier_id) for barrier_id in ids]
+    field_id = dict(zip(culvert_ids, ids))
+    x = numpy.array([row['Long'] for row in points])
+    y = numpy.array([row['Lat'] for row in points])
+    point_area = numpy.array([areas.get(barrier_id, numpy.nan) for barrier_id in culvert_ids])
+    id_array = numpy.array(culvert_ids, dtype=object)
+
+    # For each culvert, the smallest watershed (other than its own) that it lies inside is the one downstream.
+    best_area = numpy.full(len(ids), numpy.inf)
+    downstream = numpy.array([None] * len(ids), dtype=object)
+    for polygon in region_assign.load_regions(watershed_filename, id_field, field_type=str):
+        barrier_id = sorterPrecip.culvert_id(polygon['region'])
+        if barrier_id not in areas or barrier_id not in field_id:
+            print "Did not find modeled watershed and culvert for watershed polygon " + polygon['region'] \
+                + ", skipping it."
+            continue
+        area = areas[barrier_id]
+        inside = region_assign.points_inside(x, y, polygon)
+        with numpy.errstate(invalid='ignore'):
+            hits = inside & (id_array != barrier_id) & (point_area < area) & (area < best_area)
+        best_area[hits] = area
+        downstream[hits] = field_id[barrier_id]
+
+    return dict((barrier_id, below) for barrier_id, below in zip(ids, downstream) if below is not None)
+
+
+# Build the network from the links and a finished run.
+# Parameters:
+#   links: dictionary of BarrierID -> downstream BarrierID.
+#   sorted_filename: sorted watershed file (runoffP input).
+#   capacity_filename: capacity output file.
+#   rainfall_adjustment, peak_method, rain_type, qu_table: as for runoffP.calculate.
+# Returns:
+#   A network dictionary. Crossings are ordered so every crossing comes after all crossings upstream of it.
+def build(links, sorted_filename, capacity_filename, rainfall_adjustment=1.0, peak_method='qu', rain_type='II',
+          qu_table=''):
+    watershed_signature = [{'name': 'BarrierID', 'type': str}, {'name': 'Area_sqkm', 'type': float},
+                           {'name': 'Tc_hr', 'type': float}, {'name': 'CN', 'type': float}] \
+        + [{'name': 'P' + name[1:], 'type': float} for name in FLOW_NAMES]
+    capacity_signature = [{'name': 'BarrierID', 'type': str}, {'name': 'Q', 'type': float}]
+    watersheds = records.load(sorted_filename, watershed_signature, 1, -1)['table']
+    capacities = records.load(capacity_filename, capacity_signature, 1, -1)['table']
+
+    # Crossings with a modeled watershed (as in runoffP) and a capacity.
+    capacity_lookup = dict(zip(capacities.strings('BarrierID'), capacities.column('Q')))
+    watershed_index = {}
+    modeled = (watersheds.column('CN') != 0) & (watersheds.column('Tc_hr') != 0) & (watersheds.column('Area_sqkm') >= 0.01)
+    for index, barrier_id in enumerate(watersheds.strings('BarrierID')):
+        if modeled[index] and barrier_id in capacity_lookup:
+            watershed_index[barrier_id] = index
+    ids = sorted(watershed_index, key=lambda barrier_id: watershed_index[barrier_id])
+
+    # Topological order (Kahn's algorithm), and the level of each crossing (longest path from a headwater crossing).
+    num_upstream = dict((barrier_id, 0) for barrier_id in ids)
+    for barrier_id in ids:
+        below = links.get(barrier_id)
+        if below in num_upstream:
+            num_upstream[below] += 1
+    ready = [barrier_id for barrier_id in ids if num_upstream[barrier_id] == 0]
+    level = dict((barrier_id, 0) for barrier_id in ids)
+    order = []
+    while ready:
+        barrier_id = ready.pop()
+        order.append(barrier_id)
+        below = links.get(barrier_id)
+        if below in num_upstream:
+            level[below] = max(level[below], level[barrier_id] + 1)
+            num_upstream[below] -= 1
+            if num_upstream[below] == 0:
+                ready.append(below)
+    if len(order) < len(ids):
+        print "ERROR: the culvert links contain a loop through " \
+            + ", ".join(sorted(set(ids) - set(order))[:10]) \
+            + ". Bailing out."
+        sys.exit(0)
+    order.sort(key=lambda barrier_id: level[barrier_id])
+
+    index = dict((barrier_id, i) for i, barrier_id in enumerate(order))
+    rows = numpy.array([watershed_index[barrier_id] for barrier_id in order], dtype=int)
+    downstream = numpy.array([index.get(links.get(barrier_id), -1) for barrier_id in order], dtype=int)
+    levels = numpy.array([level[barrier_id] for barrier_id in order], dtype=int)
+
+    # Local area: the watershed less the watersheds of the crossings directly upstream.
+    area = watersheds.column('Area_sqkm')[rows]
+    upstream_area = numpy.zeros(len(order))
+    has_downstream = downstream >= 0
+    numpy.add.at(upstream_area, downstream[has_downstream], area[has_downstream])
+
+    return {
+        'BarrierID': order,
+        'index': index,
+        'downstream': downstream,
+        'level_starts': numpy.searchsorted(levels, numpy.arange(levels.max() + 2 if len(levels) else 1)),
+        'local_area': numpy.maximum(area - upstream_area, 0),
+        'tc': watersheds.column('Tc_hr')[rows],
+        'CN': watersheds.column('CN')[rows],
+        'P': numpy.column_stack([watersheds.column('P' + name[1:])[rows] for name in FLOW_NAMES]).reshape(-1, 9)
+            * rainfall_adjustment / 10,
+        'capacity': numpy.array([capacity_lookup[barrier_id] for barrier_id in order]),
+        'peak_method': peak_method,
+        'rain_type': rain_type,
+        'qu': runoffP.qu_coefficients(qu_table)
+    }
+
+
+# Highest return period each crossing passes before overflowing (as in final_output).
+def max_return(capacity, flows):
+    overflows = capacity[:, numpy.newaxis] < flows
+    first = numpy.argmax(overflows, axis=1)
+    first[~numpy.any(overflows, axis=1)] = len(YEARS) - 1
+    return YEARS[first]
+
+
+# Evaluate the whole network: local runoff for every crossing, then upstream flows added level by level.
+def cascade(network):
+    network['local_flow'] = runoffP.peak_flows(network['local_area'], network['tc'], network['CN'], network['P'],
+                                               network['peak_method'], network['rain_type'], network['qu'])
+    flow = network['local_flow'].copy()
+    starts = network['level_starts']
+    for level in range(len(starts) - 1):
+        crossings = numpy.arange(starts[level], starts[level + 1])
+        crossings = crossings[network['downstream'][crossings] >= 0]
+        numpy.add.at(flow, network['downstream'][crossings], flow[crossings])
+    network['flow'] = flow
+    network['return'] = max_return(network['capacity'], flow)
+    return network
+
+
+# Crossings from one crossing down to its outlet.
+def downstream_path(network, index):
+    path = []
+    while index >= 0:
+        path.append(index)
+        index = network['downstream'][index]
+    return numpy.array(path, dtype=int)
+
+
+# Change one crossing and re-evaluate only the crossings downstream of it (after cascade).
+# Parameters:
+#   network: network dictionary from cascade.
+#   barrier_id: crossing to change.
+#   local_area, tc, CN, capacity: new values (None leaves a value unchanged).
+# Returns:
+#   The list of BarrierIDs that were re-evaluated.
+def update(network, barrier_id, local_area=None, tc=None, CN=None, capacity=None):
+    index = network['index'][barrier_id]
+    for name, value in (('local_area', local_area), ('tc', tc), ('CN', CN), ('capacity', capacity)):
+        if value is not None:
+            network[name][index] = value
+
+    local_flow = runoffP.peak_flows(network['local_area'][index:index + 1], network['tc'][index:index + 1],
+                                    network['CN'][index:index + 1], network['P'][index:index + 1],
+                                    network['peak_method'], network['rain_type'], network['qu'])[0]
+    path = downstream_path(network, index)
+    network['flow'][path] += local_flow - network['local_flow'][index]
+    network['local_flow'][index] = local_flow
+    network['return'][path] = max_return(network['capacity'][path], network['flow'][path])
+    return [network['BarrierID'][i] for i in path]
+
+
+# Save the network results.
+def save(network, output_filename):
+    starts = network['level_starts']
+    downstream = network['downstream']
+
+    # Number of crossings upstream of each crossing (upstream levels first).
+    num_upstream = numpy.zeros(len(downstream), dtype=int)
+    for level in range(len(starts) - 1):
+        crossings = numpy.arange(starts[level], starts[level + 1])
+        crossings = crossings[downstream[crossings] >= 0]
+        numpy.add.at(num_upstream, downstream[crossings], num_upstream[crossings] + 1)
+
+    # Lowest return period between each crossing and its outlet (downstream levels first).
+    downstream_min = network['return'].copy()
+    for level in range(len(starts) - 2, -1, -1):
+        crossings = numpy.arange(starts[level], starts[level + 1])
+        crossings = crossings[downstream[crossings] >= 0]
+        downstream_min[crossings] = numpy.minimum(downstream_min[crossings], downstream_min[downstream[crossings]])
+
+    ids = network['BarrierID']
+    output_writer.write(output_filename,
+                        ['BarrierID', 'Downstream_ID', 'Local_Area_sqkm', 'Num_Upstream'] + FLOW_NAMES
+                        + ['Q', 'Max Return (yr)', 'Downstream Min Return (yr)'],
+                        [ids, [ids[i] if i >= 0 else '' for i in downstream], network['local_area'], num_upstream]
+                        + [network['flow'][:, i] for i in range(len(FLOW_NAMES))]
+                        + [network['capacity'], network['return'], downstream_min])
+
+
+if __name__ == '__main__':
+    print('Cornell Culvert Evaluation Model - culvert network')
+    print('--------------------------------------------------\n')
+
+    FileNm = raw_input("Please enter your data file prefix, which should also be your data folder name: \n")
+    LinkFile = raw_input("Path to a link csv (BarrierID, Downstream_ID) or a watershed polygon shapefile (.shp): \n")
+    Future = raw_input("Use future rainfall (1.15 x current)? (y/n) \n")
+
+    data_path = "../" + FileNm + "/"
+    output_prefix = data_path + FileNm + "_Model_Output/" + FileNm + "_"
+    if LinkFile.endswith('.shp'):
+        links = links_from_watersheds(data_path + FileNm + '_field_data.csv', LinkFile, output_prefix + 'sorted_ws.csv')
+    else:
+        links = links_from_csv(LinkFile)
+    network = build(links, output_prefix + 'sorted_ws.csv', output_prefix + 'capacity_output.csv',
+                    1.15 if Future == 'y' else 1.0)
+    cascade(network)
+    save(network, output_prefix + 'network.csv')
+    print "\nDone! Network results can be found here:\n" + output_prefix + "network.csv"
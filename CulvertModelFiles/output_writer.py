@@ -0,0 +1,104 @@
+# Column-oriented csv writer for model outputs
+# October 2026
+#
+# This script will write a table to csv a whole column at a time instead of one row at a time:
+# a) each column is formatted in one step (floats with one fixed format, ints as integers,
+#    text quoted only where csv needs it),
+# b) the formatted rows are joined and written in large blocks through a buffered file, and
+# c) the file can optionally be compressed with gzip or zstd (zstd needs the zstandard package).
+#
+# Line endings and quoting match the csv module defaults, so the files read the same way as before.
+
+import gzip, io, sys, numpy
+
+FLOAT_FORMAT = '%.6f'
+CHUNK_ROWS = 65536  # Rows formatted and written per block
+BUFFER_SIZE = 1 << 20  # 1 MB write buffer
+COMPRESSION_SUFFIX = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+
+# Open an output file for writing, with optional compression.
+# Parameters:
+#   filename: path of the output file. '.gz' or '.zst' is added when compressing.
+#   compression: None, 'gzip' or 'zstd'.
+# Returns:
+#   A writable binary file object.
+def open_output(filename, compression=None):
+    if compression not in COMPRESSION_SUFFIX:
+        print "ERROR: unknown compression '" + str(compression) + "' (use gzip or zstd). Bailing out."
+        sys.exit(0)
+    filename = filename + COMPRESSION_SUFFIX[compression]
+    if compression == 'gzip':
+        return gzip.open(filename, 'wb', 6)  # Blocks are already large, so no extra buffer needed
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            print "ERROR: zstd compression needs the zstandard package (pip install zstandard). Bailing out."
+            sys.exit(0)
+        return zstandard.ZstdCompressor().stream_writer(io.open(filename, 'wb', buffering=BUFFER_SIZE))
+    return io.open(filename, 'wb', buffering=BUFFER_SIZE)
+
+
+# Quote a text value the way csv.writer does (only when it contains a comma, quote or line break).
+def quote(value):
+    if value is None:
+        return ''
+    value = str(value)
+    if ',' in value or '"' in value or '\n' in value or '\r' in value:
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+# Format one whole column.
+# Parameters:
+#   values: numpy array or sequence of values (all the same kind).
+#   float_format: printf-style format used for floats.
+# Returns:
+#   A numpy array of strings.
+def format_column(values, float_format=FLOAT_FORMAT):
+    array = numpy.asarray(values)
+    if array.dtype.kind == 'f':
+        return numpy.char.mod(float_format, array)
+    if array.dtype.kind in 'iub':
+        return numpy.char.mod('%d', array.astype(numpy.int64))
+    return numpy.array([quote(value) for value in values], dtype=object)
+
+
+# Write a table given as columns.
+# Parameters:
+#   filename: path of the output file.
+#   header: list of column names.
+#   columns: list of columns (numpy arrays or sequences), in header order, all the same length.
+#   float_format: printf-style format used for float columns.
+#   compression: None, 'gzip' or 'zstd'.
+def write(filename, header, columns, float_format=FLOAT_FORMAT, compression=None):
+    num_rows = len(columns[0]) if len(columns) > 0 else 0
+    output_file = open_output(filename, compression)
+    try:
+        output_file.write(','.join(quote(name) for name in header) + '\r\n')
+        for start in range(0, num_rows, CHUNK_ROWS):
+            block = [format_column(column[start:start + CHUNK_ROWS], float_format) for column in columns]
+            lines = [','.join(row) for row in zip(*block)]
+            output_file.write('\r\n'.join(lines) + '\r\n')
+    finally:
+        output_file.close()
+
+
+# Write a table given as a list of rows (as the stages build their results), one column at a time.
+# Parameters are the same as write, with rows (a list of lists) in place of columns.
+def write_rows(filename, header, rows, float_format=FLOAT_FORMAT, compression=None):
+    if len(rows) == 0:
+        columns = [[] for name in header]
+    else:
+        columns = [column_values(column) for column in zip(*rows)]
+    write(filename, header, columns, float_format, compression)
+
+
+# Turn one column of row values into a numpy array of the right kind.
+def column_values(values):
+    if all(isinstance(value, float) for value in values):
+        return numpy.array(values, dtype=float)
+    if all(isinstance(value, (int, long, numpy.integer)) and not isinstance(value, bool) for value in values):
+        return numpy.array(values, dtype=numpy.int64)
+    return list(values)
@@ -0,0 +1,268 @@
+# Stage scheduler for model runs
+# October 2026
+#
+# This script will run a model pipeline described as a list of stages, each with the files it reads (inputs) and
+# writes (outputs). A stage depends on the stages that write its inputs, which makes the pipeline a directed
+# acyclic graph (DAG):
+# a) stages whose inputs are ready are started on a pool of worker processes, so independent branches (e.g. the
+#    watershed runoff and the culvert capacity) run at the same time,
+# b) a stage starts as soon as the last stage it depends on finishes, and
+# c) a dry run prints the plan (stages in waves that can run together) and the critical path (the longest chain
+#    of dependent stages, which bounds the run time however many workers there are).
+#
+# Inputs that no stage writes are source files and must exist before the run. Each stage runs in its own process,
+# so stages can start worker pools of their own. With one worker the stages run one after another in this process,
+# in list order where the dependencies allow.
+#
+# With a checkpoint (see checkpoint.py), each finished stage is recorded with the files it read and wrote, and a
+# resumed run skips the stages that are still up to date.
+#
+# Example:
+#   stages = [pipeline.stage('geometry', capacity_prep.geometry, (field_filename, geometry_filename),
+#                            inputs=[field_filename], outputs=[geometry_filename]), ...]
+#   pipeline.run(stages, dry_run=True)   # print the plan only
+
+import os, sys, time, traceback, multiprocessing, Queue, checkpoint
+
+
+# Describe a stage.
+# Parameters:
+#   name: unique stage name.
+#   function: module level function to call (so it can be sent to a worker process).
+#   args, kwargs: arguments of the call.
+#   inputs, outputs: filenames the stage reads and writes.
+#   cost: expected run time (any unit), used for the critical path of a dry run.
+#   message: text printed when the stage starts.
+def stage(name, function, args=(), kwargs=None, inputs=(), outputs=(), cost=1.0, message=''):
+    return {
+        'name': name,
+        'function': function,
+        'args': tuple(args),
+        'kwargs': dict(kwargs or {}),
+        'inputs': list(inputs),
+        'outputs': list(outputs),
+        'cost': float(cost),
+        'message': message
+    }
+
+
+# Stages each stage depends on.
+# Returns:
+#   A dictionary of stage name to the list of names of the stages that write its inputs.
+def dependencies(stages):
+    producer = {}
+    names = set()
+    for item in stages:
+        if item['name'] in names:
+            print "ERROR: there are two stages named '" + item['name'] + "'. Bailing out."
+            sys.exit(0)
+        names.add(item['name'])
+        for output in item['outputs']:
+            if output in producer:
+                print "ERROR: stages '" + producer[output] + "' and '" + item['name'] + "' both write '" + output \
+                    + "'. Bailing out."
+                sys.exit(0)
+            producer[output] = item['name']
+    return dict((item['name'], sorted(set(producer[name] for name in item['inputs']
+                                          if name in producer and producer[name] != item['name'])))
+                for item in stages)
+
+
+# Group the stages into waves: each wave only depends on the waves before it.
+# Returns:
+#   A list of lists of stage names, in list order within a wave.
+def waves(stages):
+    depends = dependencies(stages)
+    done = set()
+    result = []
+    while len(done) < len(stages):
+        wave = [item['name'] for item in stages
+                if item['name'] not in done and all(name in done for name in depends[item['name']])]
+        if len(wave) == 0:
+            print "ERROR: the stages " + ", ".join(item['name'] for item in stages if item['name'] not in done) \
+                + " depend on each other in a cycle. Bailing out."
+            sys.exit(0)
+        done.update(wave)
+        result.append(wave)
+    return result
+
+
+# Longest chain of dependent stages.
+# Parameters:
+#   durations: dictionary of stage name to run time (defaults to each stage's cost).
+# Returns:
+#   The list of stage names on the critical path and its total time.
+def critical_path(stages, durations=None):
+    depends = dependencies(stages)
+    if durations is None:
+        durations = dict((item['name'], item['cost']) for item in stages)
+    finish = {}
+    previous = {}
+    for wave in waves(stages):
+        for name in wave:
+            start = 0.0
+            previous[name] = None
+            for before in depends[name]:
+                if finish[before] > start:
+                    start = finish[before]
+                    previous[name] = before
+            finish[name] = start + durations.get(name, 0.0)
+    if len(finish) == 0:
+        return [], 0.0
+    name = max(finish, key=lambda key: finish[key])
+    total = finish[name]
+    path = []
+    while name is not None:
+        path.append(name)
+        name = previous[name]
+    return path[::-1], total
+
+
+# Print the plan of a run without running it (skipped: stages a resumed run would skip).
+def show_plan(stages, processes=None, skipped=()):
+    depends = dependencies(stages)
+    produced = set(output for item in stages for output in item['outputs'])
+    sources = sorted(set(name for item in stages for name in item['inputs'] if name not in produced))
+    plan = waves(stages)
+    print "Plan: " + str(len(stages)) + " stages in " + str(len(plan)) + " waves, up to " \
+        + str(processes or multiprocessing.cpu_count()) + " at a time."
+    print "Source files: " + ", ".join(os.path.basename(name) for name in sources)
+    for number, wave in enumerate(plan):
+        print "Wave " + str(number + 1) + ":"
+        for name in wave:
+            item = [entry for entry in stages if entry['name'] == name][0]
+            print "  " + name + (" (after " + ", ".join(depends[name]) + ")" if depends[name] else "") \
+                + " -> " + ", ".join(os.path.basename(output) for output in item['outputs']) \
+                + (" [done, skipped]" if name in skipped else "")
+    path, total = critical_path(stages)
+    print "Critical path: " + " -> ".join(path) + " (cost " + ('%g' % total) + ")"
+
+
+# What a stage runs, to tell whether a checkpointed stage was run the same way.
+def stage_call(item):
+    return item['function'].__module__ + '.' + item['function'].__name__ + repr(item['args']) \
+        + repr(sorted(item['kwargs'].items()))
+
+
+# Print the measured stage time and critical path of a run.
+def report(stages, durations):
+    if len(durations) == 0:
+        print " * Every stage was up to date."
+        return
+    path, total = critical_path(stages, durations)
+    print " * Ran " + str(len(durations)) + " stages in " + ('%.1f' % sum(durations.values())) \
+        + " s of stage time; critical path " + " -> ".join(path) + " (" + ('%.1f' % total) + " s)."
+
+
+# Run one stage in a worker process and report back on the queue.
+def stage_worker(item, results):
+    started = time.time()
+    error = None
+    try:
+        item['function'](*item['args'], **item['kwargs'])
+    except SystemExit:
+        error = "it bailed out (see its ERROR above)"
+    except Exception:
+        error = traceback.format_exc()
+    results.put((item['name'], error, time.time() - started))
+
+
+# Run the stages.
+# Parameters:
+#   stages: list of stages (see stage).
+#   processes: number of stages to run at once (defaults to the number of cores, 1 to run them in this process).
+#   dry_run: True to print the plan and the critical path without running anything.
+#   state: checkpoint (see checkpoint.py) to record finished stages in, or None. Stages the checkpoint lists as
+#          finished, with the same call and unchanged files, and after only skipped stages, are skipped.
+# Returns:
+#   A dictionary of stage name to run time in seconds (empty for a dry run).
+def run(stages, processes=None, dry_run=False, state=None):
+    depends = dependencies(stages)
+    plan = waves(stages)  # Also checks for cycles
+    skipped = set()
+    if state is not None:
+        for wave in plan:
+            for name in wave:
+                item = [entry for entry in stages if entry['name'] == name][0]
+                if all(before in skipped for before in depends[name]) \
+                        and checkpoint.stage_done(state, name, stage_call(item), item['inputs'], item['outputs']):
+                    skipped.add(name)
+    if dry_run:
+        show_plan(stages, processes, skipped)
+        return {}
+    produced = set(output for item in stages for output in item['outputs'])
+    for item in stages:
+        for name in item['inputs']:
+            if name not in produced and not os.path.exists(name):
+                print "ERROR: Could not find file '" + name + "' needed by stage '" + item['name'] \
+                    + "'. Bailing out."
+                sys.exit(0)
+    for item in stages:
+        if item['name'] in skipped:
+            print " * Skipping " + item['name'] + ", finished in the checkpointed run."
+    by_name = dict((item['name'], item) for item in stages)
+    durations = {}
+    progress = checkpoint.Progress('stages', len(stages), len(skipped), interval=0)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    def finished(item, seconds):
+        durations[item['name']] = seconds
+        if state is not None:
+            checkpoint.mark_stage(state, item['name'], stage_call(item), item['inputs'], item['outputs'], seconds)
+        progress.update()
+
+    if processes == 1:
+        # In list order where the dependencies allow (wave by wave, any stage whose dependencies are done).
+        done = set(skipped)
+        while len(done) < len(stages):
+            item = [entry for entry in stages if entry['name'] not in done
+                    and all(name in done for name in depends[entry['name']])][0]
+            if item['message']:
+                print item['message']
+            started = time.time()
+            item['function'](*item['args'], **item['kwargs'])
+            finished(item, time.time() - started)
+            done.add(item['name'])
+        report(stages, durations)
+        return durations
+
+    waiting = dict((name, set(depends[name]) - skipped) for name in depends)
+    ready = [item['name'] for item in stages if item['name'] not in skipped and len(waiting[item['name']]) == 0]
+    running = {}
+    results = multiprocessing.Queue()
+    failed = None
+    while (ready and failed is None) or running:
+        while ready and failed is None and len(running) < processes:
+            item = by_name[ready.pop(0)]
+            if item['message']:
+                print item['message']
+            worker = multiprocessing.Process(target=stage_worker, args=(item, results))
+            worker.start()
+            running[item['name']] = worker
+        try:
+            name, error, elapsed = results.get(timeout=1)
+        except Queue.Empty:
+            # A worker that died without reporting (e.g. killed) fails its stage.
+            dead = [name for name, worker in running.items() if not worker.is_alive()]
+            if dead and results.empty():
+                name, error, elapsed = dead[0], "its process ended with exit code " \
+                    + str(running[dead[0]].exitcode), 0.0
+            else:
+                continue
+        running.pop(name).join()
+        if error is not None:
+            failed = failed or (name, error)
+            continue
+        finished(by_name[name], elapsed)
+        for other in stages:
+            if name in waiting[other['name']]:
+                waiting[other['name']].discard(name)
+                if len(waiting[other['name']]) == 0:
+                    ready.append(other['name'])
+    if failed is not None:
+        print "ERROR: stage '" + failed[0] + "' failed: " + failed[1].rstrip() + ". Bailing out."
+        sys.exit(0)
+
+    report(stages, durations)
+    return durations
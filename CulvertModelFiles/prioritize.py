@@ -0,0 +1,249 @@
+# Replacement prioritization
+# October 2026
+#
+# This script will rank crossings for replacement funding from a run's final output:
+# a) a risk score is computed for every crossing with a scoring formula over the crossing's values (capacity
+#    deficit against a target storm, drop in return period from current to future rainfall, number of barrels and
+#    a road class weight from Rd_Name), evaluated on whole blocks of rows at once,
+# b) only the top crossings are kept: each block is cut to its k best with a partial sort (numpy.argpartition),
+#    and merged with the best so far with a heap, so a statewide inventory is never fully sorted, and
+# c) the same is done for the top list of each county.
+#
+# Formula names (arrays, one value per crossing):
+#   deficit           target storm flow minus capacity (m^3/s, 0 if the crossing passes it)
+#   relative_deficit  deficit / target storm flow (0 to 1)
+#   drop              log10(current max return period + 1) - log10(future max return period + 1), 0 or more
+#   barrels           number of culverts
+#   road              road class weight (see ROAD_WEIGHTS, 1 when road weighting is off)
+#   capacity, flow, current, future   capacity, target storm flow (m^3/s) and max return periods (yr)
+# and numpy functions as e.g. log10, sqrt, minimum and maximum. Higher scores are ranked first; ties go to the
+# lower BarrierID.
+#
+# Rankings of separate runs (counties, statewide shards) are merged exactly by ranking their top lists again.
+#
+# Outputs: <prefix>priority.csv (top k crossings) and <prefix>priority_by_county.csv (top k of each county).
+
+import csv, re, sys, heapq, numpy, inventory_summary
+
+DEFAULT_FORMULA = 'road * (relative_deficit + 0.5 * drop + 0.1 * barrels)'
+TARGET_STORMS = [1, 2, 5, 10, 25, 100]  # Current flows in the final output
+# Road class weights: first pattern matching the upper-cased road name wins, 1.0 if none match.
+ROAD_WEIGHTS = [
+    (r'\b(I|INTERSTATE)[- ]?\d', 3.0),
+    (r'\b(US|NY|SR|STATE|ROUTE|RTE)\b', 2.0),
+    (r'\b(CR|COUNTY)\b', 1.5)
+]
+FORMULA_FUNCTIONS = ['log', 'log10', 'sqrt', 'exp', 'minimum', 'maximum', 'abs', 'where', 'clip']
+OUTPUT_COLUMNS = ['Rank', 'BarrierID', 'County', 'Road', 'Score', 'Deficit (m^3/s)', 'Target Flow (m^3/s)',
+                  'Capacity (m^3/s)', 'Current Max Return Period (yr)', 'Future Max Return Period (yr)',
+                  'Number of Culverts']
+CHUNK_ROWS = 65536
+
+
+# Compile a scoring formula, allowing only the formula names and functions.
+def compile_formula(formula):
+    try:
+        code = compile(formula, '<formula>', 'eval')
+    except SyntaxError:
+        print "ERROR: scoring formula '" + formula + "' is not a valid expression. Bailing out."
+        sys.exit(0)
+    allowed = set(['deficit', 'relative_deficit', 'drop', 'barrels', 'road', 'capacity', 'flow', 'current',
+                   'future'] + FORMULA_FUNCTIONS)
+    unknown = [name for name in code.co_names if name not in allowed]
+    if unknown:
+        print "ERROR: scoring formula '" + formula + "' uses unknown names " + ", ".join(unknown) + ". Bailing out."
+        sys.exit(0)
+    return code
+
+
+# Road class weight of each road name.
+def road_weights(road_names, weights=ROAD_WEIGHTS):
+    names, name_of = numpy.unique(numpy.array(road_names, dtype=object).astype(str), return_inverse=True)
+    patterns = [(re.compile(pattern), weight) for pattern, weight in weights]
+    weight = numpy.ones(len(names))
+    for index, name in enumerate(names):
+        for pattern, pattern_weight in patterns:
+            if pattern.search(name.upper()):
+                weight[index] = pattern_weight
+                break
+    return weight[name_of]
+
+
+# Scores of a block of crossings.
+# Parameters:
+#   code: compiled formula (see compile_formula).
+#   flow, capacity, current, future, barrels: arrays for the crossings.
+#   road: road class weights.
+def scores(code, flow, capacity, current, future, barrels, road):
+    deficit = numpy.maximum(flow - capacity, 0)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        names = {
+            'deficit': deficit,
+            'relative_deficit': numpy.where(flow > 0, deficit / flow, 0.0),
+            'drop': numpy.maximum(numpy.log10(current + 1) - numpy.log10(future + 1), 0),
+            'barrels': barrels,
+            'road': road,
+            'capacity': capacity,
+            'flow': flow,
+            'current': current,
+            'future': future
+        }
+        names.update((name, getattr(numpy, name)) for name in FORMULA_FUNCTIONS)
+        score = eval(code, {'__builtins__': {}}, names) * numpy.ones(len(flow))
+    return numpy.where(numpy.isfinite(score), score, -numpy.inf)
+
+
+# Positions of the k highest scores (more when there are ties at the k-th score), by partial sort.
+def top_positions(score, k):
+    candidates = numpy.flatnonzero(score > -numpy.inf)
+    if len(candidates) <= k:
+        return candidates
+    kth = score[candidates][numpy.argpartition(-score[candidates], k - 1)[k - 1]]
+    return candidates[score[candidates] >= kth]
+
+
+def rank_key(row):
+    return (-row['Score'], row['BarrierID'])
+
+
+# Merge candidate rows into a top list with a heap.
+def keep_top(best, rows, k):
+    return heapq.nsmallest(k, best + rows, key=rank_key)
+
+
+def write(filename, rows):
+    with open(filename, 'wb') as output_file:
+        csv_writer = csv.writer(output_file)
+        csv_writer.writerow(OUTPUT_COLUMNS)
+        for row in rows:
+            # repr keeps every digit of the scores, so merged rankings break ties the same way.
+            csv_writer.writerow([repr(float(row[name])) if name == 'Score' else row[name] for name in OUTPUT_COLUMNS])
+
+
+# Number the rows of the overall and per-county top lists and save them.
+def save(best, best_by_county, output_prefix):
+    overall = sorted(best, key=rank_key)
+    for number, row in enumerate(overall):
+        row['Rank'] = number + 1
+    by_county = []
+    for county in sorted(best_by_county):
+        for number, row in enumerate(sorted(best_by_county[county], key=rank_key)):
+            row = dict(row)
+            row['Rank'] = number + 1
+            by_county.append(row)
+    write(output_prefix + 'priority.csv', overall)
+    write(output_prefix + 'priority_by_county.csv', by_county)
+    return overall
+
+
+# Rank the crossings of a run.
+# Parameters:
+#   final_output_filename: model output csv (or .gz) from final_output.py.
+#   field_data_filename: the run's field data, for road names (and counties, if it has a County column).
+#   output_prefix: path and filename prefix for the outputs.
+#   k: length of the overall top list.
+#   k_per_county: length of the top list of each county.
+#   target: target storm return period (yr), one of TARGET_STORMS.
+#   formula: scoring formula (see above).
+#   county: county of the run, for field data without a County column.
+#   weights: road class weights (see ROAD_WEIGHTS), or None to weight all roads the same.
+# Returns:
+#   The overall top list (a list of row dictionaries, best first).
+def rank(final_output_filename, field_data_filename, output_prefix, k=100, k_per_county=20, target=25,
+         formula=DEFAULT_FORMULA, county='', weights=ROAD_WEIGHTS, chunk_rows=CHUNK_ROWS):
+    if target not in TARGET_STORMS:
+        print "ERROR: the final output has current flows for the " + ", ".join(str(years) for years in TARGET_STORMS) \
+            + " yr storms, not " + str(target) + " yr. Bailing out."
+        sys.exit(0)
+    code = compile_formula(formula)
+    dimensions, attributes = inventory_summary.load_attributes(field_data_filename, county)
+    names = ['BarrierID', str(target) + ' year flow (current)', 'Capacity (m^3/s)',
+             'Current Max Return Period (yr)', 'Future Max Return Period (yr)', 'Number of Culverts']
+    try:
+        output_file = inventory_summary.open_output(final_output_filename)
+    except IOError:
+        print "ERROR: Could not find file '" \
+            + final_output_filename \
+            + "'. Bailing out."
+        sys.exit(0)
+
+    best = []
+    best_by_county = {}
+    with output_file:
+        reader = csv.reader(output_file)
+        header = next(reader, [])
+        if any(name not in header for name in names):
+            print "ERROR: '" + final_output_filename + "' is missing some of the columns " + ", ".join(names) \
+                + ". Bailing out."
+            sys.exit(0)
+        columns = [header.index(name) for name in names]
+        while True:
+            block = [[row[column] for column in columns] for _, row in zip(range(chunk_rows), reader)]
+            if len(block) == 0:
+                break
+            barrier_ids = [row[0] for row in block]
+            values = numpy.array([row[1:] for row in block], dtype=float).reshape(-1, 5)
+            groups = [attributes.get(barrier_id) for barrier_id in barrier_ids]
+            counties = [group[dimensions.index('County')] if group else county for group in groups]
+            roads = [group[dimensions.index('Road')] if group and 'Road' in dimensions else '' for group in groups]
+            road = road_weights(roads, weights) if weights else numpy.ones(len(block))
+            score = scores(code, values[:, 0], values[:, 1], values[:, 2], values[:, 3], values[:, 4], road)
+
+            def rows(positions):
+                return [{'BarrierID': barrier_ids[position], 'County': counties[position], 'Road': roads[position],
+                         'Score': score[position],
+                         'Deficit (m^3/s)': max(values[position, 0] - values[position, 1], 0.0),
+                         'Target Flow (m^3/s)': values[position, 0], 'Capacity (m^3/s)': values[position, 1],
+                         'Current Max Return Period (yr)': int(values[position, 2]),
+                         'Future Max Return Period (yr)': int(values[position, 3]),
+                         'Number of Culverts': int(values[position, 4])} for position in positions]
+
+            best = keep_top(best, rows(top_positions(score, k)), k)
+            county_names, county_of = numpy.unique(numpy.array(counties, dtype=object).astype(str),
+                                                   return_inverse=True)
+            for index, name in enumerate(county_names):
+                members = numpy.flatnonzero(county_of == index)
+                best_by_county[name] = keep_top(best_by_county.get(name, []),
+                                                rows(members[top_positions(score[members], k_per_county)]),
+                                                k_per_county)
+    return save(best, best_by_county, output_prefix)
+
+
+# Merge the top lists of separate runs (e.g. statewide shards) into top lists of the combined inventory.
+def merge_files(output_prefixes, output_prefix, k=100, k_per_county=20):
+    best = []
+    best_by_county = {}
+    for prefix in output_prefixes:
+        for suffix in ['priority.csv', 'priority_by_county.csv']:
+            try:
+                with open(prefix + suffix, 'r') as priority_file:
+                    rows = list(csv.DictReader(priority_file))
+            except IOError:
+                print "ERROR: Could not find file '" \
+                    + prefix + suffix \
+                    + "'. Bailing out."
+                sys.exit(0)
+            for row in rows:
+                row['Score'] = float(row['Score'])
+            if suffix == 'priority.csv':
+                best = keep_top(best, rows, k)
+            else:
+                for row in rows:
+                    best_by_county.setdefault(row['County'], []).append(row)
+    for name in best_by_county:
+        best_by_county[name] = heapq.nsmallest(k_per_county, best_by_county[name], key=rank_key)
+    return save(best, best_by_county, output_prefix)
+
+
+if __name__ == '__main__':
+    print('Cornell Culvert Evaluation Model - replacement prioritization')
+    print('--------------------------------------------------------------\n')
+
+    FileNm = raw_input("Please enter your data file prefix, which should also be your data folder name: \n")
+    Target = int(raw_input("Target storm return period? (1, 2, 5, 10, 25 or 100 yr) \n"))
+    Formula = raw_input("Scoring formula (leave blank for " + DEFAULT_FORMULA + "): \n") or DEFAULT_FORMULA
+    Count = int(raw_input("How many crossings in the ranked list? \n"))
+    output_prefix = "../" + FileNm + "/" + FileNm + "_Model_Output/" + FileNm + "_"
+    rank(output_prefix + 'model_output.csv', "../" + FileNm + "/" + FileNm + '_field_data.csv', output_prefix,
+         Count, target=Target, formula=Formula, county=FileNm)
+    print "\nDone! The ranked crossings can be found here:\n" + output_prefix + 'priority.csv'
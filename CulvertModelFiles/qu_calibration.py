@@ -0,0 +1,252 @@
+# Calibration of the qu ("Peak multiplier") coefficients
+# October 2026
+#
+# This script will refit the runoffP qu coefficients, qu = (Const0 - Const1 * tc) / 8.64, from stream gauges, as was
+# done by hand for New York in 2019 (Archibald), so the model can be set up for other states:
+# a) flood quantiles for the 2 to 500 yr floods come from a csv, or are fit to USGS annual peak flow files
+#    (NWIS rdb format) with a log-Pearson type III distribution (method of moments on the log10 flows, station skew,
+#    Wilson-Hilferty frequency factors),
+# b) the SCS runoff depth of every gauge watershed for every storm is computed in one array operation, as in runoffP,
+# c) the qu each gauge needs is its flood quantile divided by runoff depth times area, and
+# d) Const0 and Const1 are fit for every return period at once by least squares of 8.64 qu on tc.
+# Confidence intervals come from bootstrap resamples of the gauges: each resample is a weight vector, so all
+# resamples are fit with a few matrix products, and batches of resamples are spread over worker processes.
+#
+# As in 2019, the 1 yr coefficients are taken from the 2 yr fit unless 1 yr flood quantiles are given.
+#
+# Inputs:  gauge watershed csv: Site, Area_sqkm, Tc_hr, CN, P1 ... P500 (24 hour precipitation in mm, as runoffP)
+#          flood quantile csv: Site, Q1 (optional), Q2 ... Q500 in m^3/s, OR annual peak flow rdb files
+# Outputs: qu coefficient table csv: Return_Period, Const0, Const1, confidence limits, gauges used and R2.
+#          Pass it as QuTable to Culvert_Eval.evaluate (qu_table in the other scripts) to use it in runs.
+
+import csv, sys, numpy, multiprocessing, loader
+
+RETURN_PERIODS = [1, 2, 5, 10, 25, 50, 100, 200, 500]
+# Standard normal quantiles of the non-exceedance probability 1 - 1/T for the 2 to 500 yr floods.
+NORMAL_QUANTILES = numpy.array([0.0, 0.8416212, 1.2815516, 1.7506861, 2.0537489, 2.3263479, 2.5758293, 2.8781617])
+CFS_TO_CMS = 0.0283168
+MIN_PEAKS = 10  # Shortest peak record fit (Bulletin 17)
+BOOTSTRAP_BATCH = 200
+
+
+# Read USGS annual peak flow files (NWIS rdb: tab separated, '#' comment lines, then a header and a format line).
+# Returns:
+#   A dictionary of site number -> numpy array of annual peaks in m^3/s.
+def load_peaks(peak_filenames):
+    peaks = {}
+    for peak_filename in peak_filenames:
+        try:
+            with open(peak_filename, 'r') as peak_file:
+                lines = [line.rstrip('\r\n') for line in peak_file if not line.startswith('#')]
+        except IOError:
+            print "ERROR: Could not find file '" \
+                + peak_filename \
+                + "'. Bailing out."
+            sys.exit(0)
+        if len(lines) < 2:
+            continue
+        header = lines[0].split('\t')
+        if 'site_no' not in header or 'peak_va' not in header:
+            print "ERROR: file '" + peak_filename + "' is not a USGS peak flow (rdb) file. Bailing out."
+            sys.exit(0)
+        site_column = header.index('site_no')
+        peak_column = header.index('peak_va')
+        for line in lines[2:]:  # Skip the format line
+            values = line.split('\t')
+            try:
+                peaks.setdefault(values[site_column], []).append(float(values[peak_column]) * CFS_TO_CMS)
+            except (ValueError, IndexError):
+                continue  # Missing peak
+    return dict((site, numpy.array(values)) for site, values in peaks.items())
+
+
+# Log-Pearson type III flood quantiles for the 2 to 500 yr floods.
+# Returns:
+#   numpy array of 8 quantiles (m^3/s), or None if the record is too short.
+def lp3_quantiles(annual_peaks):
+    annual_peaks = annual_peaks[annual_peaks > 0]
+    n = len(annual_peaks)
+    if n < MIN_PEAKS:
+        return None
+    logs = numpy.log10(annual_peaks)
+    mean = logs.mean()
+    deviation = logs.std(ddof=1)
+    skew = n * numpy.sum((logs - mean) ** 3) / ((n - 1) * (n - 2) * deviation ** 3) if deviation > 0 else 0.0
+    if abs(skew) < 1e-6:
+        K = NORMAL_QUANTILES
+    else:
+        K = 2 / skew * ((1 + skew * NORMAL_QUANTILES / 6 - skew ** 2 / 36) ** 3 - 1)
+    return 10 ** (mean + K * deviation)
+
+
+# Flood quantiles from a csv with Site and Q2 ... Q500 (Q1 optional) columns.
+# Returns:
+#   A dictionary of site -> numpy array of 9 quantiles (1 yr is NaN if not given).
+def load_quantiles(quantile_filename):
+    with open(quantile_filename, 'r') as quantile_file:
+        header = next(csv.reader(quantile_file), [])
+    years = [year for year in RETURN_PERIODS if year != 1 or 'Q1' in header]
+    signature = [{'name': 'Site', 'type': str}] + [{'name': 'Q' + str(year), 'type': float} for year in years]
+    quantiles = {}
+    for row in loader.load(quantile_filename, signature, 1, -1)['valid_rows']:
+        quantiles[row['Site']] = numpy.array([row.get('Q' + str(year), numpy.nan) for year in RETURN_PERIODS])
+    return quantiles
+
+
+# The qu each gauge needs for each storm, in runoffP units (m^3/s per km^2 per cm), and 8.64 * qu as fit.
+# Parameters:
+#   gauges: dictionary of arrays area, tc, CN and P (gauges x 9, mm).
+#   flood: array (gauges x 9) of flood quantiles (m^3/s).
+# Returns:
+#   Array (gauges x 9) of 8.64 qu, NaN where there is no runoff or flood quantile.
+def observed_qu(gauges, flood):
+    P = gauges['P'] / 10  # cm, as in runoffP
+    Storage = 0.1 * ((25400.0 / gauges['CN'][:, numpy.newaxis]) - 254.0)
+    Ia = 0.2 * Storage
+    Q = (numpy.maximum(P - Ia, 0) ** 2) / (P + (Storage - Ia))
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        qu = flood / (Q * gauges['area'][:, numpy.newaxis])
+        return numpy.where(numpy.isfinite(qu) & (qu > 0), 8.64 * qu, numpy.nan)
+
+
+# Weighted least squares of y = Const0 - Const1 * tc for every return period and every weight vector at once.
+# Parameters:
+#   tc: array (gauges) of times of concentration; y: array (gauges x 9) of 8.64 qu (NaN to leave out).
+#   weights: array (fits x gauges) of gauge weights (bootstrap counts, or ones).
+# Returns:
+#   Const0 and Const1 arrays (fits x 9).
+def fit(tc, y, weights):
+    known = numpy.isfinite(y)
+    y = numpy.where(known, y, 0.0)
+    x = tc[:, numpy.newaxis] * known
+    count = numpy.dot(weights, known.astype(float))
+    sum_x = numpy.dot(weights, x)
+    sum_y = numpy.dot(weights, y)
+    sum_xx = numpy.dot(weights, x * x)
+    sum_xy = numpy.dot(weights, x * y)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        slope = (count * sum_xy - sum_x * sum_y) / (count * sum_xx - sum_x ** 2)
+        intercept = (sum_y - slope * sum_x) / count
+    return intercept, -slope
+
+
+# Worker: fit a batch of bootstrap resamples of the gauges.
+def bootstrap_job(job):
+    tc, y, count, seed = job
+    random = numpy.random.RandomState(seed)
+    picks = random.randint(0, len(tc), size=(count, len(tc)))
+    weights = numpy.array([numpy.bincount(pick, minlength=len(tc)) for pick in picks], dtype=float)
+    return fit(tc, y, weights)
+
+
+# Bootstrap the fit, spread over worker processes.
+# Returns:
+#   Const0 and Const1 arrays (resamples x 9).
+def bootstrap(tc, y, resamples=2000, processes=None, seed=0):
+    jobs = [(tc, y, min(BOOTSTRAP_BATCH, resamples - start), seed + start)
+            for start in range(0, resamples, BOOTSTRAP_BATCH)]
+    if processes == 1 or len(jobs) == 1:
+        results = [bootstrap_job(job) for job in jobs]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(bootstrap_job, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    return numpy.vstack([result[0] for result in results]), numpy.vstack([result[1] for result in results])
+
+
+# Fit the qu coefficients and save the table.
+# Parameters:
+#   gauge_filename: gauge watershed csv.
+#   output_filename: qu coefficient table csv to write.
+#   quantile_filename: flood quantile csv, or
+#   peak_filenames: list of USGS annual peak flow rdb files (used when there is no quantile file).
+#   resamples: number of bootstrap resamples (0 for no confidence intervals).
+#   confidence: confidence level of the intervals.
+#   processes: number of worker processes.
+# Returns:
+#   A list of the table rows.
+def calibrate(gauge_filename, output_filename, quantile_filename='', peak_filenames=(), resamples=2000,
+              confidence=0.95, processes=None, seed=0):
+    signature = [{'name': 'Site', 'type': str}, {'name': 'Area_sqkm', 'type': float}, {'name': 'Tc_hr', 'type': float},
+                 {'name': 'CN', 'type': float}] + [{'name': 'P' + str(year), 'type': float} for year in RETURN_PERIODS]
+    rows = loader.load(gauge_filename, signature, 1, -1)['valid_rows']
+
+    if quantile_filename != '':
+        quantiles = load_quantiles(quantile_filename)
+    else:
+        quantiles = {}
+        for site, annual_peaks in load_peaks(peak_filenames).items():
+            fitted = lp3_quantiles(annual_peaks)
+            if fitted is None:
+                print "Gauge " + site + " has fewer than " + str(MIN_PEAKS) + " annual peaks, skipping it."
+            else:
+                quantiles[site] = numpy.append(numpy.nan, fitted)
+
+    # Gauges with a usable watershed and flood quantiles.
+    rows = [row for row in rows
+            if row['Site'] in quantiles and row['CN'] > 0 and row['Tc_hr'] > 0 and row['Area_sqkm'] > 0]
+    if len(rows) < 3:
+        print "ERROR: fewer than 3 gauges have both watershed values and flood quantiles. Bailing out."
+        sys.exit(0)
+    gauges = {
+        'area': numpy.array([row['Area_sqkm'] for row in rows]),
+        'tc': numpy.array([row['Tc_hr'] for row in rows]),
+        'CN': numpy.array([row['CN'] for row in rows]),
+        'P': numpy.array([[row['P' + str(year)] for year in RETURN_PERIODS] for row in rows])
+    }
+    flood = numpy.array([quantiles[row['Site']] for row in rows])
+    y = observed_qu(gauges, flood)
+
+    # Without 1 yr floods, the 1 yr fit is the 2 yr fit (as in 2019).
+    if numpy.all(numpy.isnan(y[:, 0])):
+        y[:, 0] = y[:, 1]
+    tc = gauges['tc']
+    Const0, Const1 = fit(tc, y, numpy.ones((1, len(tc))))
+    Const0, Const1 = Const0[0], Const1[0]
+
+    # Share of the variance of 8.64 qu explained by tc.
+    predicted = Const0 - Const1 * tc[:, numpy.newaxis]
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        residual = numpy.nansum((y - predicted) ** 2, axis=0)
+        total = numpy.nansum((y - numpy.nanmean(y, axis=0)) ** 2, axis=0)
+        R2 = 1 - residual / total
+    gauges_used = numpy.sum(numpy.isfinite(y), axis=0)
+
+    low = high = numpy.full((2, len(RETURN_PERIODS)), numpy.nan)
+    if resamples > 0:
+        sample0, sample1 = bootstrap(tc, y, resamples, processes, seed)
+        tail = 100 * (1 - confidence) / 2
+        with numpy.errstate(invalid='ignore'):
+            low = numpy.array([numpy.nanpercentile(sample0, tail, axis=0), numpy.nanpercentile(sample1, tail, axis=0)])
+            high = numpy.array([numpy.nanpercentile(sample0, 100 - tail, axis=0),
+                                numpy.nanpercentile(sample1, 100 - tail, axis=0)])
+
+    table = []
+    for index, year in enumerate(RETURN_PERIODS):
+        table.append([year, Const0[index], Const1[index], low[0][index], high[0][index], low[1][index], high[1][index],
+                      gauges_used[index], R2[index]])
+    with open(output_filename, 'wb') as output_file:
+        csv_writer = csv.writer(output_file)
+        csv_writer.writerow(['Return_Period', 'Const0', 'Const1', 'Const0_Low', 'Const0_High', 'Const1_Low',
+                             'Const1_High', 'Gauges', 'R2'])
+        for row in table:
+            csv_writer.writerow(row)
+    return table
+
+
+if __name__ == '__main__':
+    print('Cornell Culvert Evaluation Model - qu calibration')
+    print('-------------------------------------------------\n')
+
+    GaugeFile = raw_input("Path to the gauge watershed csv (Site, Area_sqkm, Tc_hr, CN, P1 ... P500): \n")
+    QuantileFile = raw_input("Path to the flood quantile csv (Site, Q2 ... Q500), or leave blank to fit USGS peak files: \n")
+    PeakFiles = []
+    if QuantileFile == '':
+        PeakFiles = raw_input("Paths to the USGS annual peak flow (rdb) files, separated by commas: \n").split(',')
+    OutputFile = raw_input("Path of the qu coefficient table to write (e.g. qu_coefficients.csv): \n")
+    for row in calibrate(GaugeFile, OutputFile, QuantileFile, [name.strip() for name in PeakFiles]):
+        print " * " + str(row[0]) + " yr: Const0 = %.3f, Const1 = %.3f" % (row[1], row[2])
+    print "\nDone! The qu table can be found here:\n" + OutputFile
@@ -0,0 +1,169 @@
+# Minimal ESRI float grid raster reader and writer
+# October 2026
+#
+# This script will open single band rasters saved as ESRI float grids (a .flt file of 32 bit floats and a .hdr text
+# header, as written by ArcGIS "Raster To Float") without needing ArcGIS. The data is memory mapped, so a raster is
+# never read into memory as a whole: model stages read it one window (tile) at a time, and several worker
+# processes can read different tiles of the same file at once.
+#
+# Header keys: ncols, nrows, xllcorner (or xllcenter), yllcorner (or yllcenter), cellsize, NODATA_value and
+# byteorder (LSBFIRST or MSBFIRST). Row 0 is the top (north) row, as in the file.
+#
+# Coordinates are in the raster's own projection (UTM meters for the model's DEM, curve number and slope layers).
+#
+# Example:
+#   dem = raster.open_raster('../ALB/GIS_files/DEMs/dem.flt')
+#   for window in raster.windows(dem):
+#       elevation = raster.read_window(dem, window)   # NaN where there is no data
+
+import os, sys, numpy
+
+TILE_SIZE = 1024  # Rows and columns per window (4 MB of float32)
+
+
+# Header filename of a raster (.flt or .hdr given).
+def header_filename(filename):
+    return os.path.splitext(filename)[0] + '.hdr'
+
+
+# Read a raster header.
+# Returns:
+#   A dictionary with ncols, nrows (int), xllcorner, yllcorner, cellsize, nodata (float) and byteorder.
+def read_header(filename):
+    values = {}
+    try:
+        with open(header_filename(filename), 'r') as header_file:
+            for line in header_file:
+                parts = line.split()
+                if len(parts) >= 2:
+                    values[parts[0].lower()] = parts[1]
+    except IOError:
+        print "ERROR: Could not find raster header '" \
+            + header_filename(filename) \
+            + "'. Bailing out."
+        sys.exit(0)
+    missing = [key for key in ['ncols', 'nrows', 'cellsize'] if key not in values]
+    if len(missing) > 0:
+        print "ERROR: raster header '" + header_filename(filename) + "' is missing " + ", ".join(missing) \
+            + ". Bailing out."
+        sys.exit(0)
+
+    header = {
+        'ncols': int(values['ncols']),
+        'nrows': int(values['nrows']),
+        'cellsize': float(values['cellsize']),
+        'nodata': float(values.get('nodata_value', -9999)),
+        'byteorder': values.get('byteorder', 'LSBFIRST').upper()
+    }
+    # Cell centers are turned into the lower left corner.
+    if 'xllcenter' in values:
+        header['xllcorner'] = float(values['xllcenter']) - header['cellsize'] / 2
+    else:
+        header['xllcorner'] = float(values.get('xllcorner', 0))
+    if 'yllcenter' in values:
+        header['yllcorner'] = float(values['yllcenter']) - header['cellsize'] / 2
+    else:
+        header['yllcorner'] = float(values.get('yllcorner', 0))
+    return header
+
+
+def write_header(filename, header):
+    with open(header_filename(filename), 'w') as header_file:
+        header_file.write('ncols         ' + str(header['ncols']) + '\n')
+        header_file.write('nrows         ' + str(header['nrows']) + '\n')
+        header_file.write('xllcorner     ' + repr(header['xllcorner']) + '\n')
+        header_file.write('yllcorner     ' + repr(header['yllcorner']) + '\n')
+        header_file.write('cellsize      ' + repr(header['cellsize']) + '\n')
+        header_file.write('NODATA_value  ' + repr(header['nodata']) + '\n')
+        header_file.write('byteorder     ' + header['byteorder'] + '\n')
+
+
+def data_type(header):
+    return numpy.dtype('>f4' if header['byteorder'] == 'MSBFIRST' else '<f4')
+
+
+# Open a raster.
+# Parameters:
+#   filename: path of the .flt (or .hdr) file.
+#   mode: 'r' to read, 'r+' to read and write.
+# Returns:
+#   A dictionary of the header values, plus 'filename' and 'data' (the memory-mapped nrows x ncols array).
+def open_raster(filename, mode='r'):
+    raster = read_header(filename)
+    flt_filename = os.path.splitext(filename)[0] + '.flt'
+    if not os.path.exists(flt_filename):
+        print "ERROR: Could not find raster '" \
+            + flt_filename \
+            + "'. Bailing out."
+        sys.exit(0)
+    raster['filename'] = flt_filename
+    raster['data'] = numpy.memmap(flt_filename, dtype=data_type(raster), mode=mode,
+                                  shape=(raster['nrows'], raster['ncols']))
+    return raster
+
+
+# Create a new raster on disk with the same grid as another, filled with no data.
+# Returns:
+#   The opened raster (mode 'r+').
+def create(filename, like, nodata=-9999.0):
+    header = dict((key, like[key]) for key in ['ncols', 'nrows', 'xllcorner', 'yllcorner', 'cellsize'])
+    header['nodata'] = nodata
+    header['byteorder'] = 'LSBFIRST'
+    flt_filename = os.path.splitext(filename)[0] + '.flt'
+    write_header(flt_filename, header)
+    data = numpy.memmap(flt_filename, dtype='<f4', mode='w+', shape=(header['nrows'], header['ncols']))
+    for row0, row1, col0, col1 in windows(header):
+        data[row0:row1, col0:col1] = nodata
+    data.flush()
+    del data
+    return open_raster(flt_filename, 'r+')
+
+
+# Check that rasters share one grid (same size, origin and cell size).
+def check_aligned(rasters):
+    first = rasters[0]
+    for raster in rasters[1:]:
+        for key in ['ncols', 'nrows', 'cellsize']:
+            if raster[key] != first[key]:
+                print "ERROR: raster '" + raster['filename'] + "' is not on the same grid as '" \
+                    + first['filename'] + "' (" + key + " differs). Bailing out."
+                sys.exit(0)
+        for key in ['xllcorner', 'yllcorner']:
+            if abs(raster[key] - first[key]) > 0.01 * first['cellsize']:
+                print "ERROR: raster '" + raster['filename'] + "' is not on the same grid as '" \
+                    + first['filename'] + "' (" + key + " differs). Bailing out."
+                sys.exit(0)
+
+
+# Split a raster into windows.
+# Returns:
+#   A list of (row0, row1, col0, col1) windows covering the raster, row by row.
+def windows(raster, tile_size=TILE_SIZE):
+    return [(row0, min(row0 + tile_size, raster['nrows']), col0, min(col0 + tile_size, raster['ncols']))
+            for row0 in range(0, raster['nrows'], tile_size)
+            for col0 in range(0, raster['ncols'], tile_size)]
+
+
+# Read one window into memory as float64, with NaN where there is no data.
+def read_window(raster, window):
+    row0, row1, col0, col1 = window
+    values = numpy.array(raster['data'][row0:row1, col0:col1], dtype=float)
+    values[values == raster['nodata']] = numpy.nan
+    return values
+
+
+# Row and column of the cells containing map coordinates x, y (arrays). Points off the raster get -1.
+def cell_of(raster, x, y):
+    top = raster['yllcorner'] + raster['nrows'] * raster['cellsize']
+    row = numpy.floor((top - numpy.asarray(y, dtype=float)) / raster['cellsize']).astype(int)
+    col = numpy.floor((numpy.asarray(x, dtype=float) - raster['xllcorner']) / raster['cellsize']).astype(int)
+    off = (row < 0) | (row >= raster['nrows']) | (col < 0) | (col >= raster['ncols'])
+    return numpy.where(off, -1, row), numpy.where(off, -1, col)
+
+
+# Map coordinates of cell centers.
+def cell_center(raster, row, col):
+    top = raster['yllcorner'] + raster['nrows'] * raster['cellsize']
+    x = raster['xllcorner'] + (numpy.asarray(col) + 0.5) * raster['cellsize']
+    y = top - (numpy.asarray(row) + 0.5) * raster['cellsize']
+    return x, y
@@ -0,0 +1,138 @@
+# Headwater-discharge rating curves
+# October 2026
+#
+# This script will precompute, for every culvert (barrel) and crossing, the discharge it passes at each
+# headwater on a grid, using the same capacity equations and geometry as capacity.py. What-if questions
+# about allowable headwater (road overtopping, freeboard rules) then become table lookups instead of
+# reruns of capacity_prep and capacity with edited HW values.
+#
+# Headwater is the head above the culvert invert in meters, as HW_m in the culvert geometry file
+# (the field HW, road to top of culvert, plus the culvert height D). Each crossing has its own grid, from the invert
+# to the highest HW_m (or culvert height D, if higher) of its culverts: above the road the water overtops the
+# crossing instead of going through the culverts, so the table stops there.
+#
+# Inputs:  culvert geometry file from capacity_prep (culv_geom.csv).
+# Outputs: rating table file (numpy .npz, float32 discharges): the headwater grid of every crossing, the crossing
+#          BarrierIDs, and the discharge (m^3/s) at every grid headwater for every crossing and barrel.
+#
+# Example:
+#   rating.build(output_prefix + 'culv_geom.csv', output_prefix + 'rating.npz')
+#   table = rating.load(output_prefix + 'rating.npz')
+#   rating.discharge(table, 3.0)                  # every crossing at 3 m headwater
+#   rating.headwater(table, [2.5, 4.0], ['1ALB', '2ALB'])   # headwater needed to pass 2.5 and 4 m^3/s
+
+import numpy, records, capacity
+
+DEFAULT_POINTS = 121  # Headwaters on each crossing's grid, from the invert to the top of the road fill
+
+
+# Build and save the rating table.
+# Parameters:
+#   culvert_geometry_filename: culvert geometry file from capacity_prep.
+#   rating_filename: .npz file to save the table to.
+#   points: number of evenly spaced headwaters on each crossing's grid.
+#   control: 'inlet' for inlet control, 'both' for the lower of inlet and outlet control (as in capacity.py).
+def build(culvert_geometry_filename, rating_filename, points=DEFAULT_POINTS, control='inlet'):
+    signature = capacity.GEOMETRY_SIGNATURE
+    if control == 'both':
+        signature = signature + capacity.OUTLET_SIGNATURE
+    culverts = records.load(culvert_geometry_filename, signature, 1, -1)['table']
+
+    starts = capacity.crossing_starts(culverts.column('Flags'))
+    barrel_crossing = numpy.repeat(numpy.arange(len(starts)), numpy.diff(numpy.append(starts, len(culverts))))
+    top = numpy.maximum(culverts.column('HW_m'), culverts.column('D_m'))
+    crossing_top = numpy.maximum.reduceat(top, starts) if len(starts) > 0 else numpy.zeros(0)
+    crossing_hw = crossing_top[:, numpy.newaxis] * numpy.linspace(0.0, 1.0, points)
+
+    # Capacity at every headwater (rows) of every barrel (columns, on its crossing's grid), in one array operation.
+    HW = crossing_hw[barrel_crossing].T
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        Q = capacity.inlet_capacity(culverts, HW)
+        if control == 'both':
+            Q = numpy.fmin(Q, capacity.outlet_capacity(culverts, HW))
+    # Where the submerged inlet equation has no solution (headwater too low), the barrel is taken to pass nothing,
+    # and discharge is kept from decreasing as the headwater rises.
+    Q = numpy.where(numpy.isnan(Q), 0.0, Q)
+    Q = numpy.maximum.accumulate(numpy.maximum(Q, 0), axis=0)
+    crossing_Q = numpy.add.reduceat(Q, starts, axis=1) if len(starts) > 0 else numpy.zeros((points, 0))
+    barrier_ids = culverts.strings('BarrierID')
+
+    numpy.savez(rating_filename,
+                hw=crossing_hw,
+                barrier_id=numpy.array([barrier_ids[i] for i in starts]),
+                crossing_q=crossing_Q.T.astype(numpy.float32),
+                barrel_q=Q.T.astype(numpy.float32),
+                barrel_crossing=barrel_crossing.astype(numpy.int32))
+
+
+# Load a rating table.
+# Returns:
+#   A dictionary with 'hw' (crossings x grid), 'barrier_id' (list), 'crossing_q' (crossings x grid), 'barrel_q' (barrels x grid),
+#   'barrel_crossing' (crossing row of each barrel) and 'index' (BarrierID -> crossing row).
+def load(rating_filename):
+    with numpy.load(rating_filename) as data:
+        table = dict((name, data[name]) for name in data.files)
+    table['barrier_id'] = [str(barrier_id) for barrier_id in table['barrier_id']]
+    if table['hw'].ndim == 1:
+        # Tables built before the grids were per crossing share one grid.
+        table['hw'] = numpy.tile(table['hw'], (len(table['barrier_id']), 1))
+    table['index'] = dict((barrier_id, row) for row, barrier_id in enumerate(table['barrier_id']))
+    return table
+
+
+# Crossing rows for a list of BarrierIDs (all crossings if None).
+def rows(table, barrier_ids=None):
+    if barrier_ids is None:
+        return numpy.arange(len(table['barrier_id']))
+    return numpy.array([table['index'][barrier_id] for barrier_id in barrier_ids], dtype=int)
+
+
+# Position (0 to 1) of a value between columns upper - 1 and upper of each row of a table.
+def fraction_between(table, upper, value):
+    number = numpy.arange(len(table))
+    below = table[number, upper - 1]
+    above = table[number, upper]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        fraction = numpy.where(above > below, (value - below) / (above - below), 0.0)
+    return numpy.clip(fraction, 0, 1)
+
+
+# Discharge each crossing passes at a given headwater (linear interpolation on the crossing's grid).
+# Parameters:
+#   table: dictionary from load.
+#   hw: headwater (m above the invert), one value for all crossings or one per crossing.
+#   barrier_ids: crossings to query (all if None).
+# Returns:
+#   numpy array of discharges (m^3/s), NaN where the headwater is below the invert or above the top of the
+#   crossing's grid (the road).
+def discharge(table, hw, barrier_ids=None):
+    selected = rows(table, barrier_ids)
+    grid = table['hw'][selected]
+    hw = numpy.broadcast_to(numpy.asarray(hw, dtype=float), selected.shape)
+    Q = table['crossing_q'][selected]
+    number = numpy.arange(len(selected))
+    with numpy.errstate(invalid='ignore'):
+        upper = numpy.clip(numpy.sum(grid < hw[:, numpy.newaxis], axis=1), 1, grid.shape[1] - 1)
+        fraction = fraction_between(grid, upper, hw)
+        result = Q[number, upper - 1] + fraction * (Q[number, upper] - Q[number, upper - 1])
+        return numpy.where((hw >= grid[:, 0]) & (hw <= grid[:, -1]), result, numpy.nan)
+
+
+# Headwater each crossing needs to pass a given discharge (inverse lookup on the rating curve).
+# Parameters:
+#   table: dictionary from load.
+#   flow: discharge (m^3/s), one value for all crossings or one per crossing.
+#   barrier_ids: crossings to query (all if None).
+# Returns:
+#   numpy array of headwaters (m above the invert), NaN where the flow is more than the crossing passes
+#   at the top of its grid (the road).
+def headwater(table, flow, barrier_ids=None):
+    selected = rows(table, barrier_ids)
+    grid = table['hw'][selected]
+    flow = numpy.broadcast_to(numpy.asarray(flow, dtype=float), selected.shape)
+    Q = table['crossing_q'][selected]
+    upper = numpy.clip(numpy.sum(Q < flow[:, numpy.newaxis], axis=1), 1, grid.shape[1] - 1)  # Curves never decrease
+    fraction = fraction_between(Q, upper, flow)
+    number = numpy.arange(len(selected))
+    result = grid[number, upper - 1] + fraction * (grid[number, upper] - grid[number, upper - 1])
+    return numpy.where(flow > Q[:, -1], numpy.nan, result)
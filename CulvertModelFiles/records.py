@@ -0,0 +1,217 @@
+# Compact culvert record storage
+# October 2026
+#
+# The model stages keep culverts as one dictionary per row, which repeats every header name,
+# every 'Round'/'Concrete'/'Projecting' and every comment string on each row. This script loads
+# the same files (same signatures and validation as loader.py) into a compact table instead:
+# a) numeric columns are stored together in one numpy structured array,
+# b) shape, material, inlet type and crossing type are stored as small integer codes, and
+# c) all other text (BarrierIDs, comments, notes) goes into a string pool, so repeated
+#    comments are only stored once and each row just holds an integer.
+#
+# For a typical culv_geom row this is ~100 bytes instead of ~1-2 kB of dictionary, floats and strings.
+#
+# Rows can still be read like loader.py rows (table.row(i)['HW_m']), or a whole column at once
+# (table.column('HW_m')) for vectorized calculations.
+
+import csv, sys, numpy, loader
+
+# Known values of the categorical fields. Values not listed here are added to the end as they are found.
+CATEGORIES = {
+    'In_Shape': ['Round', 'Elliptical', 'Pipe Arch', 'Box', 'Arch'],
+    'Out_Shape': ['Round', 'Elliptical', 'Pipe Arch', 'Box', 'Arch'],
+    'Culv_Mat': ['Concrete', 'Stone', 'Plastic', 'Metal', 'Wood', 'Combination'],
+    'In_Type': ['Projecting', 'Headwall', 'Mitered to Slope', 'Wingwall', 'Wingwall and Headwall'],
+    'Crossing_Type': ['Culvert', 'Bridge', 'Multiple Culvert', 'Ford', 'Dam'],
+}
+
+INITIAL_ROWS = 1024
+
+
+# Stores each distinct string once and hands out integer ids for them.
+class StringPool(object):
+    __slots__ = ('strings', 'ids')
+
+    def __init__(self, strings=()):
+        self.strings = []
+        self.ids = {}
+        for string in strings:
+            self.add(string)
+
+    def add(self, string):
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(intern(string))
+            self.ids[string] = string_id
+        return string_id
+
+    def get(self, string_id):
+        return self.strings[string_id]
+
+    def decode(self, string_ids):
+        return [self.strings[string_id] for string_id in string_ids]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+# Read-only view of one row of a CulvertTable, used like a loader.py row dictionary.
+class Record(object):
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __getitem__(self, name):
+        return self.table.value(name, self.index)
+
+    def keys(self):
+        return self.table.names
+
+
+# Column-oriented table of culvert (or watershed) rows.
+class CulvertTable(object):
+    __slots__ = ('names', 'types', 'data', 'pools', 'size')
+
+    # Parameters:
+    #   signature: list of {'name', 'type'} dictionaries, as used by loader.py.
+    #   capacity: number of rows to allocate room for (the table grows as needed).
+    def __init__(self, signature, capacity=INITIAL_ROWS):
+        self.names = [header['name'] for header in signature]
+        self.types = dict((header['name'], header['type']) for header in signature)
+        self.pools = {}
+        dtype = []
+        for header in signature:
+            name = header['name']
+            if header['type'] == float:
+                dtype.append((name, 'f8'))
+            elif header['type'] == int:
+                dtype.append((name, 'i4'))
+            elif name in CATEGORIES:
+                dtype.append((name, 'i2'))
+                self.pools[name] = StringPool(CATEGORIES[name])
+            else:
+                dtype.append((name, 'i4'))
+                self.pools[name] = StringPool()
+        self.data = numpy.zeros(max(capacity, 1), dtype=dtype)
+        self.size = 0
+
+    # Add one row of already parsed values (a list in signature order).
+    def append(self, values):
+        if self.size == len(self.data):
+            grown = numpy.zeros(2 * len(self.data), dtype=self.data.dtype)
+            grown[:self.size] = self.data
+            self.data = grown
+        row = self.data[self.size]
+        for name, value in zip(self.names, values):
+            pool = self.pools.get(name)
+            row[name] = value if pool is None else pool.add(value)
+        self.size += 1
+
+    def __len__(self):
+        return self.size
+
+    # Whole column as a numpy array (numeric fields) or category/pool ids (text fields).
+    def column(self, name):
+        return self.data[name][:self.size]
+
+    # Whole text column decoded back to strings.
+    def strings(self, name):
+        return self.pools[name].decode(self.column(name))
+
+    def value(self, name, index):
+        value = self.data[name][index]
+        pool = self.pools.get(name)
+        if pool is not None:
+            return pool.get(value)
+        return self.types[name](value)
+
+    def row(self, index):
+        return Record(self, index)
+
+    def rows(self):
+        return [Record(self, index) for index in range(self.size)]
+
+    # Bytes used by the table (array plus pooled strings).
+    def nbytes(self):
+        pooled = sum(sys.getsizeof(string) for pool in self.pools.values() for string in pool.strings)
+        return self.data[:self.size].nbytes + pooled
+
+
+# Load and validate a file into a CulvertTable.
+# Parameters and validation are the same as loader.load.
+# Returns:
+#   A dictionary with 'table' (the CulvertTable of valid rows) and 'invalid_rows' (as in loader.load).
+def load(filename, required_headers, start_row, max_rows):
+    try:
+        with open(filename, 'r') as csv_file:
+            input_table = csv.reader(csv_file)
+
+            for i in range(1, start_row):
+                next(input_table)
+            header_row = next(input_table)
+
+            header_index = {}
+            missing_headers = []
+            for header in required_headers:
+                try:
+                    header_index[header['name']] = header_row.index(header['name'])
+                except ValueError:
+                    missing_headers.append(header['name'])
+
+            if len(missing_headers) > 0:
+                print "ERROR: file '" \
+                    + filename \
+                    + "' was missing the following required headers on row " \
+                    + str(start_row) \
+                    + ": " \
+                    + ", ".join(missing_headers) \
+                    + ". Bailing out."
+                sys.exit(0)
+
+            table = CulvertTable(required_headers)
+            invalid_rows = []
+            columns = [(header_index[header['name']], header['name'], header['type']) for header in required_headers]
+            row_number = start_row + 1
+            for row in input_table:
+                if max_rows != -1 and row_number - start_row > max_rows:
+                    break
+
+                values = []
+                for index, name, parse in columns:
+                    if index >= len(row):
+                        invalid_rows.append({
+                            "row_number": row_number,
+                            "row": row,
+                            "reason_invalid": "it did not have enough columns to reach header " \
+                                + name + " in column " + loader.column_string(index + 1) + "."
+                        })
+                        break
+                    try:
+                        values.append(parse(row[index]))
+                    except ValueError:
+                        invalid_rows.append({
+                            "row_number": row_number,
+                            "row": row,
+                            "reason_invalid": "in row " + str(row_number) \
+                                + ", column " + loader.column_string(index + 1) \
+                                + " (" + name + ") of file '" + filename \
+                                + "', the value '" + row[index] \
+                                + "' could not be parsed to " + str(parse) + "."
+                        })
+                        break
+                else:
+                    table.append(values)
+                row_number += 1
+
+            return {
+                "table": table,
+                "invalid_rows": invalid_rows
+            }
+    except IOError:
+        print "ERROR: Could not find file '" \
+            + filename \
+            + "'. Bailing out."
+        sys.exit(0)
@@ -0,0 +1,168 @@
+# StreamStats region assignment
+# October 2026
+#
+# This script will assign each culvert the NY StreamStats region it falls in
+# (Lumia et al. 2006, pg 7) by point-in-polygon against a local region polygon shapefile,
+# so counties that span more than one region get the right StreamStats comparison in runoffP.
+#
+# Polygons are first prefiltered by bounding box. The edges of each polygon are then binned
+# into horizontal bands, so each culvert is only tested against the edges that cross its latitude
+# (even-odd ray casting, done as one array operation per band).
+#
+# Inputs: field data csv with BarrierID, NAACC_ID, Lat, Long (e.g. ALB_field_data.csv)
+#         region polygon shapefile in geographic coordinates (GCS NAD83, same as the NAACC Lat/Long)
+#         with an integer region attribute
+#
+# Outputs: csv file with BarrierID, NAACC_ID, Lat, Long and Region for each culvert.
+#          Region is 0 for culverts outside every polygon (runoffP then skips the StreamStats estimate).
+
+import numpy, csv, loader, shapefiles
+
+MAX_TEST_CELLS = 4000000  # Largest points x edges block tested at once, bounds memory per band
+
+
+# Load the region polygons and build their edge band index.
+# Parameters:
+#   region_filename: the .shp file of region polygons.
+#   region_field: name of the attribute holding the region number.
+#   num_bands: number of horizontal bands each polygon's edges are binned into.
+#   field_type: type the attribute is converted to (int for region numbers, str for e.g. watershed BarrierIDs).
+# Returns:
+#   A list of dictionaries (one per polygon) with the region number, bounding box and band index.
+def load_regions(region_filename, region_field='Region', num_bands=256, field_type=int):
+    regions = []
+    for shape, record in shapefiles.read(region_filename):
+        if shape['type'] not in shapefiles.POLYGON_TYPES:
+            continue
+
+        # Every ring becomes a list of edges; holes are handled by the even-odd rule.
+        x0 = numpy.concatenate([part[:-1, 0] for part in shape['parts']])
+        y0 = numpy.concatenate([part[:-1, 1] for part in shape['parts']])
+        x1 = numpy.concatenate([part[1:, 0] for part in shape['parts']])
+        y1 = numpy.concatenate([part[1:, 1] for part in shape['parts']])
+
+        xmin, ymin, xmax, ymax = shape['bbox']
+        band_height = (ymax - ymin) / num_bands
+        if band_height <= 0:
+            continue  # Degenerate polygon
+
+        # Each edge goes in every band its y range touches (compressed row storage: band_start, band_edges).
+        first_band = numpy.clip(((numpy.minimum(y0, y1) - ymin) / band_height).astype(int), 0, num_bands - 1)
+        last_band = numpy.clip(((numpy.maximum(y0, y1) - ymin) / band_height).astype(int), 0, num_bands - 1)
+        bands_per_edge = last_band - first_band + 1
+        edge_index = numpy.repeat(numpy.arange(len(x0)), bands_per_edge)
+        within_edge = numpy.arange(len(edge_index)) - numpy.repeat(numpy.cumsum(bands_per_edge) - bands_per_edge,
+                                                                    bands_per_edge)
+        band_of_entry = first_band[edge_index] + within_edge
+        order = numpy.argsort(band_of_entry, kind='mergesort')
+        band_start = numpy.concatenate([[0], numpy.cumsum(numpy.bincount(band_of_entry, minlength=num_bands))])
+
+        regions.append({
+            'region': field_type(record[region_field]),
+            'bbox': shape['bbox'],
+            'band_height': band_height,
+            'num_bands': num_bands,
+            'band_start': band_start,
+            'band_edges': edge_index[order],
+            'x0': x0, 'y0': y0, 'x1': x1, 'y1': y1
+        })
+    return regions
+
+
+# Find which points fall inside one region polygon.
+# Parameters:
+#   x, y: numpy arrays of point coordinates (Long, Lat).
+#   region: one polygon dictionary from load_regions.
+# Returns:
+#   A boolean numpy array, True where the point is inside the polygon.
+def points_inside(x, y, region):
+    inside = numpy.zeros(len(x), dtype=bool)
+    xmin, ymin, xmax, ymax = region['bbox']
+    candidates = numpy.nonzero((x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax))[0]
+    if len(candidates) == 0:
+        return inside
+
+    point_band = numpy.clip(((y[candidates] - ymin) / region['band_height']).astype(int), 0, region['num_bands'] - 1)
+    order = numpy.argsort(point_band, kind='mergesort')
+    candidates = candidates[order]
+    point_band = point_band[order]
+    band_breaks = numpy.searchsorted(point_band, numpy.arange(region['num_bands'] + 1))
+
+    for band in numpy.unique(point_band):
+        edges = region['band_edges'][region['band_start'][band]:region['band_start'][band + 1]]
+        if len(edges) == 0:
+            continue
+        ex0 = region['x0'][edges]
+        ey0 = region['y0'][edges]
+        ex1 = region['x1'][edges]
+        ey1 = region['y1'][edges]
+
+        band_points = candidates[band_breaks[band]:band_breaks[band + 1]]
+        step = max(1, MAX_TEST_CELLS // len(edges))
+        for start in range(0, len(band_points), step):
+            chunk = band_points[start:start + step]
+            px = x[chunk][:, numpy.newaxis]
+            py = y[chunk][:, numpy.newaxis]
+            # Count crossings of a ray running east from each point.
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                x_cross = ex0 + (py - ey0) * (ex1 - ex0) / (ey1 - ey0)
+            crosses = ((ey0 > py) != (ey1 > py)) & (px < x_cross)
+            inside[chunk] = (numpy.sum(crosses, axis=1) % 2) == 1
+    return inside
+
+
+# Classify points by region.
+# Parameters:
+#   lat, lon: numpy arrays of culvert coordinates.
+#   regions: list from load_regions.
+# Returns:
+#   An integer numpy array of region numbers, 0 where a point is in no region.
+#   If polygons overlap, the first polygon in the file wins.
+def classify(lat, lon, regions):
+    x = numpy.asarray(lon, dtype=float)
+    y = numpy.asarray(lat, dtype=float)
+    result = numpy.zeros(len(x), dtype=int)
+    unassigned = numpy.ones(len(x), dtype=bool)
+    for region in regions:
+        remaining = numpy.nonzero(unassigned)[0]
+        if len(remaining) == 0:
+            break
+        hit = remaining[points_inside(x[remaining], y[remaining], region)]
+        result[hit] = region['region']
+        unassigned[hit] = False
+    return result
+
+
+def assign(field_data_input_filename, region_filename, output_filename, region_field='Region'):
+
+    # Signature for incoming field data (only the columns needed to place each culvert).
+    field_data_signature = [
+        {'name': 'BarrierID', 'type': str},
+        {'name': 'NAACC_ID', 'type': int},
+        {'name': 'Lat', 'type': float},
+        {'name': 'Long', 'type': float}
+    ]
+
+    field_data = loader.load(field_data_input_filename, field_data_signature, 1, -1, cache=True)
+    valid_rows = field_data['valid_rows']
+
+    regions = load_regions(region_filename, region_field)
+    lat = numpy.array([row['Lat'] for row in valid_rows])
+    lon = numpy.array([row['Long'] for row in valid_rows])
+    region_numbers = classify(lat, lon, regions)
+
+    num_outside = numpy.sum(region_numbers == 0)
+    if num_outside > 0:
+        print "* Note: " \
+            + str(num_outside) \
+            + " culverts did not fall inside any StreamStats region polygon. Their Region is set to 0."
+
+    with open(output_filename, 'wb') as output_file:
+        csv_writer = csv.writer(output_file)
+
+        # Header
+        csv_writer.writerow(['BarrierID', 'NAACC_ID', 'Lat', 'Long', 'Region'])
+
+        # Each row.
+        for row, region_number in zip(valid_rows, region_numbers):
+            csv_writer.writerow([row['BarrierID'], row['NAACC_ID'], row['Lat'], row['Long'], region_number])
@@ -0,0 +1,185 @@
+# Run-to-run diff of model outputs
+# October 2026
+#
+# This script will compare two model_output files (e.g. before and after new qu coefficients or precipitation)
+# and report what moved: changed return periods, capacity and peak flow deltas, and culverts added or removed.
+#
+# The first file is read once into a hash table keyed on NAACC_ID that keeps only the compared numbers
+# (a small tuple per culvert, not the whole row). The second file is then streamed past it row by row, and
+# differences are written out as they are found, so memory does not grow with row width or with the
+# size of the diff.
+#
+# Outputs: diff csv with one row per changed, added or removed culvert, and a summary csv of histograms:
+#          return period steps moved (current and future) and relative changes in capacity and 100 yr flow.
+
+import csv, sys, numpy
+
+RETURN_PERIODS = [0, 1, 2, 5, 10, 25, 50, 100, 200, 500]
+CURRENT_RETURN = 'Current Max Return Period (yr)'
+FUTURE_RETURN = 'Future Max Return Period (yr)'
+CAPACITY = 'Capacity (m^3/s)'
+FLOWS = ['1 year flow (current)', '2 year flow (current)', '5 year flow (current)', '10 year flow (current)',
+         '25 year flow (current)', '100 year flow (current)']
+COMPARED = [CURRENT_RETURN, FUTURE_RETURN, CAPACITY] + FLOWS
+RELATIVE_BINS = [-numpy.inf, -0.5, -0.2, -0.1, -0.01, 0.01, 0.1, 0.2, 0.5, numpy.inf]
+RELATIVE_LABELS = ['< -50%', '-50 to -20%', '-20 to -10%', '-10 to -1%', '-1 to 1%', '1 to 10%', '10 to 20%',
+                   '20 to 50%', '> 50%']
+DIFF_HEADER = ['NAACC_ID', 'BarrierID', 'Status', 'Current_Return_A', 'Current_Return_B', 'Future_Return_A',
+               'Future_Return_B', 'Capacity_A', 'Capacity_B', 'Capacity_Delta'] \
+    + ['Y' + flow.split()[0] + '_Delta' for flow in FLOWS]
+
+
+# Stream the rows of a model_output file as (NAACC_ID, BarrierID, tuple of compared numbers).
+def read_rows(filename):
+    with open(filename, 'r') as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader)
+        missing = [name for name in ['NAACC_ID', 'BarrierID'] + COMPARED if name not in header]
+        if len(missing) > 0:
+            print "ERROR: file '" + filename + "' is missing the following columns: " + ", ".join(missing) \
+                + ". Bailing out."
+            sys.exit(0)
+        id_column = header.index('NAACC_ID')
+        barrier_column = header.index('BarrierID')
+        columns = [header.index(name) for name in COMPARED]
+        for row in reader:
+            values = []
+            for column in columns:
+                try:
+                    values.append(float(row[column]))
+                except (ValueError, IndexError):
+                    values.append(float('nan'))
+            yield row[id_column], row[barrier_column], tuple(values)
+
+
+# Number of return periods a culvert moved up (+) or down (-).
+def return_step(before, after):
+    if before in RETURN_PERIODS and after in RETURN_PERIODS:
+        return RETURN_PERIODS.index(after) - RETURN_PERIODS.index(before)
+    return None
+
+
+# Relative change, or None where the old value is zero or missing.
+def relative_change(before, after):
+    if before != 0 and not numpy.isnan(before) and not numpy.isnan(after):
+        return (after - before) / abs(before)
+    return None
+
+
+# Diff two model_output files.
+# Parameters:
+#   filename_a: earlier model_output csv.
+#   filename_b: later model_output csv.
+#   output_filename: diff csv to write (the summary goes next to it, ending in _summary.csv).
+#   tolerance: relative change in capacity or flow below which a culvert is not reported as changed.
+# Returns:
+#   A summary dictionary of counts and histograms.
+def diff(filename_a, filename_b, output_filename, tolerance=1e-6):
+    before = {}
+    duplicates = 0
+    for naacc_id, barrier_id, values in read_rows(filename_a):
+        if naacc_id in before:
+            duplicates += 1
+            continue
+        before[naacc_id] = (barrier_id, values)
+
+    summary = {
+        'compared': 0, 'changed': 0, 'added': 0, 'removed': 0, 'duplicates': duplicates,
+        'current_steps': {}, 'future_steps': {},
+        'capacity_change': numpy.zeros(len(RELATIVE_LABELS), dtype=int),
+        'flow_change': numpy.zeros(len(RELATIVE_LABELS), dtype=int)
+    }
+    num_values = len(COMPARED)
+    missing = (float('nan'),) * num_values
+    seen = set()
+
+    with open(output_filename, 'wb') as output_file:
+        csv_writer = csv.writer(output_file)
+        csv_writer.writerow(DIFF_HEADER)
+
+        # Missing values (added or removed culverts) are left blank.
+        def write(naacc_id, barrier_id, status, a, b):
+            returns = ['' if numpy.isnan(value) else int(value) for value in (a[0], b[0], a[1], b[1])]
+            numbers = [a[2], b[2], b[2] - a[2]] + [b[3 + i] - a[3 + i] for i in range(len(FLOWS))]
+            csv_writer.writerow([naacc_id, barrier_id, status] + returns
+                                + ['' if numpy.isnan(value) else '%.6f' % value for value in numbers])
+
+        for naacc_id, barrier_id, values in read_rows(filename_b):
+            if naacc_id in seen:
+                summary['duplicates'] += 1
+                continue
+            seen.add(naacc_id)
+            if naacc_id not in before:
+                summary['added'] += 1
+                write(naacc_id, barrier_id, 'added', missing, values)
+                continue
+
+            old = before[naacc_id][1]
+            summary['compared'] += 1
+            for name, index in (('current_steps', 0), ('future_steps', 1)):
+                step = return_step(old[index], values[index])
+                summary[name][step] = summary[name].get(step, 0) + 1
+            for name, index in (('capacity_change', 2), ('flow_change', 3 + FLOWS.index('100 year flow (current)'))):
+                change = relative_change(old[index], values[index])
+                if change is not None:
+                    summary[name][numpy.searchsorted(RELATIVE_BINS, change, side='right') - 1] += 1
+
+            changed = old[0] != values[0] or old[1] != values[1]
+            for index in range(2, num_values):
+                if numpy.isnan(old[index]) and numpy.isnan(values[index]):
+                    continue
+                change = relative_change(old[index], values[index])
+                if change is None:
+                    changed = changed or old[index] != values[index]
+                else:
+                    changed = changed or abs(change) > tolerance
+            if changed:
+                summary['changed'] += 1
+                write(naacc_id, barrier_id, 'changed', old, values)
+
+        # Culverts only in the first run.
+        for naacc_id in before:
+            if naacc_id not in seen:
+                summary['removed'] += 1
+                write(naacc_id, before[naacc_id][0], 'removed', before[naacc_id][1], missing)
+
+    save_summary(summary, output_filename[:-4] + '_summary.csv')
+    return summary
+
+
+# Save the summary histograms.
+def save_summary(summary, summary_filename):
+    with open(summary_filename, 'wb') as output_file:
+        csv_writer = csv.writer(output_file)
+        csv_writer.writerow(['Histogram', 'Bin', 'Count'])
+        for name in ['compared', 'changed', 'added', 'removed', 'duplicates']:
+            csv_writer.writerow(['Culverts', name, summary[name]])
+        for name, label in (('current_steps', 'Current return period steps'),
+                            ('future_steps', 'Future return period steps')):
+            for step in sorted(summary[name], key=lambda step: (step is None, step)):
+                csv_writer.writerow([label, 'unknown' if step is None else '%+d' % step, summary[name][step]])
+        for name, label in (('capacity_change', 'Capacity relative change'),
+                            ('flow_change', '100 yr flow relative change')):
+            for bin_label, count in zip(RELATIVE_LABELS, summary[name]):
+                csv_writer.writerow([label, bin_label, count])
+
+
+# Print the main counts of a summary.
+def print_summary(summary):
+    print " * Compared " + str(summary['compared']) + " culverts: " + str(summary['changed']) + " changed, " \
+        + str(summary['added']) + " added, " + str(summary['removed']) + " removed."
+    for name, label in (('current_steps', 'current'), ('future_steps', 'future')):
+        down = sum(count for step, count in summary[name].items() if step is not None and step < 0)
+        up = sum(count for step, count in summary[name].items() if step is not None and step > 0)
+        print " * Return period (" + label + "): " + str(up) + " culverts moved up, " + str(down) + " moved down."
+
+
+if __name__ == '__main__':
+    print('Cornell Culvert Evaluation Model - run diff')
+    print('-------------------------------------------\n')
+
+    FileA = raw_input("Path to the earlier model_output csv: \n")
+    FileB = raw_input("Path to the later model_output csv: \n")
+    OutputFile = raw_input("Path of the diff csv to write: \n")
+    print_summary(diff(FileA, FileB, OutputFile))
+    print "\nDone! The diff can be found here:\n" + OutputFile
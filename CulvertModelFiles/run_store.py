@@ -0,0 +1,159 @@
+# SQLite run store
+# October 2026
+#
+# This script will save the outputs of a run (geometry, capacity, current and future runoff, return periods,
+# final output and the skipped / not modeled culverts) into one local SQLite database, so runs can be
+# compared with indexed queries instead of loading many csv files by hand.
+#
+# Every run gets a run_id and a row in the runs table with its name, time and parameters (as JSON).
+# Each output file goes into its own table, with run_id added as the first column. Column names are the csv
+# headers with anything that is not a letter, digit or underscore replaced ('Current Max Return (yr)' becomes
+# Current_Max_Return_yr). Tables and columns are created as needed, and indexed on run_id, BarrierID,
+# NAACC_ID and Survey_ID. Each run is inserted in one transaction, so a run that fails part way leaves nothing
+# behind. Text is stored as the bytes read from the csv files (comments may hold any characters).
+#
+# Example:
+#   run_id = run_store.store_run('../runs.sqlite', output_prefix, 'ALB 2024', {'PrecipType': 'y'})
+#   run_store.changed_return_periods('../runs.sqlite', 1, run_id)
+
+import csv, json, os, re, sqlite3, time
+
+# Table name for each run output file (output_prefix + file).
+OUTPUT_TABLES = [
+    ('geometry', 'culv_geom.csv'),
+    ('capacity', 'capacity_output.csv'),
+    ('current_runoff', 'current_runoff.csv'),
+    ('future_runoff', 'future_runoff.csv'),
+    ('return_periods', 'return_periods.csv'),
+    ('model_output', 'model_output.csv'),
+    ('skipped', 'skipped_culverts.csv'),
+    ('not_modeled', 'not_modeled.csv'),
+    ('streamstats', 'StreamStatsAreaBasedQ_CMS.csv')
+]
+INDEXED_COLUMNS = ['run_id', 'BarrierID', 'NAACC_ID', 'Survey_ID']
+TEXT_COLUMNS = ['BarrierID', 'Field_Comments', 'Model_Notes', 'Modeling_notes', 'Comments', 'Control']
+
+
+# Column name for a csv header.
+def column_name(header):
+    return re.sub('_+', '_', re.sub('[^0-9A-Za-z_]', '_', header.strip())).strip('_')
+
+
+# Open (and if needed create) a run store.
+def connect(database_filename):
+    # Transactions are begun and committed by hand (isolation_level None), since Python 2's sqlite3 commits
+    # before every CREATE and ALTER on its own.
+    connection = sqlite3.connect(database_filename, isolation_level=None)
+    connection.text_factory = str
+    connection.execute('CREATE TABLE IF NOT EXISTS runs (run_id INTEGER PRIMARY KEY, name TEXT, created TEXT, '
+                       'output_prefix TEXT, parameters TEXT)')
+    return connection
+
+
+# Columns a table already has ([] if it does not exist yet).
+def table_columns(connection, table):
+    return [row[1] for row in connection.execute('PRAGMA table_info(' + table + ')')]
+
+
+# Create a table, or add any columns it is missing, and index it.
+def prepare_table(connection, table, columns):
+    def definition(column):
+        return '"' + column + '" ' + ('TEXT' if column in TEXT_COLUMNS else 'NUMERIC')  # NUMERIC keeps numbers as numbers
+
+    existing = table_columns(connection, table)
+    if not existing:
+        connection.execute('CREATE TABLE ' + table + ' (run_id INTEGER, '
+                           + ', '.join(definition(column) for column in columns) + ')')
+        existing = ['run_id'] + columns
+    for column in columns:
+        if column not in existing:
+            connection.execute('ALTER TABLE ' + table + ' ADD COLUMN ' + definition(column))
+            existing.append(column)
+    for column in INDEXED_COLUMNS:
+        if column in existing:
+            connection.execute('CREATE INDEX IF NOT EXISTS ' + table + '_' + column + ' ON ' + table + ' ("' + column + '")')
+
+
+# Save all outputs of a run.
+# Parameters:
+#   database_filename: SQLite database file (created if missing).
+#   output_prefix: path and filename prefix of the run outputs (e.g. '../ALB/ALB_Model_Output/ALB_').
+#   name: name of the run.
+#   parameters: dictionary of run parameters to keep with the run.
+# Returns:
+#   The run_id of the stored run.
+def store_run(database_filename, output_prefix, name, parameters=None):
+    connection = connect(database_filename)
+    try:
+        connection.execute('BEGIN')  # One transaction for the whole run, tables and columns included
+        try:
+            cursor = connection.execute('INSERT INTO runs (name, created, output_prefix, parameters) VALUES (?, ?, ?, ?)',
+                                        (name, time.strftime('%Y-%m-%d %H:%M:%S'), os.path.abspath(output_prefix),
+                                         json.dumps(parameters or {}, sort_keys=True)))
+            run_id = cursor.lastrowid
+            for table, suffix in OUTPUT_TABLES:
+                filename = output_prefix + suffix
+                if not os.path.exists(filename):
+                    continue
+                with open(filename, 'r') as csv_file:
+                    reader = csv.reader(csv_file)
+                    header = next(reader, None)
+                    if header is None:
+                        continue
+                    columns = [column_name(name) for name in header]
+                    prepare_table(connection, table, columns)
+                    insert = 'INSERT INTO ' + table + ' (run_id, ' + ', '.join('"' + column + '"' for column in columns) \
+                        + ') VALUES (' + ', '.join(['?'] * (len(columns) + 1)) + ')'
+                    connection.executemany(insert, ([run_id] + (row + [None] * len(columns))[:len(columns)]
+                                                    for row in reader))
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+    finally:
+        connection.close()
+    return run_id
+
+
+# List the stored runs.
+# Returns:
+#   A list of (run_id, name, created, output_prefix, parameters dictionary).
+def runs(database_filename):
+    connection = connect(database_filename)
+    try:
+        return [row[:4] + (json.loads(row[4]),)
+                for row in connection.execute('SELECT run_id, name, created, output_prefix, parameters FROM runs '
+                                              'ORDER BY run_id')]
+    finally:
+        connection.close()
+
+
+# Run a query on the store.
+# Returns:
+#   A list of result rows (tuples).
+def query(database_filename, sql, arguments=()):
+    connection = connect(database_filename)
+    try:
+        return connection.execute(sql, arguments).fetchall()
+    finally:
+        connection.close()
+
+
+# Culverts whose current or future return period changed between two runs.
+# Crossings are matched by NAACC_ID (from each run's model_output), since BarrierIDs are numbered by position and
+# shift when the inventory changes.
+# Returns:
+#   A list of (NAACC_ID, BarrierID in run a, in run b, current return in run a, in run b, future return in run a,
+#   in run b).
+def changed_return_periods(database_filename, run_a, run_b):
+    return query(database_filename,
+                 'SELECT ma.NAACC_ID, a.BarrierID, b.BarrierID, a.Current_Max_Return_yr, b.Current_Max_Return_yr, '
+                 'a.Future_Max_Return_yr, b.Future_Max_Return_yr '
+                 'FROM return_periods a '
+                 'JOIN model_output ma ON ma.run_id = a.run_id AND ma.BarrierID = a.BarrierID '
+                 'JOIN model_output mb ON mb.run_id = ? AND mb.NAACC_ID = ma.NAACC_ID '
+                 'JOIN return_periods b ON b.run_id = mb.run_id AND b.BarrierID = mb.BarrierID '
+                 'WHERE a.run_id = ? AND ma.NAACC_ID IS NOT NULL AND ma.NAACC_ID != \'\' '
+                 'AND (a.Current_Max_Return_yr != b.Current_Max_Return_yr '
+                 'OR a.Future_Max_Return_yr != b.Future_Max_Return_yr) '
+                 'ORDER BY ma.NAACC_ID', (run_b, run_a))
@@ -6,6 +6,8 @@
 #   - Each watershed can have their own precip inputs
 #   - New formulation for qu, ("Peak multiplier"),based on linear relationship with Tc 
 #
+# October 2026: the TR-55 graphical peak discharge method can be selected instead of the qu fit (peak_method = 'tr55')
+#
 # Determine the runoff peak flow using the SCS curve number method (see TR-55 document for further details)
 # 
 # Inputs:   culvert_Q_input.csv: culvertID, watershed area (sq km), average curve number, time of concentration (hr)
@@ -16,11 +18,216 @@
 # Outputs:  table of runoff (q_peak) in cubic meters per second for each return periods under current precipitation conditions
 #           table of runoff (q_peak) in cubic meters per second for each return periods under future precipitation conditions
 
-import numpy, pandas, os, re, csv, sys, loader
+import numpy, pandas, os, re, csv, sys, loader, records, output_writer
+
+# qu ("Peak multiplier") coefficients for the 1, 2, 5, 10, 25, 50, 100, 200 and 500 yr storms,
+# qu = (Const0 - Const1 * tc)/8.64 (New York, Archibald 2019). A refit table from qu_calibration.py is only used
+# when it is passed in (qu_table), so it is always a named input of the run.
+QU_CONST0 = numpy.array([2.798, 2.798, 3.225, 3.529, 3.932, 4.244, 4.57, 4.914, 5.403])
+QU_CONST1 = numpy.array([0.367, 0.367, 0.481, 0.559, 0.658, 0.733, 0.81, 0.888, 0.996])
+
+
+# Load qu coefficients from a table written by qu_calibration.py.
+# Parameters:
+#   qu_table_filename: csv with Return_Period, Const0 and Const1 for the 1 to 500 yr storms.
+# Returns:
+#   The Const0 and Const1 arrays for the 1 to 500 yr storms.
+def load_qu_table(qu_table_filename):
+    signature = [{'name': 'Return_Period', 'type': int}, {'name': 'Const0', 'type': float}, {'name': 'Const1', 'type': float}]
+    table = loader.load(qu_table_filename, signature, 1, -1)
+    for invalid in table['invalid_rows']:
+        print "ERROR: row " + str(invalid['row_number']) + " of qu table '" + qu_table_filename + "' is not valid: " \
+            + invalid['reason_invalid'] + ". Bailing out."
+        sys.exit(0)
+    rows = dict((row['Return_Period'], row) for row in table['valid_rows'])
+    missing = [str(year) for year in [1, 2, 5, 10, 25, 50, 100, 200, 500]
+               if year not in rows or not numpy.isfinite([rows[year]['Const0'], rows[year]['Const1']]).all()]
+    if len(missing) > 0:
+        print "ERROR: qu table '" + qu_table_filename + "' has no coefficients for the " + ", ".join(missing) \
+            + " yr storms. Bailing out."
+        sys.exit(0)
+    return (numpy.array([rows[year]['Const0'] for year in [1, 2, 5, 10, 25, 50, 100, 200, 500]]),
+            numpy.array([rows[year]['Const1'] for year in [1, 2, 5, 10, 25, 50, 100, 200, 500]]))
+
+
+# qu coefficients of a run: the table's if one is given ('' for the New York coefficients above).
+# Returns:
+#   The Const0 and Const1 arrays for the 1 to 500 yr storms.
+def qu_coefficients(qu_table=''):
+    if qu_table == '':
+        return QU_CONST0, QU_CONST1
+    return load_qu_table(qu_table)
+
+
+# NY StreamStats area-based regression coefficients by region, Q (cfs) = CA0 * (area in sq mi)**CA1,
+# for the 1.25, 1.5, 2, 5, 10, 25, 50, 100, 200 and 500 yr floods. From page 34 of Lumia et al. 2006.
+STREAMSTATS_COEFFICIENTS = {
+    1: (numpy.array([31.7, 38.5, 47.6, 73, 92.1, 119, 140, 162, 186, 219]),
+        numpy.array([0.857, 0.848, 0.839, 0.822, 0.813, 0.802, 0.796, 0.790, 0.785, 0.779])),
+    2: (numpy.array([43.4, 56.1, 74.7, 139, 197, 291, 378, 480, 598, 782]),
+        numpy.array([0.772, 0.758, 0.743, 0.712, 0.695, 0.677, 0.666, 0.656, 0.648, 0.638])),
+    3: (numpy.array([57.4, 71.8, 90.8, 144, 185, 249, 304, 367, 436, 539]),
+        numpy.array([0.861, 0.857, 0.85, 0.848, 0.843, 0.84, 0.840, 0.836, 0.832, 0.827])),
+    4: (numpy.array([39.1, 48.7, 61.3, 97.4, 124, 161, 191, 221, 253, 298]),
+        numpy.array([0.833, 0.823, 0.812, 0.788, 0.775, 0.761, 0.751, 0.743, 0.735, 0.727])),
+    5: (numpy.array([54.8, 71.5, 95.4, 172, 237, 332, 412, 502, 600, 745]),
+        numpy.array([0.800, 0.785, 0.770, 0.738, 0.722, 0.706, 0.695, 0.687, 0.679, 0.670])),
+    6: (numpy.array([31.1, 37.2, 44.5, 62.7, 74.2, 88.4, 98.5, 108, 117, 129]),
+        numpy.array([0.783, 0.782, 0.782, 0.788, 0.794, 0.801, 0.807, 0.813, 0.818, 0.826]))
+}
+
+# TR-55 graphical peak discharge method (USDA NRCS 1986, Exhibit 4 and Table F-1): log10(qu) = C0 + C1*log10(Tc) + C2*log10(Tc)**2,
+# qu in csm/in (cubic feet per second per square mile per inch of runoff), by rainfall distribution type and Ia/P.
+# Rows are (Ia/P, C0, C1, C2).
+TR55_COEFFICIENTS = {
+    'I': numpy.array([[0.10, 2.30550, -0.51429, -0.11750],
+                      [0.20, 2.23537, -0.50387, -0.08929],
+                      [0.25, 2.18219, -0.48488, -0.06589],
+                      [0.30, 2.10624, -0.45695, -0.02835],
+                      [0.35, 2.00303, -0.40769, 0.01983],
+                      [0.40, 1.87733, -0.32274, 0.05754],
+                      [0.45, 1.76312, -0.15644, 0.00453],
+                      [0.50, 1.67889, -0.06930, 0.0]]),
+    'IA': numpy.array([[0.10, 2.03250, -0.31583, -0.13748],
+                       [0.20, 1.91978, -0.28215, -0.07020],
+                       [0.25, 1.83842, -0.25543, -0.02597],
+                       [0.30, 1.72657, -0.19826, 0.02633],
+                       [0.50, 1.63417, -0.09100, 0.0]]),
+    'II': numpy.array([[0.10, 2.55323, -0.61512, -0.16403],
+                       [0.30, 2.46532, -0.62257, -0.11657],
+                       [0.35, 2.41896, -0.61594, -0.08820],
+                       [0.40, 2.36409, -0.59857, -0.05621],
+                       [0.45, 2.29238, -0.57005, -0.02281],
+                       [0.50, 2.20282, -0.51599, -0.01259]]),
+    'III': numpy.array([[0.10, 2.47317, -0.51848, -0.17083],
+                        [0.30, 2.39628, -0.51202, -0.13245],
+                        [0.35, 2.35477, -0.49735, -0.11985],
+                        [0.40, 2.30726, -0.46541, -0.11094],
+                        [0.45, 2.24876, -0.41314, -0.11508],
+                        [0.50, 2.17772, -0.36803, -0.09525]])
+}
+TR55_IA_P = numpy.linspace(0.1, 0.5, 81)  # Ia/P grid, TR-55 limits
+TR55_LOG_TC = numpy.linspace(-1.0, 1.0, 201)  # log10(Tc in hr) grid, Tc from 0.1 to 10 hr (TR-55 limits)
+CSM_PER_IN_TO_SI = 1 / (35.3147 * 2.58999 * 2.54)  # csm/in to m^3/s per km^2 per cm of runoff
+
+
+# Build the dense TR-55 qu grid (m^3/s per km^2 per cm, rows Ia/P, columns log10 Tc) for one rainfall type.
+# qu is interpolated linearly between the tabulated Ia/P values, as TR-55 directs.
+def tr55_grid(rain_type):
+    table = TR55_COEFFICIENTS[rain_type]
+    log_tc = TR55_LOG_TC[numpy.newaxis, :]
+    table_qu = 10 ** (table[:, 1:2] + table[:, 2:3] * log_tc + table[:, 3:4] * log_tc ** 2)
+    grid = numpy.array([numpy.interp(TR55_IA_P, table[:, 0], table_qu[:, column]) for column in range(len(TR55_LOG_TC))]).T
+    return grid * CSM_PER_IN_TO_SI
 
+# Precomputed once per process, so the TR-55 method is a lookup like the qu fit.
+TR55_GRIDS = dict((rain_type, tr55_grid(rain_type)) for rain_type in TR55_COEFFICIENTS)
 
+
+# TR-55 unit peak discharge for any number of watersheds and storms at once (bilinear lookup in the dense grid).
+# Parameters:
+#   ia_p: array of Ia/P ratios (clipped to the TR-55 range 0.1 - 0.5).
+#   tc: array of times of concentration in hours, same shape (clipped to 0.1 - 10 hr).
+#   rain_type: NRCS rainfall distribution type, 'I', 'IA', 'II' or 'III' (most of New York is type II).
+# Returns:
+#   An array of qu in m^3/s per km^2 per cm of runoff, the same units as the qu fit.
+def tr55_unit_peak(ia_p, tc, rain_type='II'):
+    grid = TR55_GRIDS[rain_type]
+    ia_p = numpy.where(numpy.isnan(ia_p), TR55_IA_P[-1], ia_p)  # e.g. CN = 0 watersheds, which are skipped anyway
+    row = (numpy.clip(ia_p, TR55_IA_P[0], TR55_IA_P[-1]) - TR55_IA_P[0]) / (TR55_IA_P[1] - TR55_IA_P[0])
+    column = (numpy.log10(numpy.clip(tc, 0.1, 10.0)) - TR55_LOG_TC[0]) / (TR55_LOG_TC[1] - TR55_LOG_TC[0])
+    row0 = numpy.minimum(row.astype(int), len(TR55_IA_P) - 2)
+    column0 = numpy.minimum(column.astype(int), len(TR55_LOG_TC) - 2)
+    row_fraction = row - row0
+    column_fraction = column - column0
+    return (grid[row0, column0] * (1 - row_fraction) * (1 - column_fraction)
+            + grid[row0 + 1, column0] * row_fraction * (1 - column_fraction)
+            + grid[row0, column0 + 1] * (1 - row_fraction) * column_fraction
+            + grid[row0 + 1, column0 + 1] * row_fraction * column_fraction)
+
+
+# Peak flows for many watersheds at once, with the same equations as calculate.
+# Parameters:
+#   area, tc, CN: arrays of watershed area (sq km), time of concentration (hr) and curve number, one per watershed.
+#   P: array (watersheds, 9) of precipitation in cm for the 1 to 500 yr storms (already rainfall adjusted).
+#   peak_method, rain_type: as for calculate.
+#   qu: Const0 and Const1 arrays (see qu_coefficients), None for the New York coefficients.
+# Returns:
+#   An array (watersheds, 9) of peak flows in cubic meters per second.
+def peak_flows(area, tc, CN, P, peak_method='qu', rain_type='II', qu=None):
+    area = numpy.asarray(area, dtype=float)[:, numpy.newaxis]
+    tc = numpy.asarray(tc, dtype=float)[:, numpy.newaxis]
+    CN = numpy.asarray(CN, dtype=float)[:, numpy.newaxis]
+    Storage = 0.1 * ((25400.0 / CN) - 254.0)
+    Ia = 0.2 * Storage
+    Q = (numpy.maximum(P - Ia, 0) ** 2) / (P + (Storage - Ia))
+    if peak_method == 'tr55':
+        qu = tr55_unit_peak(Ia / P, tc * numpy.ones((1, P.shape[1])), rain_type)
+    else:
+        Const0, Const1 = qu or (QU_CONST0, QU_CONST1)
+        qu = numpy.maximum((Const0 - Const1 * tc) / 8.64, 0.14)
+    return Q * qu * area
+
+
+# Crossings whose watershed calculate models (CN and Tc not 0, area at least 0.01 sq km) and that have a
+# capacity, matched by BarrierID as in final_output.py, in capacity file order. The one selection used by
+# storm_query.py, continuous.py and scenarios.py.
+# Parameters:
+#   sorted_filename: sorted watershed file (calculate input).
+#   capacity_filename: capacity output file.
+#   capacity_columns: other numeric capacity file columns to keep (e.g. Lat, Long).
+#   barrier_ids: BarrierIDs to keep (any container), or None for all.
+# Returns:
+#   A dictionary with barrier_id (list) and arrays, one value per crossing: area, tc, CN, P (crossings x 9, mm),
+#   capacity and each of capacity_columns.
+def modeled_crossings(sorted_filename, capacity_filename, capacity_columns=(), barrier_ids=None):
+    storms = ['P1', 'P2', 'P5', 'P10', 'P25', 'P50', 'P100', 'P200', 'P500']
+    watershed_signature = [{'name': 'BarrierID', 'type': str}, {'name': 'Area_sqkm', 'type': float},
+                           {'name': 'Tc_hr', 'type': float}, {'name': 'CN', 'type': float}] \
+        + [{'name': name, 'type': float} for name in storms]
+    capacity_signature = [{'name': 'BarrierID', 'type': str}, {'name': 'Q', 'type': float}] \
+        + [{'name': name, 'type': float} for name in capacity_columns]
+    watersheds = records.load(sorted_filename, watershed_signature, 1, -1)['table']
+    capacities = records.load(capacity_filename, capacity_signature, 1, -1)['table']
+
+    area = watersheds.column('Area_sqkm')
+    tc = watersheds.column('Tc_hr')
+    CN = watersheds.column('CN')
+    modeled = (CN != 0) & (tc != 0) & (area >= 0.01)
+    watershed_lookup = {}
+    for index, barrier_id in enumerate(watersheds.strings('BarrierID')):
+        if modeled[index]:
+            watershed_lookup.setdefault(barrier_id, index)
+    kept_ids = []
+    capacity_rows = []
+    watershed_rows = []
+    for index, barrier_id in enumerate(capacities.strings('BarrierID')):
+        if barrier_id in watershed_lookup and (barrier_ids is None or barrier_id in barrier_ids):
+            kept_ids.append(barrier_id)
+            capacity_rows.append(index)
+            watershed_rows.append(watershed_lookup[barrier_id])
+    capacity_rows = numpy.array(capacity_rows, dtype=int)
+    watershed_rows = numpy.array(watershed_rows, dtype=int)
+
+    crossings = {
+        'barrier_id': kept_ids,
+        'area': area[watershed_rows],
+        'tc': tc[watershed_rows],
+        'CN': CN[watershed_rows],
+        'P': numpy.column_stack([watersheds.column(name)[watershed_rows] for name in storms]).reshape(-1, len(storms)),
+        'capacity': capacities.column('Q')[capacity_rows]
+    }
+    for name in capacity_columns:
+        crossings[name] = capacities.column(name)[capacity_rows]
+    return crossings
+
+
+# peak_method: 'qu' for the qu fit (Archibald 2019), 'tr55' for the TR-55 graphical peak discharge method.
+# rain_type: NRCS rainfall distribution type used by the 'tr55' method.
+# qu_table: qu coefficient table from qu_calibration.py ('' for the New York coefficients, see qu_coefficients).
 def calculate(sorted_filename, rainfall_adjustment, output_filename, skipped_filename = False,
-              SSA = True, IntermediateFiles = False, SSF = False):   # Still need to add these parameters into the function
+              SSA = True, IntermediateFiles = False, SSF = False,   # Still need to add these parameters into the function
+              peak_method = 'qu', rain_type = 'II', qu_table = ''):
     # Precipitation values (mm, converted to cm) are average for each watershed from NOAA Atlas 14
     # 1yr,2yr,5yr,10yr,25 yr,50 yr,100yr,200 yr,500 yr storm
 
@@ -49,6 +256,23 @@ def calculate(sorted_filename, rainfall_adjustment, output_filename, skipped_fil
             #Header in row 1, and we want to read all rows (max rows= -1)
     valid_watersheds = watershed_data['valid_rows']
 
+    if peak_method not in ('qu', 'tr55') or rain_type not in TR55_GRIDS:
+        print "ERROR: unknown peak method '" + str(peak_method) + "' or rainfall type '" + str(rain_type) \
+            + "' (use qu or tr55, and I, IA, II or III). Bailing out."
+        sys.exit(0)
+    QuConst0, QuConst1 = qu_coefficients(qu_table)
+
+    # TR-55 unit peak discharge for every watershed and storm in one lookup.
+    if peak_method == 'tr55':
+        P_all = numpy.array([[watershed[name] for name in ['P1', 'P2', 'P5', 'P10', 'P25', 'P50', 'P100', 'P200', 'P500']]
+                             for watershed in valid_watersheds]).reshape(-1, 9) * rainfall_adjustment / 10
+        CN_all = numpy.array([watershed['CN'] for watershed in valid_watersheds])
+        tc_all = numpy.array([watershed['Tc_hr'] for watershed in valid_watersheds])
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            Ia_all = 0.2 * 0.1 * ((25400.0 / CN_all) - 254.0)  # cm, as below
+            tr55_qu = tr55_unit_peak(Ia_all[:, numpy.newaxis] / P_all, tc_all[:, numpy.newaxis] * numpy.ones((1, 9)),
+                                     rain_type)
+
     # Run the calculation for each watershed and each precipitation:
     results = []
     skipped_watersheds = []
@@ -59,7 +283,7 @@ def calculate(sorted_filename, rainfall_adjustment, output_filename, skipped_fil
     results3 = []
     results_precip = []
 
-    for watershed in valid_watersheds:
+    for watershed_index, watershed in enumerate(valid_watersheds):
 
         #Store our watershed values in handy variables for calculations (from watershed dictionary)
         BarrierID = watershed['BarrierID']
@@ -115,53 +339,30 @@ def calculate(sorted_filename, rainfall_adjustment, output_filename, skipped_fil
 
         # keep rain ratio within limits set by TR55
         #Calculated
-        Const0 = numpy.array([2.798, 2.798, 3.225, 3.529, 3.932, 4.244, 4.57, 4.914, 5.403])
-        Const1 = numpy.array([0.367, 0.367, 0.481, 0.559, 0.658, 0.733, 0.81, 0.888, 0.996])
+        if peak_method == 'tr55':
+            qu = tr55_qu[watershed_index]  # TR-55 unit peak discharge, already in m^3/s per km^2 per cm
+        else:
+            Const0 = QuConst0
+            Const1 = QuConst1
 
-        qu = (Const0 - Const1 * tc)/8.64
-        qu = numpy.array([0.14 if i < 0.14 else i for i in qu]) # prevents peak flow being less than 1.2x daily flow
-        # qu would have to be m^3/s per km^2 per cm :
-        # / 8.64 creates those units from a unitless value
+            qu = (Const0 - Const1 * tc)/8.64
+            qu = numpy.array([0.14 if i < 0.14 else i for i in qu]) # prevents peak flow being less than 1.2x daily flow
+            # qu would have to be m^3/s per km^2 per cm :
+            # / 8.64 creates those units from a unitless value
 
         q_peak = Q * qu * ws_area #m^3/s
         Q_daily = Q * ws_area *10000/(3600*24)   # updated 6/3/2019 for cms units 
         #qu has weird units which take care of the difference between Q in cm and area in km2
 
         # Optional Stream Stats calculations here (Jo added in June 2019)
-        #  further StreamStats regions should be added as needed
+        #  further StreamStats regions should be added to STREAMSTATS_COEFFICIENTS as needed
         if (SSA == True):
-            if (Region == 1):
-                CA0 = numpy.array([31.7,38.5,47.6,73,92.1,119,
-                                   140,162,186,219])
-                CA1 = numpy.array([0.857, 0.848, 0.839, 0.822, 0.813, 0.802,
-                                   0.796, 0.790, 0.785, 0.779])
-            elif (Region == 2):
-                CA0 = numpy.array([43.4,56.1,74.7,139,197,291,
-                                   378,480,598,782])
-                CA1 = numpy.array([0.772, 0.758, 0.743, 0.712, 0.695, 0.677,
-                                   0.666, 0.656, 0.648, 0.638])
-            elif (Region == 3):
-                CA0 = numpy.array([57.4,71.8,90.8,144,185,249,
-                                   304,367,436,539])
-                CA1 = numpy.array([0.861, 0.857, 0.85, 0.848, 0.843, 0.84,
-                                   0.840, 0.836, 0.832, 0.827])
-            elif (Region == 4):
-                CA0 = numpy.array([39.1, 48.7, 61.3, 97.4, 124, 161,191, 221, 253, 298])
-                CA1 = numpy.array([0.833,0.823,0.812, 0.788, 0.775, 0.761, 0.751, 0.743, 0.735, 0.727])
-            elif (Region == 5):
-                CA0 = numpy.array([54.8, 71.5, 95.4, 172, 237, 332, 412, 502, 600, 745])
-                CA1 = numpy.array([0.800,0.785,0.770, 0.738, 0.722, 0.706, 0.695, 0.687, 0.679, 0.670])
-            elif (Region == 6):
-                CA0 = numpy.array([31.1, 37.2, 44.5, 62.7, 74.2, 88.4, 98.5, 108, 117, 129])
-                CA1 = numpy.array([0.783,0.782,0.782, 0.788, 0.794, 0.801, 0.807, 0.813, 0.818, 0.826])
-                # from page 34 of Lumia et al.
-            else:
-                CA0 = 0
-                CA1 = 0
-                # Modeling_notes = "StreamStats not modeled"
-            SSA_Q = (CA0 * (ws_area/2.59)**CA1)/35.315  # Flow in cms
-            Q_ratios = q_peak[1:9]/SSA_Q[2:10]  # Cornell value/SS value
-            SSA_Qs.append([BarrierID, ws_area, numpy.mean(Q_ratios), max(Q_ratios), min(Q_ratios), Region]+SSA_Q.tolist())
+            if Region in STREAMSTATS_COEFFICIENTS:
+                CA0, CA1 = STREAMSTATS_COEFFICIENTS[Region]
+                SSA_Q = (CA0 * (ws_area/2.59)**CA1)/35.315  # Flow in cms
+                Q_ratios = q_peak[1:9]/SSA_Q[2:10]  # Cornell value/SS value
+                SSA_Qs.append([BarrierID, ws_area, numpy.mean(Q_ratios), max(Q_ratios), min(Q_ratios), Region]+SSA_Q.tolist())
+            # else: Modeling_notes = "StreamStats not modeled" (e.g. Region 0 from region_assign, outside every region)
 
         ##  More if statements neede here - other regions, and/or full regression equation
 
@@ -182,51 +383,21 @@ def calculate(sorted_filename, rainfall_adjustment, output_filename, skipped_fil
             results_precip.append(result_precip)
 
 
-    # Set up to save results to new file.
-    with open(output_filename, 'wb') as output_file:
-        csv_writer = csv.writer(output_file)
-        # Header
-        csv_writer.writerow(['BarrierID', 'Area_sqkm', 'Tc_hr', 'CN', 'Y1','Y2','Y5','Y10','Y25','Y50','Y100','Y200','Y500'])
-        # Each row.
-        # Later: when flags (aka number_of_culverts) is present, skip ahead that number
-        # instead of just 1 in the results list (ie, ignore the second, third, etc. culvert.)
-        for result in results:
-            csv_writer.writerow(result)
-    # output_file closed by with
+    # Save results to new file, a whole column at a time (see output_writer.py).
+    # Later: when flags (aka number_of_culverts) is present, skip ahead that number
+    # instead of just 1 in the results list (ie, ignore the second, third, etc. culvert.)
+    output_writer.write_rows(output_filename, ['BarrierID', 'Area_sqkm', 'Tc_hr', 'CN', 'Y1','Y2','Y5','Y10','Y25','Y50','Y100','Y200','Y500'], results)
 
     if (IntermediateFiles == True):  # Intermediate files useful for testing model performance
-        with open(output_filename[:-4] + '_Daily.csv', 'wb') as output_file:
-            csv_writer = csv.writer(output_file)
-            csv_writer.writerow(['BarrierID', 'Area_sqkm', 'S_cm', 'CN', 'Y1','Y2','Y5','Y10','Y25','Y50','Y100','Y200','Y500'])
-            for result3 in results3:  # type: object
-                csv_writer.writerow(result3)
-
-        with open(output_filename[:-4] + '_qu.csv', 'wb') as output_file:
-            csv_writer = csv.writer(output_file)
-            csv_writer.writerow(['BarrierID', 'Area_sqkm', 'Ia_cm', 'CN', 'Y1','Y2','Y5','Y10','Y25','Y50','Y100','Y200','Y500'])
-            for result2 in results2:
-                csv_writer.writerow(result2)
-
-        with open(output_filename[:-4] + '_Precip.csv', 'wb') as output_file:
-            csv_writer = csv.writer(output_file)
-            csv_writer.writerow(['BarrierID', 'Area_sqkm', 'Ia_cm', 'CN', 'Y1','Y2','Y5','Y10','Y25','Y50','Y100','Y200','Y500'])
-            for result_precip in results_precip:
-                csv_writer.writerow(result_precip)
+        output_writer.write_rows(output_filename[:-4] + '_Daily.csv', ['BarrierID', 'Area_sqkm', 'S_cm', 'CN', 'Y1','Y2','Y5','Y10','Y25','Y50','Y100','Y200','Y500'], results3)
+        output_writer.write_rows(output_filename[:-4] + '_qu.csv', ['BarrierID', 'Area_sqkm', 'Ia_cm', 'CN', 'Y1','Y2','Y5','Y10','Y25','Y50','Y100','Y200','Y500'], results2)
+        output_writer.write_rows(output_filename[:-4] + '_Precip.csv', ['BarrierID', 'Area_sqkm', 'Ia_cm', 'CN', 'Y1','Y2','Y5','Y10','Y25','Y50','Y100','Y200','Y500'], results_precip)
         # Added by Jo April 1 2019 to check intermediate output
 
 
     # Also save thrown-out watersheds into another file, if there were any.
     if rainfall_adjustment == 1:  # only run first time
-        with open(skipped_filename, 'wb') as output_file:
-            csv_writer = csv.writer(output_file)
-            assert isinstance(csv_writer, object)
-            csv_writer.writerow(['BarrierID', 'Area_sqkm', 'Tc_hr', 'CN', 'Modeling_notes'])
-            for skipped in skipped_watersheds:
-                csv_writer.writerow(skipped)
+        output_writer.write_rows(skipped_filename, ['BarrierID', 'Area_sqkm', 'Tc_hr', 'CN', 'Modeling_notes'], skipped_watersheds)
 
         if (SSA == True):
-            with open(output_filename[:-19] + '_StreamStatsAreaBasedQ_CMS.csv', 'wb') as output_file:
-                csv_writer = csv.writer(output_file)
-                csv_writer.writerow(['BarrierID', 'Area_sqkm', 'Av_CM_SS_Ratio', 'Max_Ratio', 'Min_Ratio', 'Region', 'Y1.25', 'Y1.5', 'Y2', 'Y5','Y10','Y25','Y50','Y100','Y200','Y500'])
-                for SSA_Q in SSA_Qs:
-                    csv_writer.writerow(SSA_Q)
+            output_writer.write_rows(output_filename[:-19] + '_StreamStatsAreaBasedQ_CMS.csv', ['BarrierID', 'Area_sqkm', 'Av_CM_SS_Ratio', 'Max_Ratio', 'Min_Ratio', 'Region', 'Y1.25', 'Y1.5', 'Y2', 'Y5','Y10','Y25','Y50','Y100','Y200','Y500'], SSA_Qs)
@@ -0,0 +1,182 @@
+# Land-use change scenarios
+# October 2026
+#
+# This script will show how development or reforestation changes culvert performance without rerunning the
+# pipeline for each scenario:
+# a) a scenario table gives new curve numbers (and optionally times of concentration) for some watersheds under
+#    any number of named scenarios,
+# b) the SCS runoff and peak flow equations of runoffP.py are evaluated for every overridden watershed of every
+#    scenario in one batch, for current and future (15% more) rainfall, and
+# c) the flows are compared with the existing crossing capacities the same way as final_output.py.
+#
+# Watersheds a scenario does not override keep their modeled CN, Tc and return periods, so only the overridden
+# ones are computed and written.
+#
+# Scenario table columns: Scenario, BarrierID, CN and optionally Tc_hr (a blank Tc_hr keeps the modeled value).
+# When a scenario lists a watershed more than once, the last row is used.
+#
+# Inputs:  sorted watershed file and capacity output of a finished run, and the scenario table.
+# Outputs: comparison csv (one row per scenario and overridden crossing, with baseline and scenario return
+#          periods) and <output>_summary.csv (one row per scenario).
+
+import csv, sys, numpy, loader, runoffP
+
+YEARS = numpy.array([0, 1, 2, 5, 10, 25, 50, 100, 200, 500])
+RAINFALL_ADJUSTMENTS = (1.0, 1.15)  # current and future rainfall, as in Culvert_Eval.py
+
+
+# Load the modeled watersheds that have a crossing capacity (see runoffP.modeled_crossings).
+# Returns:
+#   A dictionary of arrays: barrier_id, area, tc, CN, P (watersheds x 9, mm), capacity, and 'index' (BarrierID
+#   to position).
+def load_baseline(sorted_filename, capacity_filename):
+    baseline = runoffP.modeled_crossings(sorted_filename, capacity_filename)
+    baseline['index'] = dict((barrier_id, position) for position, barrier_id in enumerate(baseline['barrier_id']))
+    return baseline
+
+
+# Load a scenario table.
+# Returns:
+#   A list of scenario names (in order of first appearance) and a list of (scenario number, BarrierID, CN, Tc)
+#   overrides, with Tc None where the modeled value is kept.
+def load_scenarios(scenario_filename):
+    with open(scenario_filename, 'r') as scenario_file:
+        header = next(csv.reader(scenario_file), [])
+    signature = [{'name': 'Scenario', 'type': str}, {'name': 'BarrierID', 'type': str},
+                 {'name': 'CN', 'type': float}]
+    if 'Tc_hr' in header:
+        signature.append({'name': 'Tc_hr', 'type': str})
+    data = loader.load(scenario_filename, signature, 1, -1)
+    for invalid in data['invalid_rows']:
+        print "Skipping scenario row " + str(invalid['row_number']) + ": " + invalid['reason_invalid']
+
+    names = []
+    numbers = {}
+    overrides = []
+    for row in data['valid_rows']:
+        tc = row.get('Tc_hr', '').strip()
+        try:
+            tc = float(tc) if tc != '' else None
+        except ValueError:
+            print "ERROR: Tc_hr '" + tc + "' for " + row['BarrierID'] + " in scenario " + row['Scenario'] \
+                + " is not a number. Bailing out."
+            sys.exit(0)
+        if not 0 < row['CN'] <= 100 or (tc is not None and tc <= 0):
+            print "ERROR: scenario " + row['Scenario'] + " gives " + row['BarrierID'] \
+                + " a CN outside 0 - 100 or a Tc that is not positive. Bailing out."
+            sys.exit(0)
+        if row['Scenario'] not in numbers:
+            numbers[row['Scenario']] = len(names)
+            names.append(row['Scenario'])
+        overrides.append((numbers[row['Scenario']], row['BarrierID'], row['CN'], tc))
+    return names, overrides
+
+
+# Highest return period (yr) each crossing passes: the one before the first storm whose flow exceeds the
+# capacity, 500 if none does (as in final_output.py).
+def max_return_period(capacity, flows):
+    overflows = capacity[:, numpy.newaxis] < flows
+    first = numpy.argmax(overflows, axis=1)
+    first[~numpy.any(overflows, axis=1)] = len(YEARS) - 1
+    return YEARS[first]
+
+
+# Current and future return periods for watersheds given by position, with the given CN and Tc.
+# Returns:
+#   Two integer arrays of return periods (yr).
+def return_periods(baseline, positions, CN, tc, peak_method='qu', rain_type='II'):
+    results = []
+    for adjustment in RAINFALL_ADJUSTMENTS:
+        flows = runoffP.peak_flows(baseline['area'][positions], tc, CN, baseline['P'][positions] * adjustment / 10,
+                                   peak_method, rain_type, baseline['qu'])
+        results.append(max_return_period(baseline['capacity'][positions], flows))
+    return results
+
+
+# Evaluate a scenario table.
+# Parameters:
+#   sorted_filename: sorted watershed file (runoffP input).
+#   capacity_filename: capacity output file.
+#   scenario_filename: scenario table csv.
+#   output_filename: comparison csv to write (the per-scenario summary goes next to it, ending in _summary.csv).
+#   peak_method, rain_type, qu_table: as for runoffP.calculate.
+# Returns:
+#   A list of the summary rows.
+def evaluate(sorted_filename, capacity_filename, scenario_filename, output_filename,
+             peak_method='qu', rain_type='II', qu_table=''):
+    if peak_method not in ('qu', 'tr55') or rain_type not in runoffP.TR55_GRIDS:
+        print "ERROR: unknown peak method '" + str(peak_method) + "' or rainfall type '" + str(rain_type) \
+            + "' (use qu or tr55, and I, IA, II or III). Bailing out."
+        sys.exit(0)
+    baseline = load_baseline(sorted_filename, capacity_filename)
+    baseline['qu'] = runoffP.qu_coefficients(qu_table)
+    names, overrides = load_scenarios(scenario_filename)
+
+    # One entry per (scenario, watershed) pair; later rows of a scenario replace earlier ones.
+    pairs = {}
+    for scenario, barrier_id, CN, tc in overrides:
+        if barrier_id not in baseline['index']:
+            print "Did not find modeled watershed and crossing for barrierID " + barrier_id
+            print "Skipping it in scenario " + names[scenario]
+            continue
+        pairs[(scenario, baseline['index'][barrier_id])] = (CN, tc)
+    keys = sorted(pairs)
+    scenario = numpy.array([key[0] for key in keys], dtype=int)
+    positions = numpy.array([key[1] for key in keys], dtype=int)
+    CN = numpy.array([pairs[key][0] for key in keys], dtype=float)
+    tc = numpy.array([baseline['tc'][key[1]] if pairs[key][1] is None else pairs[key][1] for key in keys],
+                     dtype=float)
+
+    # Baseline and every scenario override as one batch each.
+    base_current, base_future = return_periods(baseline, positions, baseline['CN'][positions],
+                                               baseline['tc'][positions], peak_method, rain_type)
+    current, future = return_periods(baseline, positions, CN, tc, peak_method, rain_type)
+
+    header = ['Scenario', 'BarrierID', 'Capacity (m^3/s)', 'Baseline CN', 'Scenario CN',
+                             'Baseline Tc (hr)', 'Scenario Tc (hr)', 'Baseline Current Max Return (yr)',
+                             'Scenario Current Max Return (yr)', 'Baseline Future Max Return (yr)',
+                             'Scenario Future Max Return (yr)']
+    with open(output_filename, 'wb') as output_file:
+        csv_writer = csv.writer(output_file)
+        csv_writer.writerow(header)
+        for row in range(len(keys)):
+            position = positions[row]
+            csv_writer.writerow([names[scenario[row]], baseline['barrier_id'][position],
+                                 baseline['capacity'][position], baseline['CN'][position], CN[row],
+                                 baseline['tc'][position], tc[row], base_current[row], current[row],
+                                 base_future[row], future[row]])
+
+    # Per scenario counts of crossings that lose or gain capacity, and of crossings passing less than the 10 yr
+    # storm (current rainfall) before and after.
+    count = len(names)
+    overridden = numpy.bincount(scenario, minlength=count)
+    lower = numpy.bincount(scenario, weights=current < base_current, minlength=count).astype(int)
+    higher = numpy.bincount(scenario, weights=current > base_current, minlength=count).astype(int)
+    future_lower = numpy.bincount(scenario, weights=future < base_future, minlength=count).astype(int)
+    base_failing = numpy.sum(max_return_period(baseline['capacity'], runoffP.peak_flows(
+        baseline['area'], baseline['tc'], baseline['CN'], baseline['P'] / 10, peak_method, rain_type,
+        baseline['qu'])) < 10)
+    failing = base_failing + numpy.bincount(scenario, weights=(current < 10).astype(int) - (base_current < 10),
+                                            minlength=count).astype(int)
+    summary = [[names[index], overridden[index], lower[index], higher[index], future_lower[index], base_failing,
+                failing[index]] for index in range(count)]
+    with open(output_filename[:-4] + '_summary.csv', 'wb') as summary_file:
+        csv_writer = csv.writer(summary_file)
+        csv_writer.writerow(['Scenario', 'Watersheds Changed', 'Crossings Lower (current)',
+                             'Crossings Higher (current)', 'Crossings Lower (future)',
+                             'Crossings Under 10 yr (baseline)', 'Crossings Under 10 yr (scenario)'])
+        for row in summary:
+            csv_writer.writerow(row)
+    return summary
+
+
+if __name__ == '__main__':
+    print('Cornell Culvert Evaluation Model - land-use change scenarios')
+    print('-------------------------------------------------------------\n')
+
+    FileNm = raw_input("Please enter your data file prefix, which should also be your data folder name: \n")
+    ScenarioFile = raw_input("Path to the scenario table (Scenario, BarrierID, CN and optionally Tc_hr): \n")
+    output_prefix = "../" + FileNm + "/" + FileNm + "_Model_Output/" + FileNm + "_"
+    evaluate(output_prefix + 'sorted_ws.csv', output_prefix + 'capacity_output.csv', ScenarioFile,
+             output_prefix + 'scenarios.csv')
+    print "\nDone! The scenario comparison can be found here:\n" + output_prefix + 'scenarios.csv'
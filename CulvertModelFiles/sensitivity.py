@@ -0,0 +1,380 @@
+# Global sensitivity analysis of the culvert model
+# October 2026
+#
+# This script will find which inputs drive the return period each culvert can pass.
+# It takes the sorted watershed and culvert geometry files of a finished run, perturbs the inputs
+# with a Morris (elementary effects) or Saltelli (Sobol indices) sample design, and re-runs the runoffP
+# and capacity calculations for every culvert and every sample as one array computation.
+#
+# Every parameter is a multiplier on the value each culvert already has (1 = the value used in the run):
+#   CN, Tc, Area:       watershed curve number (capped at 100), time of concentration and area
+#   HW:                 hydraulic head above the culvert invert
+#   Dimensions:         culvert height D (the cross-sectional area scales with its square)
+#   c, Y, ks:           FHWA inlet control coefficients from capacity_prep
+#   Const0, Const1:     qu ("Peak multiplier") coefficients in runoffP
+#   Rainfall:           multiplier on the run's rainfall (current or future)
+#
+# The model output is the return period each crossing can pass, interpolated between the modeled storms
+# in log space so it varies smoothly (log10 of the years; 0 if it overflows at the 1 yr storm, log10(500)
+# if it never overflows, as in final_output). Rounding it down to the modeled storms gives the final_output value.
+#
+# Samples are evaluated in chunks small enough to fit in memory, and the chunks are spread over worker processes.
+# Finished chunks are checkpointed (see checkpoint.py), so a long run that fails can be resumed.
+#
+# Outputs: <prefix>sensitivity_culverts.csv - indices for every crossing and parameter
+#          <prefix>sensitivity_summary.csv  - indices of the inventory mean (log10) return period for every parameter,
+#                                             and the number of crossings for which each parameter matters most
+
+import os, sys, numpy, records, runoffP, output_writer, checkpoint
+
+PARAMETERS = [
+    {'name': 'CN', 'low': 0.9, 'high': 1.1},
+    {'name': 'Tc', 'low': 0.5, 'high': 1.5},
+    {'name': 'Area', 'low': 0.9, 'high': 1.1},
+    {'name': 'HW', 'low': 0.8, 'high': 1.2},
+    {'name': 'Dimensions', 'low': 0.9, 'high': 1.1},
+    {'name': 'c', 'low': 0.9, 'high': 1.1},
+    {'name': 'Y', 'low': 0.9, 'high': 1.1},
+    {'name': 'ks', 'low': 0.5, 'high': 1.5},
+    {'name': 'Const0', 'low': 0.9, 'high': 1.1},
+    {'name': 'Const1', 'low': 0.9, 'high': 1.1},
+    {'name': 'Rainfall', 'low': 0.9, 'high': 1.1}
+]
+
+YEARS = numpy.array([1, 2, 5, 10, 25, 50, 100, 200, 500])
+LOG_YEARS = numpy.log10(YEARS)
+KU = 1.811  # adjustment factor for units (SI=1.811), as in capacity.py
+MAX_CELLS = 20000000  # Largest samples x (watersheds x storms + culverts) block evaluated at once
+
+
+# Load the inputs of a finished run as arrays.
+# Parameters:
+#   sorted_filename: sorted watershed file (runoffP input).
+#   culvert_geometry_filename: culvert geometry file (capacity input).
+#   rainfall_adjustment: rainfall multiplier of the run (1 for current, 1.15 for future).
+#   qu_table: as for runoffP.calculate.
+# Returns:
+#   A dictionary of numpy arrays (one entry per watershed, culvert or crossing) and the crossing BarrierIDs.
+def load_model(sorted_filename, culvert_geometry_filename, rainfall_adjustment=1.0, qu_table=''):
+    watershed_signature = [{'name': 'BarrierID', 'type': str}, {'name': 'Area_sqkm', 'type': float},
+                           {'name': 'Tc_hr', 'type': float}, {'name': 'CN', 'type': float}] \
+        + [{'name': 'P' + str(year), 'type': float} for year in YEARS]
+    geometry_signature = [
+        {'name': 'BarrierID', 'type': str},
+        {'name': 'HW_m', 'type': float},
+        {'name': 'xArea_sqm', 'type': float},
+        {'name': 'D_m', 'type': float},
+        {'name': 'c', 'type': float},
+        {'name': 'Y', 'type': float},
+        {'name': 'ks', 'type': float},
+        {'name': 'Culvert_Sl', 'type': float},
+        {'name': 'Flags', 'type': int}
+    ]
+    watersheds = records.load(sorted_filename, watershed_signature, 1, -1)['table']
+    culverts = records.load(culvert_geometry_filename, geometry_signature, 1, -1)['table']
+
+    # Watersheds runoffP would skip (CN or Tc of 0, area < 0.01 sq km) are left out here too.
+    area = watersheds.column('Area_sqkm')
+    tc = watersheds.column('Tc_hr')
+    CN = watersheds.column('CN')
+    modeled = (CN != 0) & (tc != 0) & (area >= 0.01)
+    watershed_lookup = {}
+    for index, barrier_id in enumerate(watersheds.strings('BarrierID')):
+        if modeled[index]:
+            watershed_lookup[barrier_id] = index
+
+    # Group the culverts at each crossing the same way as capacity.py (Flags = number of culverts at the crossing).
+    culvert_ids = culverts.strings('BarrierID')
+    flags = culverts.column('Flags')
+    culvert_index = []
+    crossing_start = []
+    crossing_watershed = []
+    crossing_ids = []
+    index = 0
+    while index < len(culverts):
+        num_culverts_here = max(int(flags[index]), 1)
+        group = range(index, min(index + num_culverts_here, len(culverts)))
+        if culvert_ids[index] in watershed_lookup:
+            crossing_start.append(len(culvert_index))
+            culvert_index.extend(group)
+            crossing_watershed.append(watershed_lookup[culvert_ids[index]])
+            crossing_ids.append(culvert_ids[index])
+        index += num_culverts_here
+    if len(crossing_ids) == 0:
+        print "ERROR: none of the culverts in '" + culvert_geometry_filename + "' have a modeled watershed in '" \
+            + sorted_filename + "' (nothing to analyze). Bailing out."
+        sys.exit(0)
+
+    # Only keep the watersheds that drain to a modeled crossing.
+    used_watersheds, crossing_watershed = numpy.unique(numpy.array(crossing_watershed, dtype=int), return_inverse=True)
+    culvert_index = numpy.array(culvert_index, dtype=int)
+    Const0, Const1 = runoffP.qu_coefficients(qu_table)
+    return {
+        'BarrierID': crossing_ids,
+        'rainfall_adjustment': rainfall_adjustment,
+        'Const0': Const0,
+        'Const1': Const1,
+        'area': area[used_watersheds],
+        'tc': tc[used_watersheds],
+        'CN': CN[used_watersheds],
+        'P': numpy.column_stack([watersheds.column('P' + str(year))[used_watersheds] for year in YEARS]),
+        'HW': culverts.column('HW_m')[culvert_index],
+        'xArea': culverts.column('xArea_sqm')[culvert_index],
+        'D': culverts.column('D_m')[culvert_index],
+        'c': culverts.column('c')[culvert_index],
+        'Y': culverts.column('Y')[culvert_index],
+        'ks': culverts.column('ks')[culvert_index],
+        'S': culverts.column('Culvert_Sl')[culvert_index],
+        'crossing_start': numpy.array(crossing_start, dtype=int),
+        'crossing_watershed': crossing_watershed
+    }
+
+
+# Continuous return period (log10 years) a crossing can pass, for all samples and crossings at once.
+# Parameters:
+#   capacity: array (samples, crossings) of crossing capacities (m^3/s).
+#   flows: array (samples, crossings, storms) of peak flows (m^3/s) for the 1 to 500 yr storms.
+def return_period(capacity, flows):
+    with numpy.errstate(invalid='ignore'):
+        overflows = capacity[:, :, numpy.newaxis] < flows  # A NaN capacity never overflows, as in final_output
+    overflowed = numpy.any(overflows, axis=2)
+    first = numpy.argmax(overflows, axis=2)
+    previous = numpy.maximum(first - 1, 0)
+    flow_below = numpy.take_along_axis(flows, previous[:, :, numpy.newaxis], axis=2)[:, :, 0]
+    flow_above = numpy.take_along_axis(flows, first[:, :, numpy.newaxis], axis=2)[:, :, 0]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        fraction = numpy.clip((capacity - flow_below) / (flow_above - flow_below), 0, 1)
+    fraction = numpy.where(numpy.isnan(fraction), 0, fraction)
+    interpolated = LOG_YEARS[previous] + fraction * (LOG_YEARS[first] - LOG_YEARS[previous])
+    result = numpy.where(first == 0, 0.0, interpolated)
+    return numpy.where(overflowed, result, LOG_YEARS[-1])
+
+
+# Run the runoffP and capacity calculations for a block of samples.
+# Parameters:
+#   model: dictionary from load_model.
+#   multipliers: array (samples, parameters) of multipliers, in the order of parameters.
+#   parameters: list of parameter dictionaries (see PARAMETERS).
+# Returns:
+#   An array (samples, crossings) of log10 return periods.
+def evaluate(model, multipliers, parameters=PARAMETERS):
+    multipliers = numpy.atleast_2d(multipliers)
+    columns = dict((parameter['name'], multipliers[:, i][:, numpy.newaxis]) for i, parameter in enumerate(parameters))
+    unchanged = numpy.ones((len(multipliers), 1))
+
+    def multiplier(name):
+        return columns.get(name, unchanged)
+
+    # Runoff (same steps as runoffP.calculate), arrays are (samples, watersheds, storms).
+    CN = numpy.minimum(model['CN'] * multiplier('CN'), 100.0)[:, :, numpy.newaxis]
+    tc = (model['tc'] * multiplier('Tc'))[:, :, numpy.newaxis]
+    area = (model['area'] * multiplier('Area'))[:, :, numpy.newaxis]
+    P = model['P'][numpy.newaxis] * (model['rainfall_adjustment'] * multiplier('Rainfall'))[:, :, numpy.newaxis] / 10
+    Storage = 0.1 * ((25400.0 / CN) - 254.0)
+    Ia = 0.2 * Storage
+    Pe = numpy.maximum(P - Ia, 0)
+    Q = (Pe ** 2) / (P + (Storage - Ia))
+    Const0 = model['Const0'] * multiplier('Const0')[:, :, numpy.newaxis]
+    Const1 = model['Const1'] * multiplier('Const1')[:, :, numpy.newaxis]
+    qu = numpy.maximum((Const0 - Const1 * tc) / 8.64, 0.14)
+    flows = Q * qu * area
+
+    # Capacity (same as capacity.inlet_control), arrays are (samples, culverts), summed over each crossing.
+    D = model['D'] * multiplier('Dimensions')
+    Culvert_Area = model['xArea'] * multiplier('Dimensions') ** 2
+    HW = model['HW'] * multiplier('HW')
+    Y = model['Y'] * multiplier('Y')
+    Ks = model['ks'] * multiplier('ks')
+    c = model['c'] * multiplier('c')
+    with numpy.errstate(invalid='ignore'):
+        Qc = (Culvert_Area * numpy.sqrt(D * ((HW / D) - Y - Ks * model['S']) / c)) / KU
+    capacity = numpy.add.reduceat(Qc, model['crossing_start'], axis=1)
+
+    return return_period(capacity, flows[:, model['crossing_watershed'], :])
+
+
+# Worker wrapper so evaluate can be used with multiprocessing.Pool.
+def evaluate_job(job):
+    model, multipliers, parameters = job
+    return evaluate(model, multipliers, parameters)
+
+
+# Evaluate all samples, in memory-sized chunks spread over worker processes.
+# Parameters:
+#   model, multipliers, parameters: as for evaluate.
+#   processes: number of worker processes (defaults to the number of cores, 1 to run in this process).
+#   state: checkpoint to save finished chunks in (see checkpoint.py), or None.
+def evaluate_batched(model, multipliers, parameters=PARAMETERS, processes=None, state=None):
+    cells_per_sample = len(model['area']) * len(YEARS) + len(model['D']) + len(model['BarrierID']) * len(YEARS)
+    chunk = max(1, MAX_CELLS // max(cells_per_sample, 1))
+    jobs = [(model, multipliers[start:start + chunk], parameters) for start in range(0, len(multipliers), chunk)]
+    results = checkpoint.map_chunks(evaluate_job, jobs, state, 'sample chunks', processes)
+    return numpy.concatenate(results, axis=0)
+
+
+# Scale samples from the unit cube to the parameter ranges.
+def scale(unit_samples, parameters=PARAMETERS):
+    low = numpy.array([parameter['low'] for parameter in parameters])
+    high = numpy.array([parameter['high'] for parameter in parameters])
+    return low + unit_samples * (high - low)
+
+
+# Morris sample design: trajectories that change one parameter at a time by delta on a grid of levels.
+# Parameters:
+#   num_trajectories: number of trajectories (r).
+#   num_parameters: number of parameters (k).
+#   num_levels: number of grid levels per parameter (even).
+#   seed: random seed.
+# Returns:
+#   A dictionary with 'samples' (r*(k+1), k) in the unit cube, 'order' (r, k) the parameter changed at each step
+#   and 'steps' (r, k) the signed step of each parameter.
+def morris_design(num_trajectories, num_parameters, num_levels=4, seed=None):
+    random = numpy.random.RandomState(seed)
+    delta = num_levels / (2.0 * (num_levels - 1))
+    start_levels = numpy.arange(num_levels // 2) / (num_levels - 1.0)  # Levels from which +delta stays inside [0, 1]
+    points = numpy.empty((num_trajectories, num_parameters + 1, num_parameters))
+    order = numpy.empty((num_trajectories, num_parameters), dtype=int)
+    steps = numpy.empty((num_trajectories, num_parameters))
+    for trajectory in range(num_trajectories):
+        direction = random.choice([-1.0, 1.0], num_parameters)
+        point = random.choice(start_levels, num_parameters) + numpy.where(direction < 0, delta, 0)
+        order[trajectory] = random.permutation(num_parameters)
+        steps[trajectory] = direction * delta
+        points[trajectory, 0] = point
+        for step, parameter in enumerate(order[trajectory]):
+            point = point.copy()
+            point[parameter] += steps[trajectory, parameter]
+            points[trajectory, step + 1] = point
+    return {'samples': points.reshape(-1, num_parameters), 'order': order, 'steps': steps}
+
+
+# Morris indices from the outputs of a Morris design.
+# Parameters:
+#   design: dictionary from morris_design.
+#   outputs: array (samples, ...) of model outputs, in design order.
+# Returns:
+#   A dictionary of arrays (parameters, ...): 'Mu_star' (mean absolute elementary effect), 'Mu' and 'Sigma'.
+#   Elementary effects are per unit of each parameter's range.
+def morris_indices(design, outputs):
+    num_trajectories, num_parameters = design['order'].shape
+    outputs = outputs.reshape((num_trajectories, num_parameters + 1) + outputs.shape[1:])
+    changes = outputs[:, 1:] - outputs[:, :-1]
+    trajectory = numpy.arange(num_trajectories)[:, numpy.newaxis]
+    step_sizes = design['steps'][trajectory, design['order']]
+    effects = numpy.empty_like(changes)
+    effects[trajectory, design['order']] = changes / step_sizes.reshape(step_sizes.shape + (1,) * (changes.ndim - 2))
+    return {
+        'Mu_star': numpy.mean(numpy.abs(effects), axis=0),
+        'Mu': numpy.mean(effects, axis=0),
+        'Sigma': numpy.std(effects, axis=0, ddof=1 if num_trajectories > 1 else 0)
+    }
+
+
+# Saltelli sample design for Sobol indices: base matrices A and B, then A with each column taken from B.
+# Returns:
+#   An array ((k+2)*num_base, k) in the unit cube: A, B, AB_1 ... AB_k.
+def saltelli_design(num_base, num_parameters, seed=None):
+    random = numpy.random.RandomState(seed)
+    A = random.rand(num_base, num_parameters)
+    B = random.rand(num_base, num_parameters)
+    blocks = [A, B]
+    for parameter in range(num_parameters):
+        AB = A.copy()
+        AB[:, parameter] = B[:, parameter]
+        blocks.append(AB)
+    return numpy.vstack(blocks)
+
+
+# First-order and total Sobol indices (Saltelli 2010 / Jansen estimators) from the outputs of a Saltelli design.
+# Returns:
+#   A dictionary of arrays (parameters, ...): 'S1' and 'ST'. Outputs that never vary get indices of 0.
+def sobol_indices(outputs, num_base, num_parameters):
+    outputs = outputs.reshape((num_parameters + 2, num_base) + outputs.shape[1:])
+    outputs = outputs - numpy.mean(outputs[:2], axis=(0, 1))  # Centering cuts the estimator noise
+    output_A = outputs[0]
+    output_B = outputs[1]
+    variance = numpy.var(numpy.concatenate([output_A, output_B], axis=0), axis=0)
+    first = numpy.array([numpy.mean(output_B * (outputs[i + 2] - output_A), axis=0) for i in range(num_parameters)])
+    total = numpy.array([0.5 * numpy.mean((output_A - outputs[i + 2]) ** 2, axis=0) for i in range(num_parameters)])
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        first = numpy.where(variance > 0, first / variance, 0.0)
+        total = numpy.where(variance > 0, total / variance, 0.0)
+    return {'S1': first, 'ST': total}
+
+
+# Run a sensitivity analysis and save the results.
+# Parameters:
+#   sorted_filename, culvert_geometry_filename, rainfall_adjustment, qu_table: as for load_model.
+#   output_prefix: path and filename prefix for the output files.
+#   method: 'morris' or 'sobol'.
+#   num_samples: Morris trajectories, or Saltelli base samples (runs = num_samples * (parameters + 2)).
+#   parameters: list of parameter dictionaries (see PARAMETERS).
+#   processes: number of worker processes.
+#   seed: random seed for the sample design.
+#   resume: True to reuse the chunks a failed run with the same inputs and settings finished.
+# Returns:
+#   The summary index dictionary (inventory mean return period).
+def analyze(sorted_filename, culvert_geometry_filename, output_prefix, method='morris', num_samples=20,
+            rainfall_adjustment=1.0, parameters=PARAMETERS, processes=None, seed=0, resume=False, qu_table=''):
+    state = checkpoint.open_checkpoint(output_prefix + 'sensitivity_checkpoint.json', checkpoint.signature(
+        [method, num_samples, rainfall_adjustment, parameters, seed, MAX_CELLS, qu_table],
+        [sorted_filename, culvert_geometry_filename] + ([qu_table] if qu_table else [])), resume)
+    model = load_model(sorted_filename, culvert_geometry_filename, rainfall_adjustment, qu_table)
+    num_parameters = len(parameters)
+
+    if method == 'morris':
+        design = morris_design(num_samples, num_parameters, seed=seed)
+        unit_samples = design['samples']
+    else:
+        unit_samples = saltelli_design(num_samples, num_parameters, seed)
+    print " * Evaluating " + str(len(unit_samples)) + " samples for " + str(len(model['BarrierID'])) + " crossings."
+    outputs = evaluate_batched(model, scale(unit_samples, parameters), parameters, processes, state)
+    inventory = numpy.mean(outputs, axis=1)  # Inventory mean log10 return period for each sample
+
+    if method == 'morris':
+        culvert_indices = morris_indices(design, outputs)
+        summary = morris_indices(design, inventory)
+        index_names = ['Mu_star', 'Mu', 'Sigma']
+    else:
+        culvert_indices = sobol_indices(outputs, num_samples, num_parameters)
+        summary = sobol_indices(inventory, num_samples, num_parameters)
+        index_names = ['S1', 'ST']
+    ranking = index_names[-1] if method == 'sobol' else index_names[0]  # Mu_star or ST
+
+    # Per crossing: one row per crossing and parameter.
+    names = [parameter['name'] for parameter in parameters]
+    num_crossings = len(model['BarrierID'])
+    output_writer.write(output_prefix + 'sensitivity_culverts.csv', ['BarrierID', 'Parameter'] + index_names,
+                        [numpy.repeat(numpy.array(model['BarrierID'], dtype=object), num_parameters),
+                         names * num_crossings]
+                        + [culvert_indices[name].T.ravel() for name in index_names])
+
+    # Inventory summary, with how many crossings each parameter matters most for.
+    most_sensitive = numpy.argmax(culvert_indices[ranking], axis=0)
+    varies = numpy.any(culvert_indices[ranking] > 0, axis=0)
+    counts = numpy.bincount(most_sensitive[varies], minlength=num_parameters)
+    output_writer.write(output_prefix + 'sensitivity_summary.csv',
+                        ['Parameter', 'Low', 'High'] + index_names + ['Crossings_Most_Sensitive'],
+                        [names, numpy.array([parameter['low'] for parameter in parameters]),
+                         numpy.array([parameter['high'] for parameter in parameters])]
+                        + [summary[name] for name in index_names] + [counts])
+    checkpoint.finish(state)
+    return summary
+
+
+if __name__ == '__main__':
+    print('Cornell Culvert Evaluation Model - sensitivity analysis')
+    print('-------------------------------------------------------\n')
+
+    FileNm = raw_input("Please enter your data file prefix, which should also be your data folder name: \n")
+    Method = raw_input("Sensitivity method? (morris/sobol) \n")
+    Samples = int(raw_input("Number of Morris trajectories or Sobol base samples? \n"))
+    Future = raw_input("Use future rainfall (1.15 x current)? (y/n) \n")
+
+    output_prefix = "../" + FileNm + "/" + FileNm + "_Model_Output/" + FileNm + "_"
+    Resume = False
+    if os.path.exists(output_prefix + 'sensitivity_checkpoint.json'):
+        Resume = raw_input("Resume the last run, reusing the samples it finished? (y/n) \n") == 'y'
+    summary = analyze(output_prefix + "sorted_ws.csv", output_prefix + "culv_geom.csv", output_prefix, Method, Samples,
+                      1.15 if Future == 'y' else 1.0, resume=Resume)
+    print "\nDone! Sensitivity results can be found here:\n" + output_prefix + "sensitivity_summary.csv"
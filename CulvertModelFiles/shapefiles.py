@@ -0,0 +1,145 @@
+# Minimal ESRI shapefile reader
+# October 2026
+#
+# This script will read the geometry (.shp) and attribute table (.dbf) of a shapefile
+# without needing ArcGIS, so model stages can use GIS layers directly.
+# Only point and polygon layers are supported (shape types 1, 5 and their Z/M versions).
+#
+# Coordinates are returned as stored in the file, so the layer must already be in the
+# coordinate system the calling script expects (e.g. GCS NAD83 to match NAACC Lat/Long).
+
+import struct, sys, numpy
+
+POINT_TYPES = (1, 11, 21)
+POLYGON_TYPES = (5, 15, 25)
+
+
+# Read the geometry of a shapefile.
+# Parameters:
+#   shp_filename: path of the .shp file.
+# Returns:
+#   A list with one dictionary per record, in file order, containing:
+#   type: the shape type number,
+#   bbox: (xmin, ymin, xmax, ymax),
+#   parts: a list of (n, 2) numpy arrays of x, y vertices (one array for a point).
+def read_shapes(shp_filename):
+    try:
+        with open(shp_filename, 'rb') as shp_file:
+            data = shp_file.read()
+    except IOError:
+        print "ERROR: Could not find file '" \
+            + shp_filename \
+            + "'. Bailing out."
+        sys.exit(0)
+
+    shapes = []
+    offset = 100  # Skip the file header
+    while offset + 8 <= len(data):
+        content_length = struct.unpack('>i', data[offset + 4:offset + 8])[0] * 2  # in 16-bit words
+        content = data[offset + 8:offset + 8 + content_length]
+        offset += 8 + content_length
+
+        shape_type = struct.unpack('<i', content[0:4])[0]
+        if shape_type == 0:
+            shapes.append({'type': 0, 'bbox': None, 'parts': []})  # Null shape
+        elif shape_type in POINT_TYPES:
+            x, y = struct.unpack('<2d', content[4:20])
+            shapes.append({'type': shape_type, 'bbox': (x, y, x, y), 'parts': [numpy.array([[x, y]])]})
+        elif shape_type in POLYGON_TYPES:
+            bbox = struct.unpack('<4d', content[4:36])
+            num_parts, num_points = struct.unpack('<2i', content[36:44])
+            part_starts = list(struct.unpack('<%di' % num_parts, content[44:44 + 4 * num_parts]))
+            points_start = 44 + 4 * num_parts
+            points = numpy.frombuffer(content[points_start:points_start + 16 * num_points],
+                                      dtype='<f8').reshape(num_points, 2)
+            part_ends = part_starts[1:] + [num_points]
+            parts = [points[start:end] for start, end in zip(part_starts, part_ends)]
+            shapes.append({'type': shape_type, 'bbox': bbox, 'parts': parts})
+        else:
+            print "ERROR: shape type " + str(shape_type) + " in file '" \
+                + shp_filename \
+                + "' is not supported (points and polygons only). Bailing out."
+            sys.exit(0)
+
+    return shapes
+
+
+# Shape type of a shapefile layer, from the file header (also given for a layer with no shapes).
+def layer_type(shp_filename):
+    try:
+        with open(shp_filename, 'rb') as shp_file:
+            header = shp_file.read(100)
+    except IOError:
+        print "ERROR: Could not find file '" \
+            + shp_filename \
+            + "'. Bailing out."
+        sys.exit(0)
+    return struct.unpack('<i', header[32:36])[0]
+
+
+# Read the attribute table of a shapefile.
+# Parameters:
+#   dbf_filename: path of the .dbf file.
+# Returns:
+#   A list of dictionaries, one per record in file order (deleted records included so they
+#   still line up with the shapes), mapping field names to values.
+#   Numeric fields (N and F) are parsed to float (None if blank), everything else is a stripped string.
+def read_records(dbf_filename):
+    try:
+        with open(dbf_filename, 'rb') as dbf_file:
+            data = dbf_file.read()
+    except IOError:
+        print "ERROR: Could not find file '" \
+            + dbf_filename \
+            + "'. Bailing out."
+        sys.exit(0)
+
+    num_records, header_length, record_length = struct.unpack('<IHH', data[4:12])
+
+    # Field descriptors are 32 bytes each, ending with a 0x0D byte.
+    fields = []
+    position = 32
+    while data[position:position + 1] != '\r' and position < header_length - 1:
+        descriptor = data[position:position + 32]
+        name = descriptor[:11].split('\0')[0]
+        field_type = descriptor[11:12]
+        length = ord(descriptor[16:17])
+        fields.append((name, field_type, length))
+        position += 32
+
+    records = []
+    for i in range(num_records):
+        start = header_length + i * record_length
+        record = data[start:start + record_length]
+        values = {}
+        column = 1  # First byte is the deletion flag
+        for name, field_type, length in fields:
+            raw = record[column:column + length].strip()
+            column += length
+            if field_type in ('N', 'F'):
+                try:
+                    values[name] = float(raw)
+                except ValueError:
+                    values[name] = None
+            else:
+                values[name] = raw
+        records.append(values)
+
+    return records
+
+
+# Read a shapefile's geometry and attributes together.
+# Parameters:
+#   shp_filename: path of the .shp file (the .dbf must sit next to it with the same name).
+# Returns:
+#   A list of (shape, record) tuples as returned by read_shapes and read_records.
+def read(shp_filename):
+    shapes = read_shapes(shp_filename)
+    records = read_records(shp_filename[:-4] + '.dbf')
+    if len(shapes) != len(records):
+        print "ERROR: shapefile '" \
+            + shp_filename \
+            + "' has " + str(len(shapes)) + " shapes but " + str(len(records)) \
+            + " attribute records. Bailing out."
+        sys.exit(0)
+    return zip(shapes, records)
@@ -7,12 +7,26 @@
 # This script will sort the ws data exported from GIS by ID number
 # Edited 5/31/2019 by Jo to allow precipitation inputs for each watershed
 
-import csv, sys, operator, numpy, loader
+import csv, sys, re, operator, numpy, loader
 #Imports required packages and modules (numpy, os, re, csv) and the function loader
 # which was written in 2016 and saved as loader.py
 #(loader organizes the data from input file based on headers defined in a signature)
 
-def sort(watershed_data_input_filename, county_abbreviation, output_filename):
+
+# Culvert BarrierID of a watershed or culvert BarrierID, for matching one to the other: the ID number plus the
+# county abbreviation in upper case, with any 'ws' ending dropped, e.g. '10cmbws' -> '10CMB' and '10CMB' -> '10CMB'.
+def culvert_id(barrier_id):
+    barrier_id = barrier_id.strip()
+    if barrier_id.lower().endswith('ws'):
+        barrier_id = barrier_id[:-2]
+    match = re.match(r'(\d+)(.*)$', barrier_id)
+    if match:
+        return str(int(match.group(1))) + match.group(2).upper()
+    return barrier_id.upper()
+
+def sort(watershed_data_input_filename, county_abbreviation, output_filename, region_filename = None):
+    # region_filename (optional): output of region_assign.assign. When given, each watershed takes
+    # the StreamStats region of its culvert instead of the Region column of the input file.
 
     # Define signature for input file.
     # This creates a list of dictionaries that stores the relevant headers of
@@ -40,7 +54,7 @@ def sort(watershed_data_input_filename, county_abbreviation, output_filename):
     # in the format described in loader.py using the signature defined above.
     # valid_watersheds will store all value for the key 'valid_rows' in the dictionary watershed_data
     
-    watershed_data = loader.load(watershed_data_input_filename, watershed_data_signature, 1, -1)
+    watershed_data = loader.load(watershed_data_input_filename, watershed_data_signature, 1, -1, cache=True)
     valid_watersheds = watershed_data['valid_rows']
 
     # If there were invalid watershed rows, make a note but continue on.
@@ -64,6 +78,19 @@ def sort(watershed_data_input_filename, county_abbreviation, output_filename):
         return row['BarrierID']
     valid_watersheds = sorted(valid_watersheds, key = get_id, reverse = False)
 
+    # Replace the run-wide region with each culvert's own region, if regions were assigned.
+    if region_filename:
+        region_signature = [
+            {'name': 'BarrierID', 'type': str},
+            {'name': 'Region', 'type': float}
+        ];
+        region_rows = loader.load(region_filename, region_signature, 1, -1)['valid_rows']
+        region_lookup = {}
+        for row in region_rows:
+            region_lookup[row['BarrierID']] = row['Region']
+        for watershed in valid_watersheds:
+            watershed['Region'] = region_lookup.get(str(watershed['BarrierID']) + county_abbreviation, watershed['Region'])
+
     # Write the sorted data to a new csv file.
     with open(output_filename, 'wb') as output_file:
         output_writer = csv.writer(output_file)
@@ -0,0 +1,292 @@
+# Statewide sharded culvert evaluation
+# October 2026
+#
+# This script will run one evaluation over a statewide inventory made by concatenating county data folders.
+# The combined inventory is split into shards (one per county, or one per square Lat/Long tile),
+# the runoff, geometry, capacity and return period stages are run on each shard in a separate
+# worker process, and the shard results are merged into one statewide output.
+#
+# BarrierIDs are only unique within a county (<n><ABC>, and e.g. Schenectady, Schoharie and Schuyler
+# all abbreviate to SCH), so every culvert and watershed is given the statewide ID <County>-<BarrierID>
+# before the stages run. Rows are sorted by county and BarrierID number inside each shard, and shards
+# are merged in name order, so the statewide output is the same however many workers are used.
+#
+# Each worker only loads its own shard, and is replaced after every shard, so memory per worker
+# is bounded by shard size.
+#
+# Inputs:  the county data folders, each set up as for Culvert_Eval (NAACC_field_data.csv, not_extracted.csv,
+#          and All_Culverts_All.csv from Precip_Append or an All_Culverts.csv that already has P1-P500 and Region)
+#
+# Outputs: statewide model_output, return_periods, not_modeled, skipped_culverts and
+#          StreamStatsAreaBasedQ_CMS csv files, with BarrierID holding the statewide ID, and the inventory
+#          summary (summary.npz and summary_*.csv), merged from the shard summaries (see inventory_summary.py),
+#          and the replacement priority lists, merged from the shard top lists (see prioritize.py).
+
+import os, re, csv, math
+import runoffP, capacity_prep, capacity, final_output, checkpoint, inventory_summary, prioritize
+
+SORTED_WS_HEADER = ['BarrierID', 'Area_sqkm', 'Tc_hr', 'CN', 'P1', 'P2', 'P5', 'P10', 'P25', 'P50', 'P100', 'P200',
+                    'P500', 'Region']
+MERGED_OUTPUTS = ['model_output.csv', 'return_periods.csv', 'not_modeled.csv', 'skipped_culverts.csv',
+                  'StreamStatsAreaBasedQ_CMS.csv']
+NOT_MODELED_HEADER = ['Survey_ID', 'NAACC_ID', 'Lat', 'Long', 'Modeling_notes', 'Area_sqkm', 'Tc_hr', 'CN',
+                      'BarrierID', 'Comments']
+
+
+# Helpers to take BarrierIDs apart, e.g. '12ALBws' -> 12 and '12ALB'.
+def barrier_number(barrier_id):
+    return int(re.match(r'\d+', barrier_id).group())
+
+
+def culvert_barrier_id(barrier_id):
+    if barrier_id.endswith('ws'):
+        return barrier_id[:-2]
+    return barrier_id
+
+
+def statewide_id(county, barrier_id):
+    return county + '-' + culvert_barrier_id(barrier_id)
+
+
+# Sort key for statewide IDs: county name, then BarrierID number.
+def statewide_sort_key(state_id):
+    county, barrier_id = state_id.rsplit('-', 1)
+    return (county, barrier_number(barrier_id))
+
+
+# Concatenate county data folders into one statewide inventory, adding a County column.
+# Parameters:
+#   data_folders: list of data folder names (e.g. ['ALB', 'SCH']), relative to runs_path.
+#   combined_prefix: path and filename prefix for the combined files.
+#   runs_path: folder holding the data folders (Culvert_Eval uses '../').
+# Returns:
+#   The combined field data, watershed and not extracted filenames.
+def combine(data_folders, combined_prefix, runs_path='../'):
+    combined = {
+        'field_data': combined_prefix + '_field_data.csv',
+        'watersheds': combined_prefix + '_watersheds.csv',
+        'not_extracted': combined_prefix + '_not_extracted.csv'
+    }
+    writers = {}
+    files = {}
+    try:
+        for folder in data_folders:
+            data_path = runs_path + folder + '/'
+            watershed_filename = data_path + 'All_Culverts_All.csv'
+            if not os.path.exists(watershed_filename):
+                watershed_filename = data_path + 'All_Culverts.csv'
+            sources = {
+                'field_data': data_path + folder + '_field_data.csv',
+                'watersheds': watershed_filename,
+                'not_extracted': data_path + folder + '_not_extracted.csv'
+            }
+            for kind in ['field_data', 'watersheds', 'not_extracted']:
+                with open(sources[kind], 'r') as input_file:
+                    reader = csv.DictReader(input_file)
+                    if kind not in writers:
+                        files[kind] = open(combined[kind], 'wb')
+                        writers[kind] = csv.DictWriter(files[kind], ['County'] + reader.fieldnames,
+                                                       restval='', extrasaction='ignore')
+                        writers[kind].writeheader()
+                    for row in reader:
+                        row['County'] = folder
+                        writers[kind].writerow(row)
+    finally:
+        for output_file in files.values():
+            output_file.close()
+    return combined['field_data'], combined['watersheds'], combined['not_extracted']
+
+
+# Split a combined inventory into shard folders.
+# Parameters:
+#   field_data_filename, watershed_filename: combined files from combine (with a County column).
+#   shard_path: folder to create the shard folders in.
+#   by: 'county' for one shard per county, or 'tile' for square Lat/Long tiles.
+#   tile_size: tile width in degrees when by == 'tile'.
+# Returns:
+#   The sorted list of shard names. Each shard folder <shard_path>/<shard>/ holds
+#   <shard>_field_data.csv, <shard>_sorted_ws.csv and an empty <shard>_not_extracted.csv.
+def partition(field_data_filename, watershed_filename, shard_path, by='county', tile_size=0.5):
+    shard_of_crossing = {}  # (County, Survey_ID) -> shard, so all barrels of a crossing stay together
+    shard_of_culvert = {}  # statewide ID -> shard, used to route the watersheds
+    writers = {}
+    files = []
+
+    def shard_writer(shard, kind, header):
+        if (shard, kind) not in writers:
+            shard_folder = shard_path + shard + '/'
+            if not os.path.exists(shard_folder):
+                os.makedirs(shard_folder)
+            shard_file = open(shard_folder + shard + '_' + kind + '.csv', 'wb')
+            files.append(shard_file)
+            writers[(shard, kind)] = csv.DictWriter(shard_file, header, restval='', extrasaction='ignore')
+            writers[(shard, kind)].writeheader()
+        return writers[(shard, kind)]
+
+    try:
+        with open(field_data_filename, 'r') as field_file:
+            reader = csv.DictReader(field_file)
+            for row in reader:
+                crossing = (row['County'], row['Survey_ID'])
+                if crossing not in shard_of_crossing:
+                    if by == 'tile':
+                        shard_of_crossing[crossing] = 'tile_%d_%d' % (
+                            math.floor(float(row['Lat']) / tile_size), math.floor(float(row['Long']) / tile_size))
+                    else:
+                        shard_of_crossing[crossing] = row['County']
+                shard = shard_of_crossing[crossing]
+                row['BarrierID'] = statewide_id(row['County'], row['BarrierID'])
+                shard_of_culvert[row['BarrierID']] = shard
+                shard_writer(shard, 'field_data', reader.fieldnames).writerow(row)
+                shard_writer(shard, 'not_extracted', reader.fieldnames)
+
+        with open(watershed_filename, 'r') as watershed_file:
+            for row in csv.DictReader(watershed_file):
+                row['BarrierID'] = statewide_id(row['County'], row['BarrierID'])
+                if row['BarrierID'] not in shard_of_culvert:
+                    continue  # No culvert left for this watershed after extraction
+                shard_writer(shard_of_culvert[row['BarrierID']], 'sorted_ws', SORTED_WS_HEADER).writerow(row)
+    finally:
+        for shard_file in files:
+            shard_file.close()
+
+    return sorted(set(shard_of_crossing.values()))
+
+
+# Sort a shard's csv file in place by statewide ID.
+def sort_shard_file(filename):
+    with open(filename, 'r') as input_file:
+        reader = csv.reader(input_file)
+        header = next(reader)
+        rows = list(reader)
+    id_index = header.index('BarrierID')
+    rows.sort(key=lambda row: statewide_sort_key(row[id_index]))
+    with open(filename, 'wb') as output_file:
+        csv_writer = csv.writer(output_file)
+        csv_writer.writerow(header)
+        for row in rows:
+            csv_writer.writerow(row)
+
+
+# Run the model stages for one shard (called in a worker process).
+# Parameters:
+#   job: (shard_path, shard, qu_table) tuple.
+# Returns:
+#   The shard name.
+def run_shard(job):
+    shard_path, shard, qu_table = job
+    prefix = shard_path + shard + '/' + shard + '_'
+    sort_shard_file(prefix + 'field_data.csv')
+    if os.path.exists(prefix + 'sorted_ws.csv'):
+        sort_shard_file(prefix + 'sorted_ws.csv')
+    else:
+        with open(prefix + 'sorted_ws.csv', 'wb') as output_file:
+            csv.writer(output_file).writerow(SORTED_WS_HEADER)
+
+    runoffP.calculate(prefix + 'sorted_ws.csv', 1.0, prefix + 'current_runoff.csv', prefix + 'skipped_culverts.csv',
+                      qu_table=qu_table)
+    runoffP.calculate(prefix + 'sorted_ws.csv', 1.15, prefix + 'future_runoff.csv', qu_table=qu_table)
+    capacity_prep.geometry(prefix + 'field_data.csv', prefix + 'culv_geom.csv')
+    capacity.inlet_control(prefix + 'culv_geom.csv', prefix + 'capacity_output.csv')
+    final_output.final_output(prefix + 'capacity_output.csv', prefix + 'current_runoff.csv',
+                              prefix + 'future_runoff.csv', prefix + 'model_output.csv', prefix + 'field_data.csv',
+                              prefix + 'not_extracted.csv', prefix)
+    inventory_summary.summarize(prefix + 'model_output.csv', prefix + 'field_data.csv', prefix)
+    prioritize.rank(prefix + 'model_output.csv', prefix + 'field_data.csv', prefix)
+    return shard
+
+
+# Concatenate the shard outputs, in shard name order, into the statewide outputs.
+# Parameters:
+#   shard_path: folder holding the shard folders.
+#   shards: sorted list of shard names.
+#   output_prefix: path and filename prefix for the statewide outputs.
+#   not_extracted_filename: combined not extracted file, appended to the statewide not_modeled file.
+def merge(shard_path, shards, output_prefix, not_extracted_filename=None):
+    for name in MERGED_OUTPUTS:
+        header = None
+        with open(output_prefix + name, 'wb') as output_file:
+            csv_writer = csv.writer(output_file)
+            for shard in shards:
+                shard_filename = shard_path + shard + '/' + shard + '_' + name
+                if not os.path.exists(shard_filename):
+                    continue
+                with open(shard_filename, 'r') as shard_file:
+                    reader = csv.reader(shard_file)
+                    shard_header = next(reader, None)
+                    if shard_header is None:
+                        continue
+                    if header is None:
+                        header = shard_header
+                        csv_writer.writerow(header)
+                    for row in reader:
+                        csv_writer.writerow(row)
+
+            if name == 'not_modeled.csv' and not_extracted_filename:
+                if header is None:
+                    header = NOT_MODELED_HEADER
+                    csv_writer.writerow(header)
+                with open(not_extracted_filename, 'r') as not_extracted_file:
+                    dict_writer = csv.DictWriter(output_file, header, restval='', extrasaction='ignore')
+                    for row in csv.DictReader(not_extracted_file):
+                        dict_writer.writerow(row)
+
+
+# Run a full sharded evaluation.
+# Parameters:
+#   field_data_filename, watershed_filename, not_extracted_filename: combined files from combine.
+#   output_path: folder for the shard folders and statewide outputs.
+#   output_name: filename prefix of the statewide outputs.
+#   by, tile_size: sharding scheme, see partition.
+#   processes: number of worker processes (defaults to the number of cores).
+#   resume: True to skip the shards a failed run with the same inputs finished (see checkpoint.py).
+#   qu_table: as for runoffP.calculate.
+def run(field_data_filename, watershed_filename, not_extracted_filename, output_path, output_name,
+        by='county', tile_size=0.5, processes=None, resume=False, qu_table=''):
+    state = checkpoint.open_checkpoint(output_path + output_name + '_checkpoint.json',
+                                       checkpoint.signature({'by': by, 'tile_size': tile_size, 'qu_table': qu_table},
+                                                            [field_data_filename, watershed_filename]
+                                                            + ([qu_table] if qu_table else [])), resume)
+    shard_path = output_path + 'Shards/'
+    shards = partition(field_data_filename, watershed_filename, shard_path, by, tile_size)
+    print " * Split the inventory into " + str(len(shards)) + " shards."
+
+    # maxtasksperchild=1 gives every shard a fresh worker, so memory from one shard is not carried into the next.
+    # Shards are recorded as they finish; a resumed run partitions again (the same way) and skips those shards,
+    # whose outputs are still in their folders.
+    checkpoint.map_chunks(run_shard, [(shard_path, shard, qu_table) for shard in shards], state, 'shards', processes,
+                          maxtasksperchild=1)
+
+    merge(shard_path, shards, output_path + output_name + '_', not_extracted_filename)
+    inventory_summary.merge_files([shard_path + shard + '/' + shard + '_summary.npz' for shard in shards],
+                                  output_path + output_name + '_')
+    prioritize.merge_files([shard_path + shard + '/' + shard + '_' for shard in shards], output_path + output_name + '_')
+    checkpoint.finish(state)
+
+
+if __name__ == '__main__':
+    print('Cornell Culvert Evaluation Model - statewide run')
+    print('------------------------------------------------\n')
+
+    StateNm = raw_input("Please enter the name of the statewide run folder: \n")
+    Folders = raw_input("Please enter the county data folders to combine, separated by commas: \n")
+    ShardBy = raw_input("Shard by county or tile? (county/tile) \n")
+    TileSize = 0.5
+    if ShardBy == 'tile':
+        TileSize = float(raw_input("Tile size in degrees? \n"))
+
+    run_path = "../" + StateNm + "/"
+    OutputDirectory = run_path + StateNm + "_Model_Output/"
+    if not os.path.exists(OutputDirectory):
+        os.makedirs(OutputDirectory)
+
+    data_folders = [folder.strip() for folder in Folders.split(',') if folder.strip()]
+    print " * Combining " + str(len(data_folders)) + " data folders into " + run_path + "."
+    field_data_filename, watershed_filename, not_extracted_filename = combine(data_folders, run_path + StateNm)
+    Resume = False
+    if os.path.exists(OutputDirectory + StateNm + '_checkpoint.json'):
+        Resume = raw_input("Resume the last run, skipping the shards it finished? (y/n) \n") == 'y'
+    run(field_data_filename, watershed_filename, not_extracted_filename, OutputDirectory, StateNm, ShardBy, TileSize,
+        resume=Resume)
+
+    print "\nDone! All output files can be found within the folder " + OutputDirectory
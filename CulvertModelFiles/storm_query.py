@@ -0,0 +1,213 @@
+# Storm event overtopping query
+# October 2026
+#
+# This script will precompute, for every modeled crossing, the critical 24 hour rainfall: the depth at which the
+# runoffP peak flow equals the crossing capacity. During a storm, observed or forecast rainfall per watershed then
+# only has to be compared with the critical depths (one array comparison) to list the crossings likely overtopped.
+#
+# The peak flow for a rainfall depth uses the same SCS curve number equations as runoffP: storage S and initial
+# abstraction Ia from the curve number, then the qu ("Peak multiplier") for the depth. With the qu fit, qu is known
+# at each of the watershed's 1 to 500 yr storm depths; between them it is interpolated on the depth, and it is held
+# at the end values below the 1 yr and above the 500 yr storm. With the TR-55 method it is looked up from Ia/P as
+# in runoffP. The critical depth is found by scanning the storm depths and refining by bisection.
+#
+# Rainfall depths are in mm, as in the NOAA Atlas 14 and NRCC precipitation files.
+#
+# Inputs:  sorted watershed file (runoffP input) and capacity output of a finished run.
+# Outputs: critical rainfall file (numpy .npz): per crossing the BarrierID, location, S, Ia, area, storm depths,
+#          qu factors, capacity and critical depth.
+#
+# Example:
+#   storm_query.precompute(output_prefix + 'sorted_ws.csv', output_prefix + 'capacity_output.csv',
+#                          output_prefix + 'critical_rainfall.npz')
+#   table = storm_query.load(output_prefix + 'critical_rainfall.npz')
+#   storm_query.overtopped_ids(table, {'1ALB': 95.0, '2ALB': 40.0})        # rainfall per watershed (mm)
+#   storm_query.overtopped_ids(table, storm_query.grid_rainfall(table, 'radar_24hr.csv'))   # gridded rainfall
+
+import csv, sys, numpy, loader, runoffP, Precip_Append
+
+BEYOND_500 = numpy.array([1.25, 1.5, 2.0, 3.0, 5.0])  # Scan past the 500 yr storm up to 5 times its depth
+BISECTIONS = 40
+
+
+# qu (m^3/s per km^2 per cm) for rainfall depths P (cm, one row per watershed).
+def unit_peak(model, P):
+    if model['peak_method'] == 'tr55':
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            ia_p = model['Ia'][:, numpy.newaxis] / P
+        return runoffP.tr55_unit_peak(ia_p, model['tc'][:, numpy.newaxis] * numpy.ones_like(P), model['rain_type'])
+    storms = model['P_storms']
+    qu = model['qu']
+    upper = numpy.clip(numpy.sum(storms[:, numpy.newaxis, :] < P[:, :, numpy.newaxis], axis=2), 1, storms.shape[1] - 1)
+    P_below = numpy.take_along_axis(storms, upper - 1, axis=1)
+    P_above = numpy.take_along_axis(storms, upper, axis=1)
+    qu_below = numpy.take_along_axis(qu, upper - 1, axis=1)
+    qu_above = numpy.take_along_axis(qu, upper, axis=1)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        fraction = numpy.clip(numpy.where(P_above > P_below, (P - P_below) / (P_above - P_below), 0.0), 0, 1)
+    return qu_below + fraction * (qu_above - qu_below)
+
+
+# Peak flow (m^3/s) for rainfall depths P (cm, one row per watershed).
+def peak_flow(model, P):
+    Storage = model['S'][:, numpy.newaxis]
+    Ia = model['Ia'][:, numpy.newaxis]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        Q = numpy.where(P > Ia, (P - Ia) ** 2 / (P + (Storage - Ia)), 0.0)
+    return Q * unit_peak(model, P) * model['area'][:, numpy.newaxis]
+
+
+# Critical rainfall (cm) of every crossing: the smallest depth whose peak flow reaches the capacity (inf if none
+# up to 5 times the 500 yr storm).
+def critical_depth(model):
+    capacity = model['capacity'][:, numpy.newaxis]
+    depths = numpy.sort(numpy.column_stack([model['Ia'], model['P_storms'],
+                                            model['P_storms'][:, -1:] * BEYOND_500]), axis=1)
+    reached = peak_flow(model, depths) >= capacity
+    first = numpy.argmax(reached, axis=1)
+    rows = numpy.arange(len(depths))
+    low = depths[rows, numpy.maximum(first - 1, 0)]
+    high = depths[rows, first]
+    for iteration in range(BISECTIONS):
+        middle = 0.5 * (low + high)
+        over = peak_flow(model, middle[:, numpy.newaxis])[:, 0] >= capacity[:, 0]
+        high = numpy.where(over, middle, high)
+        low = numpy.where(over, low, middle)
+    return numpy.where(numpy.any(reached, axis=1), high, numpy.inf)
+
+
+# Peak flow model of some crossings (see runoffP.modeled_crossings): S and Ia (cm), storm depths (cm) and qu factors.
+# qu_table: as for runoffP.calculate.
+def crossing_model(crossings, peak_method='qu', rain_type='II', qu_table=''):
+    tc = crossings['tc']
+    Const0, Const1 = runoffP.qu_coefficients(qu_table)
+    Storage = 0.1 * ((25400.0 / crossings['CN']) - 254.0)  # cm, as in runoffP
+    return {
+        'peak_method': peak_method,
+        'rain_type': rain_type,
+        'barrier_id': crossings['barrier_id'],
+        'area': crossings['area'],
+        'tc': tc,
+        'CN': crossings['CN'],
+        'S': Storage,
+        'Ia': 0.2 * Storage,
+        'P_storms': crossings['P'] / 10,
+        'qu': numpy.maximum((Const0 - Const1 * tc[:, numpy.newaxis]) / 8.64, 0.14),
+        'capacity': crossings['capacity']
+    }
+
+
+# Precompute and save the critical rainfall of every modeled crossing.
+# Parameters:
+#   sorted_filename: sorted watershed file (runoffP input).
+#   capacity_filename: capacity output file.
+#   critical_filename: .npz file to save the table to.
+#   peak_method, rain_type, qu_table: as for runoffP.calculate.
+def precompute(sorted_filename, capacity_filename, critical_filename, peak_method='qu', rain_type='II', qu_table=''):
+    crossings = runoffP.modeled_crossings(sorted_filename, capacity_filename, ['Lat', 'Long'])
+    model = crossing_model(crossings, peak_method, rain_type, qu_table)
+    critical = critical_depth(model) * 10  # mm
+
+    numpy.savez(critical_filename,
+                barrier_id=numpy.array(crossings['barrier_id']),
+                lat=crossings['Lat'],
+                long=crossings['Long'],
+                area=model['area'], tc=model['tc'], S=model['S'], Ia=model['Ia'],
+                P_storms=crossings['P'], qu=model['qu'], capacity=model['capacity'],
+                critical=critical, peak_method=peak_method, rain_type=rain_type)
+
+
+# Load a critical rainfall table.
+# Returns:
+#   A dictionary of the saved arrays, with 'barrier_id' as a list and 'index' (BarrierID -> row).
+def load(critical_filename):
+    with numpy.load(critical_filename) as data:
+        table = dict((name, data[name]) for name in data.files)
+    table['barrier_id'] = [str(barrier_id) for barrier_id in table['barrier_id']]
+    table['peak_method'] = str(table['peak_method'])
+    table['rain_type'] = str(table['rain_type'])
+    table['index'] = dict((barrier_id, row) for row, barrier_id in enumerate(table['barrier_id']))
+    return table
+
+
+# Rainfall per crossing (mm) from a dictionary of BarrierID -> rainfall. Crossings not given get NaN.
+def rainfall_array(table, rainfall):
+    if isinstance(rainfall, dict):
+        return numpy.array([rainfall.get(barrier_id, numpy.nan) for barrier_id in table['barrier_id']], dtype=float)
+    return numpy.asarray(rainfall, dtype=float)
+
+
+# Load event rainfall per watershed from a csv with BarrierID and Rain_mm columns.
+def load_event(event_filename):
+    signature = [{'name': 'BarrierID', 'type': str}, {'name': 'Rain_mm', 'type': float}]
+    return dict((row['BarrierID'], row['Rain_mm']) for row in loader.load(event_filename, signature, 1, -1)['valid_rows'])
+
+
+# Summarize gridded rainfall per watershed: the nearest grid cell to each crossing, or an inverse-distance
+# weighted blend of the k nearest (as for NRCC stations in Precip_Append).
+# Parameters:
+#   table: dictionary from load.
+#   grid_filename: csv with a Lat, Long and Rain_mm row per grid cell (e.g. radar or forecast 24 hour totals).
+# Returns:
+#   numpy array of rainfall (mm) per crossing.
+def grid_rainfall(table, grid_filename, k=1, power=2):
+    signature = [{'name': 'Lat', 'type': float}, {'name': 'Long', 'type': float}, {'name': 'Rain_mm', 'type': float}]
+    cells = loader.load(grid_filename, signature, 1, -1)['valid_rows']
+    if len(cells) == 0:
+        print "ERROR: no rainfall cells could be read from '" + grid_filename + "'. Bailing out."
+        sys.exit(0)
+    cell_lat = numpy.array([cell['Lat'] for cell in cells])
+    cell_lon = numpy.array([cell['Long'] for cell in cells])
+    cell_rain = numpy.array([[cell['Rain_mm']] for cell in cells])
+    return Precip_Append.station_precip(table['lat'], table['long'], cell_lat, cell_lon, cell_rain, k, power)[:, 0]
+
+
+# Which crossings an event overtops.
+# Parameters:
+#   table: dictionary from load.
+#   rainfall: 24 hour rainfall (mm) per crossing (array in table order) or dictionary of BarrierID -> rainfall.
+# Returns:
+#   Boolean numpy array, True where the rainfall reaches the critical depth.
+def overtopped(table, rainfall):
+    with numpy.errstate(invalid='ignore'):
+        return rainfall_array(table, rainfall) >= table['critical']
+
+
+# BarrierIDs of the crossings an event overtops, most exceeded (rainfall / critical rainfall) first.
+def overtopped_ids(table, rainfall):
+    rain = rainfall_array(table, rainfall)
+    rows = numpy.flatnonzero(overtopped(table, rain))
+    rows = rows[numpy.argsort(-(rain[rows] / numpy.maximum(table['critical'][rows], 1e-9)), kind='mergesort')]
+    return [table['barrier_id'][row] for row in rows]
+
+
+# Save the crossings an event overtops.
+def save_event(table, rainfall, output_filename):
+    rain = rainfall_array(table, rainfall)
+    with open(output_filename, 'wb') as output_file:
+        csv_writer = csv.writer(output_file)
+        csv_writer.writerow(['BarrierID', 'Lat', 'Long', 'Rain_mm', 'Critical_Rain_mm', 'Capacity', 'Rain_Ratio'])
+        for barrier_id in overtopped_ids(table, rain):
+            row = table['index'][barrier_id]
+            csv_writer.writerow([barrier_id, table['lat'][row], table['long'][row], '%.2f' % rain[row],
+                                 '%.2f' % table['critical'][row], table['capacity'][row],
+                                 '%.3f' % (rain[row] / max(table['critical'][row], 1e-9))])
+
+
+if __name__ == '__main__':
+    print('Cornell Culvert Evaluation Model - storm event query')
+    print('----------------------------------------------------\n')
+
+    CriticalFile = raw_input("Path to the critical rainfall file (<prefix>critical_rainfall.npz): \n")
+    EventFile = raw_input("Path to the event rainfall csv (BarrierID, Rain_mm per watershed, or Lat, Long, Rain_mm per grid cell): \n")
+    OutputFile = raw_input("Path of the overtopped crossings csv to write: \n")
+    table = load(CriticalFile)
+    with open(EventFile, 'r') as event_file:
+        header = next(csv.reader(event_file), [])
+    if 'BarrierID' in header:
+        rainfall = load_event(EventFile)
+    else:
+        rainfall = grid_rainfall(table, EventFile)
+    save_event(table, rainfall, OutputFile)
+    print "\n" + str(int(numpy.sum(overtopped(table, rainfall)))) + " of " + str(len(table['barrier_id'])) \
+        + " crossings are likely overtopped. The list can be found here:\n" + OutputFile
@@ -0,0 +1,159 @@
+# Vectorized input validation
+# October 2026
+#
+# This script will check a whole table (pandas DataFrame) against a list of declarative rules
+# at once, instead of row by row. Each rule is a dictionary with:
+#   code:    short rule code used in the rejection table, e.g. 'IN_A_RANGE'
+#   check:   'numeric'    - column must parse to a number
+#            'range'      - column must be a number within min/max (either may be left out)
+#            'categories' - column must be one of the allowed values
+#            'reject_if'  - row is rejected whenever all the 'when' conditions hold
+#   column:  column the rule checks (not needed for 'reject_if')
+#   when:    optional list of (column, operator, value) conditions, all must hold for the rule to apply.
+#            Operators: '==', '!=', '<', '<=', '>', '>=', 'in', 'not in'. This is how cross-field rules
+#            are written, e.g. In_B only has to be valid when ('In_Shape', '!=', 'Round').
+#   note:    Modeling_notes text for rows rejected by this rule
+#
+# Every rule is evaluated as one boolean mask over all rows. Rows that fail several rules are
+# listed once per rule in the rejection table; their note comes from the first rule they fail.
+#
+# Example:
+#   valid, rejections, counts = validation.validate(FieldData, validation.NAACC_GEOMETRY_RULES, 'NAACC_ID')
+
+import sys, numpy, pandas as pd
+
+# Bridges that can't be modeled as culverts (checked on the NAACC shape names, before conversion).
+NAACC_BRIDGE_RULES = [
+    {'code': 'BRIDGE_TYPE', 'check': 'reject_if',
+     'when': [('Crossing_Type', '==', 'Bridge'),
+              ('In_Shape', 'not in', ['Box/Bridge with Abutments', 'Open Bottom Arch Bridge/Culvert'])],
+     'note': 'Wrong bridge type or bridge wider than 20 ft'},
+    {'code': 'BRIDGE_WIDTH', 'check': 'reject_if',
+     'when': [('Crossing_Type', '==', 'Bridge'), ('In_A', '>=', 20)],
+     'note': 'Wrong bridge type or bridge wider than 20 ft'},
+]
+
+# Culvert geometry needed by capacity_prep (checked after shapes are converted to the capacity_prep names).
+NAACC_GEOMETRY_RULES = [
+    {'code': 'IN_A_RANGE', 'check': 'range', 'column': 'In_A', 'min': 0,
+     'note': 'Negative or missing culvert geometry'},
+    {'code': 'IN_B_RANGE', 'check': 'range', 'column': 'In_B', 'min': 0, 'when': [('In_Shape', '!=', 'Round')],
+     'note': 'Negative or missing culvert geometry'},
+    {'code': 'HW_RANGE', 'check': 'range', 'column': 'HW', 'min': 0,
+     'note': 'Negative or missing culvert geometry'},
+    {'code': 'LENGTH_RANGE', 'check': 'range', 'column': 'Length', 'min': 0,
+     'note': 'Negative or missing culvert geometry'},
+    {'code': 'SHAPE', 'check': 'categories', 'column': 'In_Shape',
+     'allowed': ['Round', 'Elliptical', 'Pipe Arch', 'Box', 'Arch'],
+     'note': 'Culvert shape not modeled'},
+]
+
+OPERATORS = {
+    '==': lambda values, target: values == target,
+    '!=': lambda values, target: values != target,
+    '<': lambda values, target: values < target,
+    '<=': lambda values, target: values <= target,
+    '>': lambda values, target: values > target,
+    '>=': lambda values, target: values >= target,
+    'in': lambda values, target: values.isin(target),
+    'not in': lambda values, target: ~values.isin(target),
+}
+
+
+# Mask of rows where all of a rule's 'when' conditions hold.
+def applies(frame, conditions):
+    mask = pd.Series(True, index=frame.index)
+    for column, operator, target in conditions:
+        values = frame[column]
+        if operator in ('<', '<=', '>', '>='):
+            values = pd.to_numeric(values, errors='coerce')  # Missing or text values never satisfy a comparison
+        mask &= OPERATORS[operator](values, target)
+    return mask
+
+
+# Mask of rows that fail one rule.
+def failures(frame, rule):
+    mask = applies(frame, rule.get('when', []))
+    check = rule['check']
+    if check == 'reject_if':
+        return mask
+
+    values = frame[rule['column']]
+    if check == 'categories':
+        return mask & ~values.isin(rule['allowed'])
+
+    numbers = pd.to_numeric(values, errors='coerce')
+    bad = numbers.isnull()
+    if check == 'range':
+        if rule.get('min') is not None:
+            bad |= numbers < rule['min']
+        if rule.get('max') is not None:
+            bad |= numbers > rule['max']
+    return mask & bad
+
+
+# Validate a table against a list of rules.
+# Parameters:
+#   frame: pandas DataFrame to check.
+#   rules: list of rule dictionaries (see above).
+#   id_column: optional column copied into the rejection table to identify rows (e.g. 'NAACC_ID').
+#   max_reject_fraction: fail fast - bail out if any single rule rejects more than this fraction of rows
+#                        (usually a sign of a wrong column mapping). None to never bail out.
+# Returns:
+#   valid: boolean numpy array, True for rows that passed every rule.
+#   rejections: DataFrame with one row per failed rule per row: Row (index label in frame), id_column, Rule, Note.
+#   counts: DataFrame with the number of rows each rule rejected: Rule, Note, Count.
+def validate(frame, rules, id_column=None, max_reject_fraction=None):
+    valid = numpy.ones(len(frame), dtype=bool)
+    rejected_rows = []
+    rejected_codes = []
+    rejected_notes = []
+    counts = []
+    for rule in rules:
+        failed = failures(frame, rule).values
+        count = int(failed.sum())
+        counts.append([rule['code'], rule['note'], count])
+
+        if max_reject_fraction is not None and len(frame) > 0 and count > max_reject_fraction * len(frame):
+            print "ERROR: validation rule " \
+                + rule['code'] \
+                + " rejected " + str(count) + " of " + str(len(frame)) \
+                + " rows, more than the allowed " + str(int(max_reject_fraction * 100)) \
+                + "%. Check the input columns. Bailing out."
+            sys.exit(0)
+
+        rows = numpy.nonzero(failed)[0]
+        rejected_rows.append(rows)
+        rejected_codes.append(numpy.repeat(rule['code'], len(rows)))
+        rejected_notes.append(numpy.repeat(rule['note'], len(rows)))
+        valid &= ~failed
+
+    rejections = pd.DataFrame({
+        'Row': numpy.concatenate(rejected_rows) if rules else numpy.array([], dtype=int),
+        'Rule': numpy.concatenate(rejected_codes) if rules else numpy.array([]),
+        'Note': numpy.concatenate(rejected_notes) if rules else numpy.array([]),
+    })
+    rejections = rejections.sort_values('Row', kind='mergesort').reset_index(drop=True)
+    positions = rejections['Row'].values.astype(int)
+    rejections['Row'] = frame.index.values[positions]
+    columns = ['Row', 'Rule', 'Note']
+    if id_column is not None:
+        rejections[id_column] = frame[id_column].values[positions]
+        columns = ['Row', id_column, 'Rule', 'Note']
+    counts = pd.DataFrame(counts, columns=['Rule', 'Note', 'Count'])
+    return valid, rejections[columns], counts
+
+
+# Modeling note for each row: the note of the first rule the row failed ('' for valid rows).
+def notes(frame, rejections):
+    row_notes = numpy.array([''] * len(frame), dtype=object)
+    first = rejections.drop_duplicates('Row', keep='first')
+    row_notes[frame.index.get_indexer(first['Row'].values)] = first['Note'].values
+    return row_notes
+
+
+# Print the per-rule counts.
+def print_counts(counts):
+    for rule, note, count in counts.values:
+        if count > 0:
+            print "* " + rule + ": " + str(count) + " rows (" + note + ")"
@@ -0,0 +1,260 @@
+# Watershed curve number and time of concentration from rasters
+# October 2026
+#
+# This script will compute the watershed inputs of the model (Area_sqkm, CN and Tc_hr for every culvert watershed)
+# from rasters, in place of the ArcGIS "95_Tc_calc" and "96_CN_calc" models:
+# a) CN is the area-weighted curve number of the watershed: each cell takes the curve number of its land cover
+#    and hydrologic soil group from a lookup table, and the cells are summed per watershed label with bincount.
+# b) Tc uses the NRCS watershed lag method (NEH 630 chapter 15): lag = l^0.8 (S + 1)^0.7 / (1900 Y^0.5) hours,
+#    with l the longest flow length (ft), S = 1000/CN - 10 and Y the average land slope (%), and Tc = lag / 0.6.
+#
+# All rasters are ESRI float grids on the same grid (see raster.py), read one memory-mapped tile at a time, so
+# memory use does not depend on the county size. Tiles are spread over worker processes and their per-label sums
+# are added together at the end.
+#
+# Rasters:
+#   labels: watershed label of every cell (0 or no data outside the watersheds), e.g. from delineation.py.
+#   landcover: land cover class (e.g. NLCD codes).
+#   soil: hydrologic soil group, 1 = A, 2 = B, 3 = C, 4 = D; 5, 6 and 7 (A/D, B/D, C/D) are taken as D.
+#   flow_length: flow length along the flow path down to the watershed outlet, or down to the edge of the DEM
+#                (ArcGIS Flow Length, DOWNSTREAM), in map units (m).
+#   slope: land slope in percent (ArcGIS Slope, PERCENT_RISE).
+#
+# Label file (csv): Label and BarrierID for every watershed label. Two optional columns describe labels that only
+# cover the area between a culvert and the culverts upstream of it (as delineation.py makes them):
+#   Downstream_Label: label of the next watershed downstream (0 if none). Totals are carried down to it, so each
+#                     watershed gets its whole upstream area.
+#   Outlet_Length: flow length at the culvert, taken off the longest flow length of its watershed.
+#
+# Curve number table (csv): LandCover, A, B, C, D, the curve number of each land cover class for each soil group.
+#
+# Outputs: csv with BarrierID, Area_sqkm, Tc_hr and CN for every labeled watershed, as in All_Culverts.csv.
+
+import csv, sys, numpy, multiprocessing, loader, raster
+
+SOIL_GROUP_COLUMNS = {1: 'A', 2: 'B', 3: 'C', 4: 'D', 5: 'D', 6: 'D', 7: 'D'}
+MIN_SLOPE_PERCENT = 0.1  # Flat watersheds are given this slope so the lag equation stays finite
+FEET_PER_METER = 3.28084
+SUM_NAMES = ['cells', 'cn_sum', 'cn_cells', 'slope_sum', 'slope_cells']
+
+
+# Load the curve number lookup table.
+# Returns:
+#   numpy array (land cover classes, 8): the curve number for each land cover code (row) and soil group code
+#   (column), NaN where none is given.
+def load_cn_table(cn_table_filename):
+    signature = [{'name': 'LandCover', 'type': int}, {'name': 'A', 'type': float}, {'name': 'B', 'type': float},
+                 {'name': 'C', 'type': float}, {'name': 'D', 'type': float}]
+    rows = loader.load(cn_table_filename, signature, 1, -1)['valid_rows']
+    if len(rows) == 0:
+        print "ERROR: no curve numbers could be read from '" + cn_table_filename + "'. Bailing out."
+        sys.exit(0)
+    table = numpy.full((max(row['LandCover'] for row in rows) + 1, 8), numpy.nan)
+    for row in rows:
+        for code, column in SOIL_GROUP_COLUMNS.items():
+            table[row['LandCover'], code] = row[column]
+    return table
+
+
+# Load the watershed labels.
+# Returns:
+#   A dictionary with numpy arrays label, downstream (label, 0 if none) and outlet_length, and the list barrier_id.
+def load_labels(label_filename):
+    with open(label_filename, 'r') as label_file:
+        header = next(csv.reader(label_file), [])
+    signature = [{'name': 'Label', 'type': int}, {'name': 'BarrierID', 'type': str}]
+    for name in ['Downstream_Label', 'Outlet_Length']:
+        if name in header:
+            signature.append({'name': name, 'type': float})
+    rows = loader.load(label_filename, signature, 1, -1)['valid_rows']
+    return {
+        'label': numpy.array([row['Label'] for row in rows], dtype=int),
+        'barrier_id': [row['BarrierID'] for row in rows],
+        'downstream': numpy.array([int(row.get('Downstream_Label', 0)) for row in rows], dtype=int),
+        'outlet_length': numpy.array([row.get('Outlet_Length', 0.0) for row in rows], dtype=float)
+    }
+
+
+# Per-label sums over one tile.
+# Parameters:
+#   job: (dictionary of raster filenames, curve number table, window).
+# Returns:
+#   A dictionary of arrays indexed by label: cells, cn_sum and cn_cells, slope_sum and slope_cells, max_length.
+def tile_sums(job):
+    filenames, cn_table, window = job
+    labels = raster.read_window(raster.open_raster(filenames['labels']), window)
+    inside = numpy.isfinite(labels)
+    inside[inside] = labels[inside] > 0
+    label = labels[inside].astype(int)
+    size = label.max() + 1 if len(label) > 0 else 1
+    sums = {'cells': numpy.bincount(label, minlength=size).astype(float)}
+
+    def read(name):
+        return raster.read_window(raster.open_raster(filenames[name]), window)[inside]
+
+    if filenames.get('landcover') and filenames.get('soil'):
+        landcover = read('landcover')
+        soil = read('soil')
+        known = numpy.isfinite(landcover) & numpy.isfinite(soil) & (landcover >= 0) & (landcover < len(cn_table)) \
+            & (soil >= 0) & (soil < cn_table.shape[1])
+        CN = numpy.full(len(label), numpy.nan)
+        CN[known] = cn_table[landcover[known].astype(int), soil[known].astype(int)]
+        known = numpy.isfinite(CN)
+        sums['cn_sum'] = numpy.bincount(label[known], weights=CN[known], minlength=size)
+        sums['cn_cells'] = numpy.bincount(label[known], minlength=size).astype(float)
+    if filenames.get('slope'):
+        slope = read('slope')
+        known = numpy.isfinite(slope)
+        sums['slope_sum'] = numpy.bincount(label[known], weights=slope[known], minlength=size)
+        sums['slope_cells'] = numpy.bincount(label[known], minlength=size).astype(float)
+    if filenames.get('flow_length'):
+        length = read('flow_length')
+        known = numpy.isfinite(length)
+        sums['max_length'] = numpy.full(size, -numpy.inf)
+        numpy.maximum.at(sums['max_length'], label[known], length[known])
+    return sums
+
+
+# Add the per-label sums of all tiles (spread over worker processes).
+# Parameters:
+#   filenames: dictionary of raster filenames (labels, and any of landcover, soil, flow_length, slope).
+#   cn_table: curve number table from load_cn_table (None without land cover and soil).
+#   processes: number of worker processes (defaults to the number of cores, 1 to run in this process).
+def label_sums(filenames, cn_table=None, processes=None, tile_size=raster.TILE_SIZE):
+    rasters = [raster.open_raster(filenames[name])
+               for name in ['labels', 'landcover', 'soil', 'flow_length', 'slope'] if filenames.get(name)]
+    raster.check_aligned(rasters)
+    jobs = [(filenames, cn_table, window) for window in raster.windows(rasters[0], tile_size)]
+    if processes == 1 or len(jobs) == 1:
+        results = [tile_sums(job) for job in jobs]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(tile_sums, jobs)
+        finally:
+            pool.close()
+            pool.join()
+
+    size = max(len(result['cells']) for result in results)
+    totals = {}
+    for result in results:
+        for name, values in result.items():
+            if name not in totals:
+                totals[name] = numpy.full(size, -numpy.inf) if name == 'max_length' else numpy.zeros(size)
+            if name == 'max_length':
+                totals[name][:len(values)] = numpy.maximum(totals[name][:len(values)], values)
+            else:
+                totals[name][:len(values)] += values
+    return totals
+
+
+# Carry the sums of each label down to the labels below it, so each label covers its whole upstream area.
+# Parameters:
+#   totals: per-label sums from label_sums (changed in place).
+#   labels: dictionary from load_labels.
+def accumulate(totals, labels):
+    size = len(totals['cells'])
+    downstream = numpy.zeros(size, dtype=int)
+    listed = labels['label'] < size
+    downstream[labels['label'][listed]] = labels['downstream'][listed]
+    downstream[(downstream < 0) | (downstream >= size)] = 0
+
+    # Upstream labels first (Kahn's algorithm), as in network.py.
+    num_upstream = numpy.bincount(downstream[1:], minlength=size)
+    ready = [label for label in range(1, size) if num_upstream[label] == 0]
+    order = []
+    while ready:
+        label = ready.pop()
+        order.append(label)
+        below = downstream[label]
+        if below > 0:
+            num_upstream[below] -= 1
+            if num_upstream[below] == 0:
+                ready.append(below)
+    if len(order) < size - 1:
+        print "ERROR: the watershed labels flow in a loop. Bailing out."
+        sys.exit(0)
+    for label in order:
+        below = downstream[label]
+        if below > 0:
+            for name in totals:
+                if name == 'max_length':
+                    totals[name][below] = max(totals[name][below], totals[name][label])
+                else:
+                    totals[name][below] += totals[name][label]
+
+
+# Time of concentration (hr) by the NRCS watershed lag method.
+# Parameters:
+#   length_m: longest flow length (m), CN: curve number, slope_percent: average land slope (%), arrays.
+def lag_tc(length_m, CN, slope_percent):
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        S = 1000.0 / CN - 10
+        lag = (length_m * FEET_PER_METER) ** 0.8 * (S + 1) ** 0.7 \
+            / (1900 * numpy.sqrt(numpy.maximum(slope_percent, MIN_SLOPE_PERCENT)))
+    return lag / 0.6
+
+
+# Compute Area_sqkm, CN and Tc_hr for every labeled watershed and save them.
+# Parameters:
+#   label_raster_filename, label_filename: watershed label raster and label csv.
+#   landcover_filename, soil_filename, cn_table_filename: land cover and soil group rasters, curve number table.
+#   flow_length_filename, slope_filename: flow length and slope rasters.
+#   output_filename: csv to write.
+#   processes: number of worker processes.
+# Returns:
+#   A list of [BarrierID, Area_sqkm, Tc_hr, CN] rows.
+def calculate(label_raster_filename, label_filename, landcover_filename, soil_filename, cn_table_filename,
+              flow_length_filename, slope_filename, output_filename, processes=None):
+    filenames = {
+        'labels': label_raster_filename,
+        'landcover': landcover_filename,
+        'soil': soil_filename,
+        'flow_length': flow_length_filename,
+        'slope': slope_filename
+    }
+    labels = load_labels(label_filename)
+    totals = label_sums(filenames, load_cn_table(cn_table_filename), processes)
+    size = max(len(totals['cells']), labels['label'].max() + 1 if len(labels['label']) > 0 else 1)
+    for name, values in totals.items():
+        totals[name] = numpy.append(values, numpy.full(size - len(values), -numpy.inf if name == 'max_length' else 0.0))
+    accumulate(totals, labels)
+
+    cellsize = raster.read_header(label_raster_filename)['cellsize']
+    index = labels['label']
+    area = totals['cells'][index] * cellsize ** 2 / 1e6
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        CN = totals['cn_sum'][index] / totals['cn_cells'][index]
+        slope = totals['slope_sum'][index] / totals['slope_cells'][index]
+    # Longest flow path from the farthest cell to the culvert, at least one cell long.
+    length = numpy.maximum(totals['max_length'][index] - labels['outlet_length'], cellsize)
+    tc = lag_tc(length, CN, slope)
+
+    results = []
+    for row, barrier_id in enumerate(labels['barrier_id']):
+        # Watersheds without cells or curve numbers get 0, which runoffP skips.
+        valid = area[row] > 0 and numpy.isfinite(CN[row]) and numpy.isfinite(tc[row])
+        results.append([barrier_id, area[row], tc[row] if valid else 0, CN[row] if valid else 0])
+
+    with open(output_filename, 'wb') as output_file:
+        csv_writer = csv.writer(output_file)
+        csv_writer.writerow(['BarrierID', 'Area_sqkm', 'Tc_hr', 'CN'])
+        for result in results:
+            csv_writer.writerow(result)
+    return results
+
+
+if __name__ == '__main__':
+    print('Cornell Culvert Evaluation Model - watershed CN and Tc from rasters')
+    print('-------------------------------------------------------------------\n')
+
+    LabelRaster = raw_input("Path to the watershed label raster (.flt): \n")
+    LabelFile = raw_input("Path to the watershed label csv (Label, BarrierID): \n")
+    LandCover = raw_input("Path to the land cover raster (.flt): \n")
+    Soil = raw_input("Path to the hydrologic soil group raster (.flt): \n")
+    CNTable = raw_input("Path to the curve number table csv (LandCover, A, B, C, D): \n")
+    FlowLength = raw_input("Path to the flow length raster (.flt): \n")
+    Slope = raw_input("Path to the percent slope raster (.flt): \n")
+    OutputFile = raw_input("Path of the watershed csv to write (e.g. All_Culverts.csv): \n")
+    calculate(LabelRaster, LabelFile, LandCover, Soil, CNTable, FlowLength, Slope, OutputFile)
+    print "\nDone! The watershed values can be found here:\n" + OutputFile